@@ -0,0 +1,92 @@
+import os
+import sys
+import time
+import base64
+import tempfile
+import argparse
+import tracemalloc
+import multiprocessing
+from pathlib import Path
+from datetime import datetime, timezone, timedelta
+from email.utils import format_datetime
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from core.imap_client import IMAPClient, IMAP_MAX_BODY_BYTES
+from core.pipeline import run_pipeline
+from bench.fake_imap import FakeIMAPServer, build_message
+
+
+def attachment_message(i: int, size: int, date: datetime) -> bytes:
+    blob = base64.encodebytes(os.urandom(size)).decode("ascii")
+    if i % 2:
+        # multipart/mixed propre : la pièce jointe est écartée par BODYSTRUCTURE
+        return (
+            f"From: Sender {i} <sender{i}@example.com>\r\n"
+            f"Subject: Pièce jointe {i}\r\n"
+            f"Date: {format_datetime(date)}\r\n"
+            "MIME-Version: 1.0\r\n"
+            'Content-Type: multipart/mixed; boundary="b"\r\n\r\n'
+            "--b\r\nContent-Type: text/plain; charset=utf-8\r\n\r\n"
+            f"Bonjour,\r\nVoici le document {i}.\r\n"
+            "--b\r\nContent-Type: application/pdf; name=doc.pdf\r\n"
+            "Content-Disposition: attachment; filename=doc.pdf\r\n"
+            f"Content-Transfer-Encoding: base64\r\n\r\n{blob}\r\n--b--\r\n"
+        ).encode("utf-8")
+    # Mail mono-partie avec le fichier collé en ligne : seul le fetch partiel le borne
+    body = f"Bonjour,\nVoici le document {i} en ligne :\n\n" + blob
+    return build_message(f"Sender {i} <sender{i}@example.com>", f"Fichier en ligne {i}", body, date)
+
+
+def serve(mails: int, size: int, ready):
+    server = FakeIMAPServer()
+    box = server.mailbox("INBOX")
+    now = datetime.now(timezone.utc)
+    for i in range(mails):
+        box.append(attachment_message(i, size, now - timedelta(minutes=mails - i)))
+    ready.put(server.port)
+    server.serve_forever()
+
+
+def run(mails: int, size: int, max_body: int) -> dict:
+    ctx = multiprocessing.get_context("fork")
+    ready = ctx.Queue()
+    # Le serveur vit dans un autre process : seule la mémoire du client est mesurée
+    process = ctx.Process(target=serve, args=(mails, size, ready), daemon=True)
+    process.start()
+    port = ready.get()
+
+    client = IMAPClient(host="127.0.0.1", port=port, user="bench", password="bench", starttls=False, max_body_bytes=max_body)
+    client.connect()
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        tracemalloc.start()
+        start = time.perf_counter()
+        json_file = run_pipeline("INBOX", hours=24 * 7, limit=mails, store_path=Path(tmp) / "store.db",
+                                 classify=False, summarize=False, client=client)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        report_size = json_file.stat().st_size if json_file else 0
+        os.chdir(cwd)
+    client.close()
+    process.terminate()
+    process.join()
+    return {"peak": peak, "seconds": elapsed, "report": report_size}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pic mémoire d'un run selon la taille des pièces jointes")
+    parser.add_argument("--mails", type=int, default=1000)
+    parser.add_argument("--sizes", default="16,256,1024", help="Tailles de pièce jointe en Kio, séparées par des virgules")
+    parser.add_argument("--max-body", type=int, default=IMAP_MAX_BODY_BYTES or 64 * 1024, help="Plafond des corps (octets)")
+    parser.add_argument("--skip-unlimited", action="store_true", help="Ne pas mesurer le fetch sans plafond")
+    args = parser.parse_args()
+
+    modes = [("plafond", args.max_body)] + ([] if args.skip_unlimited else [("illimité", 0)])
+    print(f"{'pièce jointe':>12} {'mode':>9} {'pic Mio':>8} {'rapport Mio':>12} {'secondes':>9}")
+    for size_kb in (int(s) for s in args.sizes.split(",")):
+        for mode, max_body in modes:
+            result = run(args.mails, size_kb * 1024, max_body)
+            print(f"{size_kb:>9} Kio {mode:>9} {result['peak'] / 2**20:>8.1f} "
+                  f"{result['report'] / 2**20:>12.1f} {result['seconds']:>9.2f}")
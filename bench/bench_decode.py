@@ -0,0 +1,80 @@
+import sys
+import time
+import base64
+import quopri
+import argparse
+from pathlib import Path
+from email import message_from_bytes
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from core.imap_client import IMAPClient
+from core.mime import parse_sexp, find_text_part, decode_part, html_to_text
+from bench.fake_imap import _bodystructure, _section
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures" / "eml"
+
+
+def load_corpus(directory: Path) -> list:
+    corpus = []
+    for path in sorted(directory.glob("*.eml")):
+        raw = path.read_bytes().replace(b"\r\n", b"\n").replace(b"\n", b"\r\n")
+        msg = message_from_bytes(raw)
+        # Ce que le serveur renverrait : BODYSTRUCTURE, BODY[TEXT] et la section ciblée
+        structure = parse_sexp(_bodystructure(msg).encode("utf-8"))
+        part = find_text_part(structure)
+        corpus.append({
+            "name": path.name,
+            "text": _section(raw, msg, "TEXT"),
+            "part": part,
+            "section": _section(raw, msg, part[0]) if part else None,
+        })
+    return corpus
+
+
+def legacy_decode(client: IMAPClient, body_raw: bytes) -> str:
+    from bs4 import BeautifulSoup
+    try:
+        body = base64.b64decode(body_raw).decode("utf-8")
+    except Exception:
+        try:
+            body = quopri.decodestring(body_raw).decode("utf-8", errors="replace")
+        except Exception:
+            body = body_raw.decode("utf-8", errors="replace")
+    return client._clean_body(BeautifulSoup(body, "html.parser").get_text(separator=" ", strip=True))
+
+
+def structured_decode(client: IMAPClient, item: dict) -> str:
+    _, subtype, encoding, charset, _ = item["part"]
+    text = decode_part(item["section"], encoding, charset)
+    return client._clean_body(html_to_text(text) if subtype == "html" else text)
+
+
+def timeit(fn, rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - start) / rounds
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-benchmark du décodage des corps de mail")
+    parser.add_argument("--fixtures", type=Path, default=FIXTURES, help="Dossier de fichiers .eml")
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--show", action="store_true", help="Afficher un extrait des deux décodages")
+    args = parser.parse_args()
+
+    client = IMAPClient()
+    corpus = load_corpus(args.fixtures)
+
+    print(f"{'fixture':<28} {'octets TEXT':>11} {'octets part':>11} {'legacy µs':>10} {'structuré µs':>13}")
+    totals = [0, 0, 0.0, 0.0]
+    for item in corpus:
+        legacy = timeit(lambda: legacy_decode(client, item["text"]), args.rounds)
+        structured = timeit(lambda: structured_decode(client, item), args.rounds) if item["part"] else float("nan")
+        part_size = len(item["section"]) if item["section"] is not None else 0
+        print(f"{item['name']:<28} {len(item['text']):>11} {part_size:>11} {legacy * 1e6:>10.0f} {structured * 1e6:>13.0f}")
+        totals = [totals[0] + len(item["text"]), totals[1] + part_size, totals[2] + legacy, totals[3] + structured]
+        if args.show:
+            print(f"   legacy     : {legacy_decode(client, item['text'])[:100]!r}")
+            print(f"   structuré  : {structured_decode(client, item)[:100]!r}")
+    print(f"{'total':<28} {totals[0]:>11} {totals[1]:>11} {totals[2] * 1e6:>10.0f} {totals[3] * 1e6:>13.0f}")
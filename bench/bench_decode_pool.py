@@ -0,0 +1,111 @@
+import os
+import sys
+import time
+import random
+import argparse
+from pathlib import Path
+from datetime import datetime, timezone, timedelta
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from core.mime import render_body
+from core.imap_client import IMAPClient, get_decode_pool, close_decode_pool
+from bench.fake_imap import FakeIMAPServer, build_message
+
+WORDS = ("offre", "exclusive", "livraison", "gratuite", "promo", "nouveautés", "semaine", "découvrez", "catalogue", "remise")
+
+
+def marketing_html(i: int, rows: int, rng: random.Random) -> str:
+    # Newsletter HTML typique : styles, tableaux imbriqués, liens de tracking, entités
+    cells = "".join(
+        f'<tr><td style="padding:8px;font-family:Arial"><a href="https://track.example.com/c/{i}/{r}">'
+        f'{" ".join(rng.choices(WORDS, k=8))}</a> &amp; {rng.randrange(100)}&nbsp;% &eacute;t&eacute;</td>'
+        f'<td><img src="https://cdn.example.com/{r}.png" alt="produit {r}"></td></tr>'
+        for r in range(rows)
+    )
+    return (
+        f"<html><head><style>td {{ color: #333; }} .btn {{ background: #e00; }}</style>"
+        f"<script>var tracking = {i};</script></head><body>"
+        f"<table><tr><td><h1>Newsletter n°{i}</h1></td></tr><tr><td><table>{cells}</table></td></tr></table>"
+        f'<p>Se désabonner : <a href="https://example.com/unsubscribe/{i}">ici</a></p></body></html>'
+    )
+
+
+def cpu_run(payloads: list, workers: int) -> tuple:
+    # Décodage seul, sans réseau : montée en charge sur les cœurs
+    if workers == 0:
+        start = time.perf_counter()
+        results = [render_body(payload, part) for payload, part in payloads]
+        return time.perf_counter() - start, [r[0] for r in results]
+    pool = get_decode_pool(workers)
+    list(pool.map(render_body, [b""] * workers, [None] * workers))  # démarrage des processus hors mesure
+    start = time.perf_counter()
+    results = list(pool.map(render_body, *zip(*payloads), chunksize=max(1, len(payloads) // (workers * 8))))
+    elapsed = time.perf_counter() - start
+    close_decode_pool()
+    return elapsed, [r[0] for r in results]
+
+
+def fetch_run(server: FakeIMAPServer, count: int, workers: int) -> tuple:
+    # Fetch IMAP complet : le décodage d'un lot recouvre le fetch du suivant
+    if workers:
+        pool = get_decode_pool(workers)
+        list(pool.map(render_body, [b""] * workers, [None] * workers))
+    client = IMAPClient(host="127.0.0.1", port=server.port, user="bench", password="bench", starttls=False, decode_workers=workers)
+    client.connect()
+    start = time.perf_counter()
+    mails = list(client.iter_recent(limit=count, hours=24))
+    elapsed = time.perf_counter() - start
+    client.close()
+    close_decode_pool()
+    return elapsed, [(mail["subject"], mail["body"]) for mail in mails]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Décodage HTML → texte et nettoyage des corps : thread IMAP vs pool de processus")
+    parser.add_argument("--mails", type=int, default=200)
+    parser.add_argument("--rows", type=int, default=300, help="Lignes de tableau par newsletter (~100 Ko de HTML pour 300)")
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 1, 2, 4])
+    parser.add_argument("--latency", type=float, default=0.005, help="Aller-retour réseau simulé du faux serveur IMAP")
+    parser.add_argument("--chunk", type=int, default=50, help="IMAP_FETCH_CHUNK pour la partie fetch")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    bodies = [marketing_html(i, args.rows, rng) for i in range(args.mails)]
+    payloads = [(body.encode("utf-8"), ("1", "html", "8bit", "utf-8", None)) for body in bodies]
+    print(f"{args.mails} newsletters HTML, {sum(map(len, bodies)) / args.mails / 1024:.0f} Kio en moyenne, {os.cpu_count()} cœur(s)")
+
+    errors = []
+    print(f"\n{'décodage seul':<16} {'secondes':>9} {'mails/s':>9} {'accélération':>13}")
+    reference = None
+    for workers in args.workers:
+        elapsed, texts = cpu_run(payloads, workers)
+        reference = reference or (elapsed, texts)
+        if texts != reference[1]:
+            errors.append(f"décodage seul, {workers} processus : textes ou ordre différents")
+        label = "thread" if workers == 0 else f"{workers} processus"
+        print(f"{label:<16} {elapsed:>9.2f} {args.mails / elapsed:>9.0f} {reference[0] / elapsed:>12.2f}x")
+
+    import core.imap_client
+    core.imap_client.IMAP_FETCH_CHUNK = args.chunk
+    server = FakeIMAPServer(latency=args.latency).start()
+    now = datetime.now(timezone.utc)
+    for i, body in enumerate(bodies):
+        server.mailbox("INBOX").append(build_message(f"Boutique {i} <news{i}@example.com>", f"Newsletter {i}", body, now - timedelta(minutes=i + 1), content_type="text/html"))
+
+    print(f"\n{'fetch IMAP':<16} {'secondes':>9} {'mails/s':>9} {'accélération':>13}")
+    reference = None
+    for workers in args.workers:
+        elapsed, mails = fetch_run(server, args.mails, workers)
+        reference = reference or (elapsed, mails)
+        if mails != reference[1]:
+            errors.append(f"fetch IMAP, {workers} processus : mails ou ordre différents")
+        label = "thread" if workers == 0 else f"{workers} processus"
+        print(f"{label:<16} {elapsed:>9.2f} {len(mails) / elapsed:>9.0f} {reference[0] / elapsed:>12.2f}x")
+    server.stop()
+
+    for error in errors:
+        print(f"❌ {error}")
+    if errors:
+        sys.exit(1)
+    print("✅ Mêmes corps, dans le même ordre, quel que soit le nombre de processus")
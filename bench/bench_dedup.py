@@ -0,0 +1,131 @@
+import os
+import sys
+import time
+import tempfile
+import random
+import string
+import argparse
+from pathlib import Path
+
+os.environ["SUMMARY_CACHE"] = ""
+os.environ["SEARCH_INDEX"] = ""
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from core.mail import Mail
+from core.dedup import group_records
+from core.report_store import Report
+from core import llm_wrapper
+from bench.fake_ollama import FakeOllamaServer
+
+TEMPLATES = [
+    "The workflow {name} run #{n} failed on branch {branch} at commit {sha}. View the logs at https://github.com/acme/{name}/actions/runs/{n}. You are receiving this because you are subscribed to this thread.",
+    "Pipeline #{n} for {branch} has failed. Project acme/{name}, commit {sha} by {user}. Job test:unit failed after 3 minutes. Manage your notification settings in GitLab.",
+    "Dependabot alert: a vulnerable dependency was found in acme/{name}. Package lodash, severity high, advisory GHSA-{sha}. Upgrade to version 4.17.{n} or later to fix the issue.",
+    "[{name}] New comment by {user} on pull request #{n}: looks good to me, just one question about the migration. Reply to this email directly or view it on GitHub.",
+]
+
+
+def random_word(rng: random.Random) -> str:
+    return "".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 10)))
+
+
+def generate(count: int, rng: random.Random, vocabulary: list, dup_ratio: float, thread_ratio: float):
+    # Retourne les records et, pour chacun, l'identifiant du groupe attendu
+    records, expected = [], []
+    threads = []
+    for i in range(count):
+        r = rng.random()
+        if r < dup_ratio:
+            f = rng.randrange(len(TEMPLATES))
+            body = TEMPLATES[f].format(name=rng.choice(["api", "web"]), n=rng.randint(1, 99999), branch=rng.choice(["main", "dev"]),
+                                       sha=f"{rng.getrandbits(28):07x}", user=rng.choice(["alice", "bob", "carol"]))
+            records.append({"body": body})
+            expected.append(("famille", f))
+        elif r < dup_ratio + thread_ratio and threads and rng.random() < 0.7:
+            # Réponse dans un fil existant : corps sans rapport avec le reste du fil, seuls les en-têtes les relient
+            t = rng.randrange(len(threads))
+            refs = threads[t]
+            message_id = f"<{i}@bench>"
+            records.append({"body": " ".join(rng.choices(vocabulary, k=40)), "message_id": message_id,
+                            "in_reply_to": refs[-1], "references": " ".join(refs)})
+            refs.append(message_id)
+            expected.append(("fil", t))
+        elif r < dup_ratio + thread_ratio:
+            threads.append([f"<{i}@bench>"])
+            records.append({"body": " ".join(rng.choices(vocabulary, k=40)), "message_id": f"<{i}@bench>"})
+            expected.append(("fil", len(threads) - 1))
+        else:
+            records.append({"body": " ".join(rng.choices(vocabulary, k=rng.randint(30, 120)))})
+            expected.append(("unique", i))
+    return [Mail.from_record(record) for record in records], expected
+
+
+def quality(groups: list, expected: list) -> tuple:
+    # Mails rangés avec une autre famille que celle de leur groupe / groupes en trop pour une même famille
+    wrong = 0
+    for group in groups:
+        labels = {}
+        for i in group["members"]:
+            labels[expected[i]] = labels.get(expected[i], 0) + 1
+        wrong += len(group["members"]) - max(labels.values())
+    found = {}
+    for group in groups:
+        for i in group["members"]:
+            found.setdefault(expected[i], set()).add(group["members"][0])
+    missed = sum(len(roots) - 1 for roots in found.values())
+    return wrong, missed
+
+
+def check_enrich_group(tmp: Path) -> list:
+    # Groupe de doublons dont un mail est déjà résumé : un échec Ollama ne doit pas effacer ce résumé,
+    # un nouveau résumé est recopié sur tout le groupe
+    errors = []
+    body = "Pipeline #42 for main has failed. Project acme/api, commit abc123. Job test:unit failed after 3 minutes."
+    mails = [
+        Mail.from_record({"from_name": "GitLab", "from_email": "ci@example.com", "subject": "Pipeline failed",
+                          "date": f"2025-07-0{day}T10:00:00+02:00", "body": body, "summary": summary})
+        for day, summary in ((1, "Ancien résumé"), (2, None))
+    ]
+    for failure_rate, expected in ((1.0, ["Ancien résumé", None]), (0.0, None)):
+        server = FakeOllamaServer(latency=0.0, failure_rate=failure_rate).start()
+        llm_wrapper.OLLAMA_URL = server.url
+        path = tmp / f"groupe-{failure_rate}.jsonl"
+        Report(path).write(mails)
+        llm_wrapper.enrich_file(path, concurrency=1, timeout=2, retries=0, cache=False, fallback=False, budget_seconds=0, budget_tokens=0)
+        server.stop()
+        summaries = [mail.summary for mail in Report(path)]
+        if expected is not None and summaries != expected:
+            errors.append(f"Ollama en échec : résumés {summaries} au lieu de {expected}")
+        if expected is None and (summaries[0] != summaries[1] or summaries[0] in (None, "Ancien résumé")):
+            errors.append(f"Ollama disponible : résumés {summaries}, le nouveau résumé du groupe n'est pas recopié")
+    return errors
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Regroupement doublons (SimHash + LSH) et fils de discussion")
+    parser.add_argument("--mails", type=int, nargs="+", default=[10_000, 50_000, 100_000])
+    parser.add_argument("--dup-ratio", type=float, default=0.4, help="Part d'alertes répétées (quelques gabarits)")
+    parser.add_argument("--thread-ratio", type=float, default=0.2, help="Part de mails appartenant à un fil")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocabulary = [random_word(rng) for _ in range(20_000)]
+
+    print(f"{'mails':>8} {'secondes':>9} {'µs/mail':>8} {'groupes':>8} {'appels LLM':>11} {'mal groupés':>12} {'manqués':>8}")
+    for count in args.mails:
+        records, expected = generate(count, rng, vocabulary, args.dup_ratio, args.thread_ratio)
+        start = time.perf_counter()
+        groups = group_records(records)
+        elapsed = time.perf_counter() - start
+        wrong, missed = quality(groups, expected)
+        print(f"{count:>8} {elapsed:>9.2f} {elapsed / count * 1e6:>8.1f} {len(groups):>8} "
+              f"{100 * len(groups) / count:>10.0f}% {wrong:>12} {missed:>8}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        errors = check_enrich_group(Path(tmp))
+    for error in errors:
+        print(f"❌ {error}")
+    if errors:
+        sys.exit(1)
+    print("✅ Résumés déjà présents conservés si Ollama échoue, nouveau résumé recopié sur tout le groupe")
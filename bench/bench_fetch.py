@@ -0,0 +1,82 @@
+import sys
+import time
+import argparse
+from pathlib import Path
+from datetime import datetime, timezone, timedelta
+from email.utils import parsedate_to_datetime
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from core.imap_client import IMAPClient
+from bench.fake_imap import FakeIMAPServer, build_message
+
+
+def seed(server: FakeIMAPServer, total: int, recent: int):
+    box = server.mailbox("INBOX")
+    now = datetime.now(timezone.utc)
+    for i in range(total):
+        if i >= total - recent:
+            date = now - timedelta(minutes=(total - i) * 5)
+        else:
+            date = now - timedelta(days=30, minutes=(total - i))
+        box.append(build_message(
+            f"Sender {i} <sender{i}@example.com>",
+            f"Notification {i}",
+            f"Bonjour,\nCeci est le message numéro {i}.\n" + "Lorem ipsum dolor sit amet. " * 20,
+            date,
+        ))
+
+
+def legacy_fetch_recent(client: IMAPClient, limit: int, hours: int, folder: str = "INBOX") -> list:
+    # Reproduction de l'ancien algorithme : SEARCH ALL puis deux FETCH par message
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=hours)
+    messages = []
+    client.conn.select(folder)
+    typ, data = client.conn.search(None, "ALL")
+    for num in reversed(data[0].split()):
+        typ, msg_data = client.conn.fetch(num, "(BODY[HEADER.FIELDS (FROM SUBJECT DATE)])")
+        headers = client._parse_header(msg_data[0][1].decode())
+        typ, body_data = client.conn.fetch(num, "(BODY[TEXT])")
+        headers["body"] = client._clean_body(client._html_to_text(client._decode_body(body_data[0][1])))
+        try:
+            if parsedate_to_datetime(headers["date"]) >= cutoff:
+                messages.append(headers)
+                if len(messages) >= limit:
+                    break
+        except Exception:
+            continue
+    return messages
+
+
+def run(name: str, server: FakeIMAPServer, fetch) -> dict:
+    client = IMAPClient(host="127.0.0.1", port=server.port, user="bench", password="bench", starttls=False)
+    client.connect()
+    server.reset_stats()
+    start = time.perf_counter()
+    mails = fetch(client)
+    elapsed = time.perf_counter() - start
+    round_trips = server.command_count
+    client.conn.logout()
+    return {"name": name, "mails": len(mails), "round_trips": round_trips, "seconds": elapsed}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark fetch_recent contre un serveur IMAP local")
+    parser.add_argument("--total", type=int, default=5000, help="Nombre de messages dans la boîte")
+    parser.add_argument("--recent", type=int, default=100, help="Nombre de messages dans la fenêtre")
+    parser.add_argument("--limit", type=int, default=30)
+    parser.add_argument("--hours", type=int, default=24)
+    args = parser.parse_args()
+
+    server = FakeIMAPServer().start()
+    seed(server, args.total, args.recent)
+
+    results = [
+        # L'ancien algorithme parcourt toute la boîte quand la fenêtre contient moins de `limit` mails
+        run("legacy", server, lambda c: legacy_fetch_recent(c, args.limit, args.hours)),
+        run("batched", server, lambda c: c.fetch_recent(limit=args.limit, hours=args.hours)),
+    ]
+    server.stop()
+
+    print(f"{'mode':<10} {'mails':>6} {'round-trips':>12} {'secondes':>10}")
+    for r in results:
+        print(f"{r['name']:<10} {r['mails']:>6} {r['round_trips']:>12} {r['seconds']:>10.3f}")
@@ -0,0 +1,105 @@
+import re
+import sys
+import time
+import argparse
+import tempfile
+from pathlib import Path
+from datetime import datetime, timezone
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from core.imap_client import IMAPClient
+from bench.fake_imap import FakeIMAPServer, build_message
+
+
+def seed(server: FakeIMAPServer, labels: int, messages: int):
+    # Arborescence à la Proton : parents \Noselect, des centaines de labels, quelques messages chacun
+    for parent in ("Folders", "Labels"):
+        server.mailbox(parent, attributes=("\\Noselect", "\\HasChildren"))
+    now = datetime.now(timezone.utc)
+    for i in range(labels):
+        box = server.mailbox(f"Labels/Label {i:03d}" if i % 5 else f"Folders/Dossier {i:03d}")
+        for j in range(i % messages):
+            box.append(build_message("a@example.com", f"Mail {j}", "Bonjour", now), flags=("\\Seen",) if j % 3 else ())
+
+
+def legacy_list(client: IMAPClient) -> list:
+    # Reproduction de l'ancien list_all_accessible_folders : LIST puis un SELECT par dossier
+    typ, data = client.conn.list("", "*")
+    folders = []
+    for raw in data:
+        parts = re.search(r'\((.*?)\)\s+"?([^"]+)"?\s+"?([^"]+)"?', raw.decode())
+        if parts:
+            flags, separator, name = parts.groups()
+            client.conn.select(name)
+            folders.append({"name": name, "separator": separator, "flags": flags.split(), "selectable": True})
+    return folders
+
+
+def expected_counts(server: FakeIMAPServer) -> dict:
+    return {
+        name: {"messages": len(box.messages), "unseen": sum(1 for m in box.messages if "\\Seen" not in m[2]), "uidnext": box.next_uid}
+        for name, box in server.mailboxes.items() if "\\Noselect" not in box.attributes
+    }
+
+
+def run(name: str, server: FakeIMAPServer, cache: Path, fn) -> dict:
+    client = IMAPClient(host="127.0.0.1", port=server.port, user="bench", password="bench", starttls=False)
+    client.folder_cache = str(cache)
+    server.reset_stats()
+    start = time.perf_counter()
+    folders = fn(client)
+    elapsed = time.perf_counter() - start
+    # Connexion exclue du compte : elle n'a lieu que si le mode en a besoin
+    commands = sum(1 for command in server.commands if command.split(" ", 2)[1] not in ("CAPABILITY", "LOGIN"))
+    # L'ancien code passe par imaplib sans compteur : ses commandes sont toutes séquentielles
+    round_trips = client.round_trips or commands
+    client.close()
+    return {"name": name, "folders": folders, "commands": commands, "round_trips": round_trips, "seconds": elapsed}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Découverte des dossiers : SELECT par dossier vs attributs LIST, STATUS pipelinés, LIST-STATUS et cache")
+    parser.add_argument("--labels", type=int, default=300)
+    parser.add_argument("--messages", type=int, default=7, help="Messages par label (modulo)")
+    parser.add_argument("--latency", type=float, default=0.01, help="Aller-retour réseau simulé (s)")
+    args = parser.parse_args()
+
+    errors = []
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = Path(tmp) / "folders_cache.json"
+        for list_status in (False, True):
+            server = FakeIMAPServer(latency=args.latency, list_status=list_status).start()
+            seed(server, args.labels, args.messages)
+            expected = expected_counts(server)
+            suffix = " (LIST-STATUS)" if list_status else ""
+            if not list_status:
+                results.append(run("SELECT par dossier", server, cache, lambda c: (c.connect(), legacy_list(c))[1]))
+            cache.unlink(missing_ok=True)
+            modes = [
+                (f"LIST + compteurs{suffix}", True),
+                ("cache, sans compteurs", False),
+                (f"cache + compteurs{suffix}", True),
+            ]
+            for name, counts in modes:
+                result = run(name, server, cache, lambda c: c.list_folders(counts=counts))
+                results.append(result)
+                selectable = {f["name"] for f in result["folders"] if f["selectable"]}
+                if selectable != set(expected):
+                    errors.append(f"{name} : dossiers sélectionnables différents")
+                if counts:
+                    found = {f["name"]: {k: f.get(k) for k in ("messages", "unseen", "uidnext")} for f in result["folders"] if f["selectable"]}
+                    if found != expected:
+                        errors.append(f"{name} : compteurs différents de ceux du serveur")
+            server.stop()
+
+    print(f"{args.labels} labels, aller-retour simulé de {args.latency * 1000:.0f} ms")
+    print(f"{'mode':<32} {'dossiers':>9} {'commandes':>10} {'allers-retours':>15} {'secondes':>10}")
+    for r in results:
+        print(f"{r['name']:<32} {len(r['folders']):>9} {r['commands']:>10} {r['round_trips']:>15} {r['seconds']:>10.3f}")
+
+    for error in errors:
+        print(f"❌ {error}")
+    if errors:
+        sys.exit(1)
+    print("✅ Mêmes dossiers et mêmes compteurs que le serveur")
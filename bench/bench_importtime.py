@@ -0,0 +1,145 @@
+import os
+import sys
+import time
+import tempfile
+import argparse
+import subprocess
+from pathlib import Path
+from datetime import datetime, timezone, timedelta
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+from bench.fake_imap import FakeIMAPServer, build_message
+from bench.fake_ollama import FakeOllamaServer
+
+# Modules qui ne doivent jamais être chargés par le pré-contrôle ni par les modules de stockage
+HEAVY = ("typer", "click", "rich", "httpx", "numpy", "bs4", "core.llm_wrapper", "core.pipeline", "core.semantic")
+# Modules importés seuls : (module, doit rester léger)
+MODULES = (
+    ("core.precheck", True),
+    ("core.metrics", True),
+    ("core.report_store", True),
+    ("core.mail_store", True),
+    ("core.search_index", True),
+    ("core.imap_client", True),
+    ("core.cli", False),
+    ("core.pipeline", False),
+)
+
+
+def importtime(args: list, env: dict = None, cwd: Path = ROOT, baseline: set = frozenset()) -> tuple:
+    # (temps d'import cumulé en ms, modules chargés, sortie) d'après "python -X importtime",
+    # sans les modules déjà chargés au démarrage de l'interpréteur (site, encodings...)
+    run = subprocess.run([sys.executable, "-X", "importtime", *args], capture_output=True, text=True, env=env, cwd=cwd)
+    total, modules = 0, set()
+    for line in run.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[12:].split("|")
+        if not cumulative.strip().isdigit() or name.strip() in baseline:
+            continue
+        if not name.startswith("  "):
+            # Module de premier niveau : son temps cumulé inclut tous ses imports
+            total += int(cumulative)
+        modules.add(name.strip())
+    return total / 1000, modules, run
+
+
+def heavy_modules(modules: set) -> list:
+    return sorted(m for m in modules if m in HEAVY or m.split(".")[0] in HEAVY)
+
+
+def check_module(module: str, light: bool, budget_ms: float, baseline: set) -> list:
+    own, modules, _ = importtime(["-c", f"import {module}"], baseline=baseline)
+    heavy = heavy_modules(modules)
+    print(f"{module:<20} {own:>8.1f} ms {len(modules):>6} module(s)  {', '.join(heavy[:5])}")
+    errors = []
+    if light and heavy:
+        errors.append(f"{module} charge {', '.join(heavy)}")
+    if light and own > budget_ms:
+        errors.append(f"{module} : {own:.1f} ms > {budget_ms:.0f} ms")
+    return errors
+
+
+def check_if_changed(budget_ms: float, baseline: set) -> list:
+    # run-all complet une fois, puis --if-changed sans nouveau mail (sortie anticipée), puis avec un nouveau mail
+    errors = []
+    tmp = tempfile.TemporaryDirectory()
+    imap = FakeIMAPServer().start()
+    ollama = FakeOllamaServer(latency=0.01).start()
+    now = datetime.now(timezone.utc)
+    for i in range(5):
+        imap.mailbox("INBOX").append(build_message(f"Expéditeur {i} <user{i}@example.com>", f"Sujet {i}", f"Corps du mail {i}.", now - timedelta(minutes=10 + i)))
+    env = dict(os.environ, IMAP_HOST="127.0.0.1", IMAP_PORT=str(imap.port), IMAP_USER="bench", IMAP_PASS="bench", IMAP_STARTTLS="0",
+               OLLAMA_URL=ollama.url, MAIL_STORE=str(Path(tmp.name) / "reports" / "mail_store.db"),
+               SUMMARY_CACHE="", SEARCH_INDEX="", PYTHONPATH=str(ROOT))
+    main = str(ROOT / "main.py")
+
+    def run(label: str, *options) -> tuple:
+        start = time.perf_counter()
+        ms, modules, result = importtime([main, "run-all", "--if-changed", *options], env, Path(tmp.name), baseline)
+        elapsed = (time.perf_counter() - start) * 1000
+        skipped = "💤" in result.stdout
+        heavy = heavy_modules(modules)
+        print(f"{label:<28} {elapsed:>8.0f} ms  imports {ms:>7.1f} ms  {'sortie anticipée' if skipped else 'pipeline complet'}")
+        if result.returncode != 0:
+            errors.append(f"{label} : code {result.returncode}\n{result.stdout[-500:]}{result.stderr[-500:]}")
+        return skipped, heavy, ms
+
+    try:
+        skipped, _, _ = run("premier run")
+        if skipped:
+            errors.append("premier run : sortie anticipée sans rapport existant")
+        skipped, heavy, ms = run("rien de nouveau")
+        if not skipped:
+            errors.append("rien de nouveau : le pipeline complet a été relancé")
+        if heavy:
+            errors.append(f"rien de nouveau : le pré-contrôle charge {', '.join(heavy)}")
+        if ms > budget_ms:
+            errors.append(f"rien de nouveau : imports {ms:.1f} ms > {budget_ms:.0f} ms")
+        # Autre fenêtre : un autre rapport que celui du run précédent, jamais une sortie anticipée
+        skipped, _, _ = run("autre fenêtre (--hours 48)", "--hours", "48")
+        if skipped:
+            errors.append("autre fenêtre : sortie anticipée sur le rapport d'un run avec d'autres options")
+        run("retour à --hours 24")
+        skipped, _, _ = run("rien de nouveau (bis)")
+        if not skipped:
+            errors.append("rien de nouveau (bis) : le pipeline complet a été relancé")
+        # Un dump avance le store et réécrit le rapport sans le classer : run-all doit repasser
+        dump = subprocess.run([sys.executable, main, "dump"], capture_output=True, text=True, env=env, cwd=tmp.name)
+        if dump.returncode != 0:
+            errors.append(f"dump : code {dump.returncode}\n{dump.stdout[-500:]}{dump.stderr[-500:]}")
+        skipped, _, _ = run("après un dump")
+        if skipped:
+            errors.append("après un dump : sortie anticipée sur un rapport non classé")
+        imap.mailbox("INBOX").append(build_message("Monitoring <ops@example.com>", "Nouvelle alerte", "Incident détecté.", datetime.now(timezone.utc)))
+        skipped, _, _ = run("nouveau mail")
+        if skipped:
+            errors.append("nouveau mail : sortie anticipée alors que UIDNEXT a avancé")
+    finally:
+        imap.stop()
+        ollama.stop()
+        tmp.cleanup()
+    return errors
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Temps d'import (-X importtime) des points d'entrée et sortie anticipée de run-all --if-changed")
+    parser.add_argument("--budget-ms", type=float, default=150.0, help="Temps d'import maximal d'un module léger ou du pré-contrôle")
+    parser.add_argument("--no-run", action="store_true", help="Seulement les imports, sans lancer main.py")
+    args = parser.parse_args()
+
+    print(f"{'module':<20} {'import':>11} {'chargés':>16}  lourds")
+    baseline = importtime(["-c", "pass"])[1]
+    errors = []
+    for module, light in MODULES:
+        errors += check_module(module, light, args.budget_ms, baseline)
+    if not args.no_run:
+        print()
+        errors += check_if_changed(args.budget_ms, baseline)
+
+    for error in errors:
+        print(f"❌ {error}")
+    if errors:
+        sys.exit(1)
+    print("✅ Imports et pré-contrôle dans le budget")
@@ -0,0 +1,41 @@
+import sys
+import time
+import argparse
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from core import llm_wrapper
+from bench.fake_ollama import FakeOllamaServer
+
+
+def corpus(size: int) -> list:
+    return [f"Bonjour, le build #{i} du projet mcp-mail-agent a échoué sur la branche main." for i in range(size)]
+
+
+def run(texts: list, concurrency: int) -> dict:
+    start = time.perf_counter()
+    summaries = llm_wrapper.summarize_many(texts, concurrency=concurrency)
+    elapsed = time.perf_counter() - start
+    ordered = all(s and f"#{i} " in s for i, s in enumerate(summaries))
+    return {"concurrency": concurrency, "seconds": elapsed, "rate": len(texts) / elapsed, "ordered": ordered}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Débit de summarize_many contre un faux serveur Ollama")
+    parser.add_argument("--mails", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8, 16])
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(latency=args.latency, failure_rate=args.failure_rate).start()
+    llm_wrapper.OLLAMA_URL = server.url
+    llm_wrapper.LLM_BACKOFF = 0.01
+    texts = corpus(args.mails)
+
+    print(f"{'concurrence':>11} {'secondes':>9} {'mails/s':>9} {'ordre':>6}")
+    for concurrency in args.concurrency:
+        r = run(texts, concurrency)
+        print(f"{r['concurrency']:>11} {r['seconds']:>9.2f} {r['rate']:>9.1f} {'ok' if r['ordered'] else 'KO':>6}")
+    print(f"requêtes HTTP : {server.request_count}")
+    server.stop()
@@ -0,0 +1,66 @@
+import sys
+import time
+import random
+import argparse
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from core import llm_wrapper
+from bench.fake_ollama import FakeOllamaServer
+
+SHORT = [
+    "Notification #{i} : le build du projet mcp-mail-agent a échoué sur la branche main.",
+    "Alerte #{i} : nouvelle connexion à votre compte depuis un appareil inconnu.",
+    "Facture #{i} : votre paiement de 12,00 € a bien été reçu, merci.",
+    "Rappel #{i} : la réunion d'équipe commence dans 15 minutes.",
+]
+
+
+def fixtures(size: int, long_ratio: float, seed: int) -> list:
+    rng = random.Random(seed)
+    texts = []
+    for i in range(size):
+        if rng.random() < long_ratio:
+            texts.append(f"Compte rendu #{i} : " + "Le projet avance, plusieurs points restent ouverts. " * 80)
+        else:
+            texts.append(rng.choice(SHORT).format(i=i))
+    return texts
+
+
+def run(server: FakeOllamaServer, texts: list, concurrency: int, batch_tokens: int) -> dict:
+    server.request_count = 0
+    server.prompts = []
+    start = time.perf_counter()
+    summaries = llm_wrapper.summarize_many(texts, concurrency=concurrency, use_cache=False, batch_tokens=batch_tokens)
+    elapsed = time.perf_counter() - start
+    return {
+        "seconds": elapsed,
+        "requests": server.request_count,
+        "tokens": sum(llm_wrapper.estimate_tokens(p) for p in server.prompts),
+        "correct": sum(bool(s) and f"#{i} " in s for i, s in enumerate(summaries)),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Résumés groupés vs un appel par mail, contre un faux serveur Ollama")
+    parser.add_argument("--mails", type=int, default=200)
+    parser.add_argument("--long-ratio", type=float, default=0.1, help="Part de mails trop longs pour être groupés")
+    parser.add_argument("--latency", type=float, default=0.2, help="Coût fixe par requête (secondes)")
+    parser.add_argument("--token-latency", type=float, default=0.0005, help="Coût par token de prompt (secondes)")
+    parser.add_argument("--bad-json-rate", type=float, default=0.0)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--budgets", type=int, nargs="+", default=[0, 500, 1000, 2000], help="Budgets en tokens (0 = un appel par mail)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(latency=args.latency, token_latency=args.token_latency, bad_json_rate=args.bad_json_rate).start()
+    llm_wrapper.OLLAMA_URL = server.url
+    llm_wrapper.LLM_BACKOFF = 0.01
+    texts = fixtures(args.mails, args.long_ratio, args.seed)
+
+    print(f"{'budget':>7} {'requêtes':>9} {'tokens':>8} {'secondes':>9} {'mails/s':>8} {'corrects':>9}")
+    for budget in args.budgets:
+        r = run(server, texts, args.concurrency, budget)
+        print(f"{budget or 'unitaire':>7} {r['requests']:>9} {r['tokens']:>8} {r['seconds']:>9.2f} "
+              f"{len(texts) / r['seconds']:>8.1f} {r['correct']:>5}/{len(texts)}")
+    server.stop()
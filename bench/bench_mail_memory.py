@@ -0,0 +1,119 @@
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import tempfile
+import multiprocessing
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from core.mail import Mail
+from core.report_store import Report
+
+WORDS = ("bonjour", "facture", "réunion", "déploiement", "échéance", "merci", "projet", "sécurité", "paiement", "à", "été", "livraison")
+# Caractères hors Latin-1 fréquents dans les vrais mails : une str Python passe alors à 2 ou 4 octets par caractère
+EXTRAS = ("", "", "l’équipe", "12 €", "— cordialement", "🚀", "👍")
+
+
+def generate(path: Path, count: int, rng: random.Random):
+    # Rapport au schéma actuel, tel que l'écrivait le pipeline (tags, score et summary à null compris)
+    senders = [(f"Expéditeur {i}", f"user{i}@example{i % 50}.com") for i in range(2000)]
+    with path.open("w", encoding="utf-8") as f:
+        for i in range(count):
+            name, email = rng.choice(senders)
+            words = rng.choices(WORDS, k=rng.randint(30, 600))
+            words.insert(rng.randrange(len(words)), rng.choice(EXTRAS))
+            record = {
+                "from_name": name,
+                "from_email": email,
+                "subject": f"Sujet {i} {rng.choice(WORDS)}",
+                "date": f"2025-07-{1 + i % 28:02d}T{i % 24:02d}:{i % 60:02d}:00+02:00",
+                "body": " ".join(words),
+            }
+            if i % 4 == 0:
+                record["message_id"] = f"<{i}@example.com>"
+            record["tags"] = rng.choice([[], ["dev"], ["finance", "alert"]])
+            record["score"] = rng.choice([None, 2, 8])
+            record["summary"] = rng.choice([None, f"Résumé du mail {i}."])
+            if i % 10 == 0:
+                record.update(group=i, group_size=2, group_kind="doublons")
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def load_dicts(path: Path) -> list:
+    # Ancien modèle : un dict par mail, corps en str
+    with path.open("r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def load_mails(path: Path) -> list:
+    return list(Report(path))
+
+
+def measure(mode: str, path: Path, result):
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    records = load_dicts(path) if mode == "dicts" else load_mails(path)
+    loaded = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Lecture de tous les corps : coût du décodage à la demande
+    start = time.perf_counter()
+    chars = sum(len(r["body"]) for r in records) if mode == "dicts" else sum(len(r.body) for r in records)
+    result.put((len(records), loaded, time.perf_counter() - start, (peak - baseline) / 1024, chars))
+
+
+def run(mode: str, path: Path) -> tuple:
+    # Un process neuf par mesure : le pic RSS n'hérite pas de la mesure précédente
+    ctx = multiprocessing.get_context("spawn")
+    result = ctx.Queue()
+    process = ctx.Process(target=measure, args=(mode, path, result))
+    process.start()
+    values = result.get()
+    process.join()
+    return values
+
+
+def round_trip(path: Path) -> list:
+    # Schéma JSON conservé : mêmes clés et valeurs, à part les optionnels à null que Mail n'écrit pas
+    errors = []
+    with path.open("r", encoding="utf-8") as f:
+        for i, line in enumerate(f):
+            record = json.loads(line)
+            expected = {k: v for k, v in record.items() if v is not None}
+            if Mail.from_record(record).to_record() != expected:
+                errors.append(f"ligne {i} : aller-retour dict → Mail → dict différent")
+                if len(errors) >= 5:
+                    break
+    return errors
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pic RSS d'un rapport chargé en mémoire : dicts vs Mail à slots et corps en bytes")
+    parser.add_argument("--mails", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    errors = []
+    if hasattr(Mail(), "__dict__"):
+        errors.append("Mail a un __dict__ : slots perdus")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "report.jsonl"
+        generate(path, args.mails, random.Random(args.seed))
+        print(f"{args.mails} mails, rapport de {path.stat().st_size / 2**20:.0f} Mio")
+        print(f"{'modèle':<8} {'chargement s':>13} {'corps lus s':>12} {'pic RSS Mio':>12} {'octets/mail':>12}")
+        results = {}
+        for mode in ("dicts", "mails"):
+            count, loaded, bodies, rss, chars = results[mode] = run(mode, path)
+            print(f"{mode:<8} {loaded:>13.2f} {bodies:>12.2f} {rss:>12.1f} {rss * 2**20 / count:>12.0f}")
+        if results["dicts"][4] != results["mails"][4]:
+            errors.append("corps différents entre les deux modèles")
+        print(f"pic RSS : {results['mails'][3] / results['dicts'][3]:.0%} de celui des dicts")
+        errors += round_trip(path)
+
+    for error in errors:
+        print(f"❌ {error}")
+    if errors:
+        sys.exit(1)
+    print("✅ Même schéma JSON à l'aller-retour, mêmes corps")
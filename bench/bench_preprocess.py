@@ -0,0 +1,141 @@
+import os
+import sys
+import time
+import argparse
+from email import message_from_bytes, policy
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from bench.fake_ollama import FakeOllamaServer
+from bench import corpus
+
+# Cas que le corpus généré ne couvre pas : (corps, texte qui doit rester, textes qui doivent disparaître)
+EDGE_CASES = [
+    ("Hi,\n\nThe deploy is done.\n\nOn Mon, Jul 7, 2025 at 10:02 AM Bob <bob@example.com> wrote:\n> Is it done?\n> Thanks",
+     "The deploy is done.", ("wrote:", "Is it done?")),
+    ("Ok pour jeudi.\n\nDe : Jean Dupont\nEnvoyé : lundi 7 juillet 2025 10:00\nÀ : Marie\nObjet : Livraison\n\nOn livre jeudi ?",
+     "Ok pour jeudi.", ("Jean Dupont", "On livre jeudi ?")),
+    ("Bonjour,\n\nLe devis est en pièce jointe.\n\nCe message et ses pièces jointes sont confidentiels et destinés exclusivement "
+     "à leurs destinataires. Si vous avez reçu ce message par erreur, merci de le détruire.",
+     "Le devis est en pièce jointe.", ("confidentiels",)),
+    ("Le 5 juil. 2025 à 09:12, Paul <paul@example.com> a écrit :\n> Tu valides ?\n\nValidé, on part là-dessus.",
+     "Validé, on part là-dessus.", ("a écrit", "Tu valides ?")),
+    ("Le suivi est ici : https://track.example.com/c/123?utm_source=mail&utm_medium=x, merci de vérifier.\n\n-- \nPaul",
+     "track.example.com", ("utm_source", "Paul")),
+]
+
+
+def corpus_bodies(size: int, seed: int) -> list:
+    # Corps tels que les produit le fetch IMAP : partie texte (ou HTML convertie) puis clean_body
+    from core.mime import html_to_text, clean_body
+    bodies = []
+    for raw, _ in corpus.generate(size, seed):
+        message = message_from_bytes(raw, policy=policy.default)
+        part = message.get_body(("plain", "html"))
+        text = part.get_content() if part else ""
+        if part and part.get_content_subtype() == "html":
+            text = html_to_text(text)
+        bodies.append(clean_body(text))
+    return bodies
+
+
+def check(bodies: list, prepared: list, input_tokens: int) -> list:
+    from core.preprocess import estimate_tokens, prepare
+    errors = []
+    for body, text in zip(bodies, prepared):
+        if input_tokens and estimate_tokens(text) > input_tokens:
+            errors.append(f"budget dépassé : {estimate_tokens(text)} > {input_tokens} tokens")
+        if "a écrit :" in body and ("a écrit :" in text or any(line.startswith(">") for line in text.splitlines())):
+            errors.append(f"historique cité resté : {text[:80]!r}")
+        if "http" in text:
+            errors.append(f"URL restée : {text[:80]!r}")
+        if not text.strip():
+            errors.append(f"corps vidé : {body[:80]!r}")
+        if len(errors) >= 5:
+            return errors
+    for body, kept, removed in EDGE_CASES:
+        text = prepare(body, input_tokens)
+        if kept not in text or any(word in text for word in removed):
+            errors.append(f"cas limite mal traité : {body[:50]!r} → {text!r}")
+    return errors + check_limits(bodies, input_tokens)
+
+
+def check_limits(bodies: list, input_tokens: int) -> list:
+    # Budgets minuscules et gros groupes de doublons : le texte envoyé ne doit ni déborder ni fondre
+    from core.preprocess import estimate_tokens, truncate, prepare, prepare_group, _TRUNCATED
+    errors = []
+    longest = max(bodies, key=len)
+    for max_tokens in (1, 2, 3, 8):
+        text = truncate(longest, max_tokens)
+        if len(text) > max(max_tokens * 4, len(_TRUNCATED)):
+            errors.append(f"budget de {max_tokens} token(s) dépassé : {len(text)} caractères gardés")
+    if not input_tokens:
+        return errors
+    alone = prepare(longest, input_tokens)
+    for size in (1, 2, 10, 50, 400):
+        text, _, after = prepare_group([longest] * size, input_tokens)
+        if text != alone or after > input_tokens:
+            errors.append(f"groupe de {size} doublons : {len(text)} caractères envoyés au lieu de {len(alone)}")
+    thread = bodies[:200]
+    text, _, after = prepare_group(thread, input_tokens)
+    if after > input_tokens + 2 * len(thread) or len(text) < len(alone) // 2:
+        errors.append(f"fil de {len(thread)} messages : {after} tokens envoyés pour un budget de {input_tokens}")
+    return errors
+
+
+def summarize(texts: list, server: FakeOllamaServer, concurrency: int) -> dict:
+    from core import llm_wrapper
+    from core.preprocess import estimate_tokens
+    server.prompts.clear()
+    start = time.perf_counter()
+    summaries = llm_wrapper.summarize_many(texts, concurrency=concurrency, use_cache=False)
+    elapsed = time.perf_counter() - start
+    return {
+        "seconds": elapsed,
+        "tokens": sum(estimate_tokens(prompt) for prompt in server.prompts),
+        "requests": len(server.prompts),
+        "failed": sum(1 for summary in summaries if summary is None),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prétraitement avant résumé : tokens envoyés et latence des résumés, avec et sans")
+    parser.add_argument("--mails", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--input-tokens", type=int, default=1024, help="Budget de tokens par mail (0 = pas de troncature)")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.02, help="Latence fixe par requête du faux Ollama")
+    parser.add_argument("--token-latency", type=float, default=0.0002, help="Évaluation du prompt, secondes par token")
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(latency=args.latency, token_latency=args.token_latency).start()
+    os.environ["OLLAMA_URL"] = server.url
+    from core.preprocess import prepare
+    from core import llm_wrapper
+    llm_wrapper.OLLAMA_URL = server.url
+
+    bodies = corpus_bodies(args.mails, args.seed)
+    start = time.perf_counter()
+    prepared = [prepare(body, args.input_tokens) for body in bodies]
+    prep_seconds = time.perf_counter() - start
+    errors = check(bodies, prepared, args.input_tokens)
+
+    results = {"brut": summarize(bodies, server, args.concurrency), "prétraité": summarize(prepared, server, args.concurrency)}
+    server.stop()
+    llm_wrapper.close_cache()
+
+    print(f"{args.mails} mails (corpus {args.seed}), prétraitement en {prep_seconds * 1000:.0f} ms "
+          f"({prep_seconds / len(bodies) * 1e6:.0f} µs/mail)")
+    print(f"{'corps':<10} {'requêtes':>9} {'tokens':>9} {'secondes':>9} {'ms/mail':>8}")
+    for name, r in results.items():
+        print(f"{name:<10} {r['requests']:>9} {r['tokens']:>9} {r['seconds']:>9.2f} {r['seconds'] / len(bodies) * 1000:>8.1f}")
+        if r["failed"]:
+            errors.append(f"{name} : {r['failed']} résumé(s) en échec")
+    raw, short = results["brut"], results["prétraité"]
+    print(f"tokens de prompt : -{1 - short['tokens'] / raw['tokens']:.0%}, latence des résumés : -{1 - short['seconds'] / raw['seconds']:.0%}")
+
+    for error in errors:
+        print(f"❌ {error}")
+    if errors:
+        sys.exit(1)
+    print("✅ Historique, signatures, mentions légales et URLs retirés, budget respecté")
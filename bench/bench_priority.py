@@ -0,0 +1,58 @@
+import os
+import sys
+import random
+import argparse
+from pathlib import Path
+
+# Pas de cache disque : chaque scénario repart de zéro
+os.environ["SUMMARY_CACHE"] = ""
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from core import llm_wrapper
+from core.mail import Mail
+from bench.fake_ollama import FakeOllamaServer
+
+
+def generate(count: int, alert_ratio: float, rng: random.Random) -> list:
+    # Alertes et mails finance (score 6-8) noyés au hasard parmi les newsletters (score 0-2)
+    records = []
+    for i in range(count):
+        alert = rng.random() < alert_ratio
+        records.append(Mail.from_record({
+            "date": f"2025-07-05T{i // 60 % 24:02d}:{i % 60:02d}:00+00:00",
+            "score": rng.choice([6, 7, 8]) if alert else rng.choice([0, 1, 2]),
+            "body": f"{'Alerte' if alert else 'Newsletter'} {i} : " + " ".join(f"mot{rng.randrange(10_000)}" for _ in range(60)),
+        }))
+    return records
+
+
+def run(records: list, ordered: bool, args) -> tuple:
+    budget = llm_wrapper.Budget(args.budget_seconds, args.budget_tokens)
+    priorities = [llm_wrapper.priority(record) for record in records] if ordered else None
+    summaries = llm_wrapper.summarize_many([record.body for record in records], concurrency=args.concurrency, retries=0,
+                                           use_cache=False, priorities=priorities, budget=budget)
+    done = [record for record, summary in zip(records, summaries) if summary is not llm_wrapper.SKIPPED and summary]
+    alerts = sum(1 for record in records if record.score >= 6)
+    return len(done), sum(1 for record in done if record.score >= 6), alerts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Résumés sous budget : ordre du fichier vs priorité (score, date)")
+    parser.add_argument("--mails", type=int, default=200)
+    parser.add_argument("--alert-ratio", type=float, default=0.1)
+    parser.add_argument("--latency", type=float, default=0.2, help="Latence du faux Ollama par requête")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--budget-seconds", type=float, default=3.0)
+    parser.add_argument("--budget-tokens", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    ollama = FakeOllamaServer(latency=args.latency).start()
+    llm_wrapper.OLLAMA_URL = ollama.url
+    records = generate(args.mails, args.alert_ratio, random.Random(args.seed))
+
+    print(f"{'ordre':<10} {'résumés':>8} {'alertes résumées':>17}")
+    for name, ordered in (("fichier", False), ("priorité", True)):
+        done, alerts_done, alerts = run(records, ordered, args)
+        print(f"{name:<10} {done:>8} {alerts_done:>10}/{alerts:<6}")
+    ollama.stop()
@@ -0,0 +1,167 @@
+import gc
+import os
+import sys
+import json
+import time
+import random
+import tempfile
+import argparse
+from pathlib import Path
+from datetime import datetime
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from core.render import render_stream, get_templates
+from core.report_store import Report
+from core.mail import Mail
+from core.dedup import group_label as _group_label
+
+
+def group_label(record: dict) -> str:
+    return _group_label(Mail.from_record(record))
+
+
+# Ancien rendu (core/reporter.py et core/generate_summary_md.py avant les gabarits Jinja2), copié tel quel
+def legacy_report_markdown(records: list) -> str:
+    lines = ["# Rapport de mails récents\\n"]
+
+    for i, record in enumerate(records):
+        if record.get("group", i) != i:
+            continue
+        try:
+            short_date = datetime.fromisoformat(record["date"]).strftime("%d %b %H:%M")
+        except Exception:
+            short_date = record["date"]
+
+        preview = record["body"][:300].replace("\\n", " ")
+
+        lines.append(f"## [{short_date}] {record['from_name']} <{record['from_email']}>")
+        lines.append(f"** Sujet :** {record['subject']}\\n")
+        if record.get("group_size"):
+            lines.append(f"** Groupe :** {group_label(record)}\\n")
+        lines.append(f"** Aperçu :** {preview}...\\n")
+
+    return "\\n".join(lines)
+
+
+def legacy_summary_markdown(mails) -> str:
+    lines = [f"# Résumé du {datetime.now().strftime('%d %B %Y')}\n"]
+
+    for i, mail in enumerate(mails):
+        # Groupe de doublons ou fil de discussion : une seule entrée, celle du mail le plus récent
+        if mail.get("group", i) != i:
+            continue
+        name = mail.get("from_name", "")
+        email = mail.get("from_email", "")
+        subject = mail.get("subject", "")
+        tags = ", ".join(mail.get("tags", [])) or "aucun tag"
+        summary = mail.get("summary") or "(pas de résumé)"
+        if mail.get("summary_pending"):
+            # Hors budget au dernier run : extrait du mail en attendant le résumé LLM
+            summary = f"{summary} ⏳"
+
+        try:
+            dt = datetime.fromisoformat(mail["date"])
+            short_date = dt.strftime("%d %b %H:%M")
+        except Exception:
+            short_date = mail["date"]
+
+        lines.append(f"## {name} <{email}>")
+        lines.append(f"🕒 {short_date} - 📌 {tags}")
+        if mail.get("group_size"):
+            lines.append(f"🔁 {group_label(mail)}")
+        lines.append(f"🧠 {summary}\n")
+
+    return "\n".join(lines)
+
+
+def legacy_write(records: list, root: Path):
+    # Trois passages sur des dicts : Markdown du rapport, JSON Lines, puis Markdown du résumé
+    (root / "report.md").write_text(legacy_report_markdown(records), encoding="utf-8")
+    with (root / "report.jsonl").open("w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    (root / "report.summary.md").write_text(legacy_summary_markdown(records), encoding="utf-8")
+
+
+def stream_write(records: list, root: Path):
+    Report(root / "report.jsonl").write(render_stream(records, root / "report.md", root / "report.summary.md"))
+
+
+def generate(count: int, rng: random.Random) -> list:
+    # Cas limites mélangés : groupes, dates illisibles, résumés absents ou en attente, accolades Jinja, "\n" littéraux
+    records = []
+    for i in range(count):
+        record = {
+            "from_name": rng.choice(["Alice", "Bob {{ x }}", "", "Équipe <Ops>"]),
+            "from_email": f"user{i}@example.com",
+            "subject": rng.choice(["Facture {% raw %}", "Re: incident", "Newsletter & promo", "Sujet\\navec échappement"]),
+            "date": f"2025-07-{1 + i % 28:02d}T{i % 24:02d}:{i % 60:02d}:00+02:00" if i % 17 else "Mon, 7 Jul 2025 garbage",
+            "body": " ".join(rng.choices(["Bonjour", "ligne\\nsuivante", "{{ body }}", "&amp;", "mot"], k=rng.randint(10, 120))),
+            "tags": rng.choice([[], ["dev"], ["alert", "finance"]]),
+            "score": rng.choice([None, 1, 5, 8]),
+        }
+        if i % 3:
+            record["summary"] = rng.choice([f"Résumé {i}.", None, ""])
+        if i % 11 == 0:
+            record["summary_pending"] = True
+        if i % 7 == 0 and i:
+            # Membre d'un groupe : seul le chef de groupe a une entrée dans les Markdown
+            record["group"] = i - 1
+            records[i - 1].update(group=i - 1, group_size=2, group_kind=rng.choice(["doublon", "fil"]))
+        records.append(record)
+    return records
+
+
+def same_records(legacy: Path, stream: Path) -> bool:
+    # Le modèle Mail n'écrit pas les champs optionnels vides (null) : même contenu, clés nulles en moins
+    def rows(path: Path) -> list:
+        with path.open("r", encoding="utf-8") as f:
+            return [{k: v for k, v in json.loads(line).items() if v is not None} for line in f]
+    return rows(legacy) == rows(stream)
+
+
+def timed(runs: list, rounds: int) -> list:
+    # Tours alternés entre les rendus, meilleur temps de chacun : la dérive de la machine pèse sur tous pareil
+    best = [float("inf")] * len(runs)
+    for _ in range(rounds):
+        for i, (fn, records, root) in enumerate(runs):
+            gc.collect()
+            start = time.perf_counter()
+            fn(records, root)
+            best[i] = min(best[i], time.perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rendu des rapports : trois passages f-string vs un passage Jinja2 précompilé")
+    parser.add_argument("--mails", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    get_templates()
+    print(f"Compilation des gabarits : {(time.perf_counter() - start) * 1000:.1f} ms (une fois par processus)")
+
+    errors = []
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_root, stream_root = Path(tmp) / "legacy", Path(tmp) / "stream"
+        legacy_root.mkdir()
+        stream_root.mkdir()
+        print(f"{'mails':>8} {'ancien s':>9} {'ancien mails/s':>15} {'jinja s':>9} {'jinja mails/s':>14}")
+        for count in args.mails:
+            records = generate(count, random.Random(args.seed))
+            mails = [Mail.from_record(record) for record in records]
+            legacy, stream = timed([(legacy_write, records, legacy_root), (stream_write, mails, stream_root)], args.rounds)
+            print(f"{count:>8} {legacy:>9.2f} {count / legacy:>15.0f} {stream:>9.2f} {count / stream:>14.0f}")
+            for name in ("report.md", "report.summary.md"):
+                if (legacy_root / name).read_bytes() != (stream_root / name).read_bytes():
+                    errors.append(f"{count} mails : {name} différent de l'ancien rendu")
+            if not same_records(legacy_root / "report.jsonl", stream_root / "report.jsonl"):
+                errors.append(f"{count} mails : report.jsonl différent de l'ancien rendu")
+
+    for error in errors:
+        print(f"❌ {error}")
+    if errors:
+        sys.exit(1)
+    print("✅ Markdown et résumé identiques à l'ancien rendu, mêmes mails dans le JSON Lines")
@@ -0,0 +1,101 @@
+import sys
+import json
+import time
+import random
+import resource
+import argparse
+import tempfile
+import multiprocessing
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from core.report_store import Report
+from core.mail import Mail
+
+
+def generate(count: int, body_size: int):
+    rng = random.Random(42)
+    words = ["build", "facture", "réunion", "alerte", "projet", "paiement", "déploiement", "sécurité"]
+    # Quelques corps tirés une fois puis réutilisés : on mesure le stockage, pas la génération
+    bodies = [" ".join(rng.choice(words) for _ in range(body_size // 8)) for _ in range(100)]
+    for i in range(count):
+        yield {
+            "from_name": f"Sender {i}",
+            "from_email": f"sender{i}@example.com",
+            "subject": f"Notification {i}",
+            "date": "2025-07-05T10:00:00+02:00",
+            "body": f"{i} {bodies[i % len(bodies)]}",
+        }
+
+
+def legacy_save(path: Path, count: int, body_size: int):
+    # Ancien format : tableau complet en mémoire puis indent=2
+    with path.open("w", encoding="utf-8") as f:
+        json.dump(list(generate(count, body_size)), f, ensure_ascii=False, indent=2)
+
+
+def legacy_load(path: Path, count: int, body_size: int):
+    with path.open("r", encoding="utf-8") as f:
+        return len(json.load(f))
+
+
+def legacy_tag(path: Path, count: int, body_size: int):
+    with path.open("r", encoding="utf-8") as f:
+        mails = json.load(f)
+    for mail in mails:
+        mail["tags"], mail["score"] = ["dev"], 5
+    with path.open("w", encoding="utf-8") as f:
+        json.dump(mails, f, ensure_ascii=False, indent=2)
+
+
+def jsonl_save(path: Path, count: int, body_size: int):
+    Report(path).write(map(Mail.from_record, generate(count, body_size)))
+
+
+def jsonl_load(path: Path, count: int, body_size: int):
+    return sum(1 for _ in Report(path))
+
+
+def jsonl_tag(path: Path, count: int, body_size: int):
+    report = Report(path)
+    report.update_columns((i, {"tags": ["dev"], "score": 5}) for i, _ in enumerate(report))
+
+
+def measure(fn, path, count, body_size, result):
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    fn(path, count, body_size)
+    result.put((time.perf_counter() - start, baseline, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+
+
+def run(fn, path: Path, count: int, body_size: int) -> tuple:
+    # Un process neuf par mesure : le pic RSS n'hérite pas des mesures précédentes
+    ctx = multiprocessing.get_context("spawn")
+    result = ctx.Queue()
+    process = ctx.Process(target=measure, args=(fn, path, count, body_size, result))
+    process.start()
+    elapsed, baseline, peak = result.get()
+    process.join()
+    return elapsed, (peak - baseline) / 1024
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rapport JSON indenté vs JSON Lines : temps et pic RSS")
+    parser.add_argument("--mails", type=int, default=100_000)
+    parser.add_argument("--body-size", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        formats = [
+            ("json", Path(tmp) / "report.json", legacy_save, legacy_load, legacy_tag),
+            ("jsonl", Path(tmp) / "report.jsonl", jsonl_save, jsonl_load, jsonl_tag),
+            ("jsonl.gz", Path(tmp) / "report.jsonl.gz", jsonl_save, jsonl_load, jsonl_tag),
+        ]
+        print(f"{args.mails} mails, corps ~{args.body_size} caractères")
+        print(f"{'format':<9} {'opération':<10} {'secondes':>9} {'pic RSS Mio':>12} {'fichier Mio':>12}")
+        for name, path, save, load, tag in formats:
+            for operation, fn in (("écriture", save), ("lecture", load), ("tagging", tag)):
+                elapsed, rss = run(fn, path, args.mails, args.body_size)
+                print(f"{name:<9} {operation:<10} {elapsed:>9.2f} {rss:>12.1f} {path.stat().st_size / 2**20:>12.1f}")
+            for p in Path(tmp).iterdir():
+                p.unlink()
@@ -0,0 +1,139 @@
+import sys
+import time
+import random
+import string
+import argparse
+import tempfile
+from pathlib import Path
+from datetime import datetime, timezone
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from core.rules import RuleEngine
+from core.mail import Mail
+from bench.fake_imap import FakeIMAPServer, build_message
+
+
+def random_word(rng: random.Random, lo: int = 4, hi: int = 10) -> str:
+    return "".join(rng.choices(string.ascii_lowercase, k=rng.randint(lo, hi)))
+
+
+def generate_rules(count: int, rng: random.Random) -> list:
+    rules = []
+    for i in range(count):
+        kind = i % 10
+        tag = f"tag{i % 50}"
+        score = rng.randint(1, 8)
+        if kind < 5:
+            rules.append({"field": "subject", "contains": [random_word(rng) for _ in range(3)], "tag": tag, "score": score})
+        elif kind < 8:
+            rules.append({"field": "from", "domains": [f"{random_word(rng)}.com"], "tag": tag, "score": score})
+        elif kind < 9:
+            rules.append({"field": "body", "contains": [random_word(rng, 6, 12)], "tag": tag, "score": score})
+        else:
+            rules.append({"field": "body", "regex": rf"{random_word(rng, 5, 8)} #\d+", "tag": tag, "score": score})
+    return rules
+
+
+def generate_mails(count: int, rules: list, rng: random.Random) -> list:
+    vocabulary = [random_word(rng) for _ in range(2000)]
+    keywords = [kw for rule in rules for kw in rule.get("contains", [])]
+    domains = [d for rule in rules for d in rule.get("domains", [])]
+    mails = []
+    for _ in range(count):
+        subject = rng.choices(vocabulary, k=6)
+        if rng.random() < 0.3:
+            subject.append(rng.choice(keywords))
+        domain = rng.choice(domains) if rng.random() < 0.3 else f"{rng.choice(vocabulary)}.org"
+        mails.append(Mail(
+            subject=" ".join(subject),
+            from_email=f"{rng.choice(vocabulary)}@{domain}",
+            raw_body=" ".join(rng.choices(vocabulary, k=60)).encode("utf-8"),
+        ))
+    return mails
+
+
+def naive_classify(rules: list, mail: Mail) -> set:
+    import re
+    hits = set()
+    fields = {"from": mail.from_email.lower(), "subject": mail.subject.lower(), "body": mail.body.lower()}
+    for rule_id, rule in enumerate(rules):
+        text = fields[rule["field"]]
+        if any(kw in text for kw in rule.get("contains", [])):
+            hits.add(rule_id)
+        if any(text.endswith("@" + d) or text.endswith("." + d) for d in rule.get("domains", [])):
+            hits.add(rule_id)
+        if "regex" in rule and re.search(rule["regex"], text, re.IGNORECASE):
+            hits.add(rule_id)
+    return hits
+
+
+def check_header_rules() -> list:
+    # Règle "header:list-id" de bout en bout : fetch IMAP (direct et via le store), to_mail, puis un rapport relu
+    from core.imap_client import IMAPClient
+    from core.mail_store import MailStore
+    from core.reporter import to_mail
+    rules = [{"field": "header:List-Id", "contains": ["ci.example.com"], "tag": "ci", "score": 3}]
+    engine = RuleEngine(rules)
+    server = FakeIMAPServer().start()
+    now = datetime.now(timezone.utc)
+    box = server.mailbox("INBOX")
+    box.append(build_message("CI <ci@example.com>", "Build #12 failed", "Le build a échoué.", now, extra_headers={"List-Id": "<builds.ci.example.com>"}))
+    box.append(build_message("Alice <alice@example.com>", "Déjeuner", "On se voit à midi ?", now))
+    errors = []
+    client = IMAPClient(host="127.0.0.1", port=server.port, user="bench", password="bench", starttls=False, extra_headers=engine.headers)
+    client.connect()
+    with tempfile.TemporaryDirectory() as tmp:
+        store = MailStore(Path(tmp) / "store.db")
+        client.sync_folder(store, "INBOX", hours=1)
+        sources = {"fetch direct": client.fetch_recent(limit=10, hours=1), "store": store.recent("INBOX", hours=1)}
+        store.close()
+    client.close()
+    server.stop()
+    for name, mails in sources.items():
+        tags = {mail["subject"]: engine.classify(to_mail(mail)).tags for mail in mails}
+        reread = {mail["subject"]: engine.classify(Mail.from_record(to_mail(mail).to_record())).tags for mail in mails}
+        expected = {"Build #12 failed": ["ci"], "Déjeuner": []}
+        if tags != expected or reread != expected:
+            errors.append(f"règle header:list-id ({name}) : {tags} / rapport relu {reread}")
+    return errors
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark du moteur de règles compilé")
+    parser.add_argument("--rules", type=int, default=10_000)
+    parser.add_argument("--mails", type=int, default=100_000)
+    parser.add_argument("--naive-sample", type=int, default=200, help="Mails évalués par la boucle naïve (extrapolée)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    rules = generate_rules(args.rules, rng)
+    mails = generate_mails(args.mails, rules, rng)
+
+    start = time.perf_counter()
+    engine = RuleEngine(rules)
+    compile_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    engine.classify_many(mails)
+    classify_time = time.perf_counter() - start
+
+    sample = mails[:args.naive_sample]
+    start = time.perf_counter()
+    mismatches = sum(naive_classify(rules, m) != set(engine.match(m)) for m in sample)
+    naive_time = (time.perf_counter() - start) / max(len(sample), 1) * len(mails)
+
+    print(f"règles : {args.rules}  mails : {args.mails}")
+    print(f"compilation     : {compile_time:.2f}s")
+    print(f"classify_many   : {classify_time:.2f}s ({args.mails / classify_time:,.0f} mails/s)")
+    print(f"boucle naïve    : ~{naive_time:.0f}s (extrapolé sur {len(sample)} mails)")
+    print(f"écarts vs naïf  : {mismatches}/{len(sample)}")
+
+    errors = check_header_rules()
+    if mismatches:
+        errors.append(f"{mismatches} mail(s) classé(s) autrement que par la boucle naïve")
+    for error in errors:
+        print(f"❌ {error}")
+    if errors:
+        sys.exit(1)
+    print("✅ Mêmes règles déclenchées que la boucle naïve, règles sur en-têtes comprises")
@@ -0,0 +1,107 @@
+import sys
+import sqlite3
+import time
+import random
+import itertools
+import string
+import tempfile
+import argparse
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from core.search_index import SearchIndex
+from core.mail import Mail
+
+
+def random_word(rng: random.Random, lo: int = 3, hi: int = 10) -> str:
+    return "".join(rng.choices(string.ascii_lowercase, k=rng.randint(lo, hi)))
+
+
+def generate(count: int, vocabulary: list, rng: random.Random, offset: int = 0):
+    # Distribution de Zipf approchée : quelques mots très fréquents, une longue traîne de mots rares
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+    for i in range(offset, offset + count):
+        words = rng.choices(vocabulary, cum_weights=cum_weights, k=60)
+        yield Mail(
+            from_name=f"Sender {i % 5000}",
+            from_email=f"sender{i % 5000}@{vocabulary[i % 300]}.com",
+            subject=" ".join(words[:6]),
+            date=f"2025-{1 + i % 12:02d}-{1 + i % 28:02d}T10:{i % 60:02d}:00+02:00",
+            raw_body=" ".join(words[6:]).encode("utf-8"),
+            tags=["dev"] if i % 3 == 0 else [],
+            score=5 if i % 3 == 0 else None,
+            summary=f"Résumé {' '.join(words[:4])}",
+        )
+
+
+def check_concurrent(path: Path) -> list:
+    # Un index ouvert en lecture (viewer, search --open) ne doit pas bloquer l'indexation d'un autre processus
+    reader = SearchIndex(path)
+    errors = []
+    if reader.db.in_transaction:
+        errors.append("transaction d'écriture laissée ouverte à l'ouverture de l'index")
+    writer = None
+    try:
+        writer = SearchIndex(path)
+        writer.index([Mail(from_email="a@example.com", subject="verrou", date="2025-01-01", raw_body=b"verrou")], "verrou.json")
+        if not reader.search_ids("verrou"):
+            errors.append("mail indexé par une autre connexion introuvable")
+    except sqlite3.OperationalError as e:
+        errors.append(f"indexation bloquée par un index ouvert ailleurs : {e}")
+    if writer:
+        writer.close()
+    reader.close()
+    return errors
+
+
+def percentile(values: list, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Débit d'indexation et latence des recherches FTS5")
+    parser.add_argument("--mails", type=int, default=1_000_000)
+    parser.add_argument("--batch", type=int, default=10_000, help="Mails par rapport indexé (une transaction)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocabulary = [random_word(rng) for _ in range(20_000)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        errors = check_concurrent(Path(tmp) / "concurrent.db")
+        index = SearchIndex(Path(tmp) / "search.db")
+        first = list(generate(min(args.batch, args.mails), vocabulary, rng))
+        start = time.perf_counter()
+        index.index(first, "report_0.json")
+        for offset in range(len(first), args.mails, args.batch):
+            index.index(generate(min(args.batch, args.mails - offset), vocabulary, rng, offset), f"report_{offset}.json")
+        elapsed = time.perf_counter() - start
+        size = sum(p.stat().st_size for p in Path(tmp).iterdir() if p.name.startswith("search.db"))
+        print(f"indexation : {args.mails} mails en {elapsed:.1f}s ({args.mails / elapsed:,.0f} mails/s), {size / 2**20:.0f} Mio")
+
+        # Réindexation d'un rapport déjà vu (tags/résumé ajoutés) : mise à jour, pas de doublon
+        start = time.perf_counter()
+        for record in first:
+            record.tags.append("relu")
+            record.summary += " (mis à jour)"
+        index.index(first, "report_0.json")
+        print(f"réindexation de {len(first)} mails : {time.perf_counter() - start:.2f}s, {len(index)} mails distincts")
+
+        for label, words in (("mot fréquent", vocabulary[:20]), ("mot rare", vocabulary[-2000:]), ("deux mots", None)):
+            latencies, hits = [], 0
+            for _ in range(args.queries):
+                query = f"{rng.choice(vocabulary[:200])} {rng.choice(vocabulary[1000:3000])}" if words is None else rng.choice(words)
+                start = time.perf_counter()
+                hits += len(index.search(query, limit=20))
+                latencies.append((time.perf_counter() - start) * 1000)
+            print(f"{label:<13}: p50 {percentile(latencies, 0.5):6.1f} ms  p95 {percentile(latencies, 0.95):6.1f} ms  "
+                  f"({hits / args.queries:.1f} résultats en moyenne)")
+        index.close()
+
+    for error in errors:
+        print(f"❌ {error}")
+    if errors:
+        sys.exit(1)
@@ -0,0 +1,52 @@
+import sys
+import time
+import random
+import string
+import argparse
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from core.semantic import SemanticIndex, HashingEmbedder, load_examples, SEMANTIC_EXAMPLES
+from core.mail import Mail
+
+
+def generate(count: int, examples: list, rng: random.Random, noise: float) -> tuple:
+    # Variantes des exemples étiquetés : mots de la même famille mélangés, bruit aléatoire, jamais le texte d'origine
+    vocab = {}
+    for example in examples:
+        vocab.setdefault(example["tag"], []).extend(f"{example['subject']} {example['body']}".split())
+    tags = list(vocab)
+    mails, expected = [], []
+    for _ in range(count):
+        tag = rng.choice(tags)
+        words = rng.choices(vocab[tag], k=rng.randint(20, 80))
+        words = [w if rng.random() > noise else "".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9))) for w in words]
+        mails.append(Mail(subject=" ".join(words[:6]), from_email="someone@example.com", raw_body=" ".join(words[6:]).encode("utf-8")))
+        expected.append(tag)
+    return mails, expected
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Classifieur sémantique : débit (mails/s) et précision, centroïde vs kNN")
+    parser.add_argument("--mails", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--noise", type=float, default=0.5, help="Part des mots remplacés par du bruit")
+    parser.add_argument("--dim", type=int, nargs="+", default=[256, 1024])
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    examples = load_examples(SEMANTIC_EXAMPLES)
+
+    print(f"{'mails':>8} {'dim':>5} {'mode':<9} {'secondes':>9} {'mails/s':>9} {'taggés':>7} {'justes':>7}")
+    for count in args.mails:
+        mails, expected = generate(count, examples, rng, args.noise)
+        for dim in args.dim:
+            index = SemanticIndex.build(examples, HashingEmbedder(dim))
+            for mode in ("centroid", "knn"):
+                start = time.perf_counter()
+                results = index.predict(mails, mode=mode)
+                elapsed = time.perf_counter() - start
+                tagged = [(r[0], e) for r, e in zip(results, expected) if r is not None]
+                right = sum(1 for tag, e in tagged if tag == e)
+                print(f"{count:>8} {dim:>5} {mode:<9} {elapsed:>9.2f} {count / elapsed:>9.0f} "
+                      f"{100 * len(tagged) / count:>6.0f}% {100 * right / max(len(tagged), 1):>6.0f}%")
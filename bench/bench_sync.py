@@ -0,0 +1,130 @@
+import sys
+import time
+import argparse
+import tempfile
+from pathlib import Path
+from datetime import datetime, timezone, timedelta
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from core.imap_client import IMAPClient
+from core.mail_store import MailStore
+from core.pipeline import fetch_mails
+from bench.fake_imap import FakeIMAPServer, build_message
+
+
+def seed(server: FakeIMAPServer, count: int, start: datetime, step: timedelta):
+    box = server.mailbox("INBOX")
+    for i in range(count):
+        n = len(box.messages)
+        box.append(build_message(f"Sender {n} <sender{n}@example.com>", f"Mail {n}", f"Bonjour,\nCeci est le mail {n}.\n" + "Lorem ipsum. " * 30, start + i * step))
+
+
+def client_for(server: FakeIMAPServer) -> IMAPClient:
+    client = IMAPClient(host="127.0.0.1", port=server.port, user="bench", password="bench", starttls=False)
+    client.connect()
+    return client
+
+
+def legacy_fetch(client: IMAPClient, store_path: Path, hours: int, limit: int):
+    # Ancien fetch_mails : sync complète, puis lecture du store
+    store = MailStore(store_path)
+    client.sync_folder(store, folder="INBOX", hours=hours)
+    mails = store.recent("INBOX", hours=hours, limit=limit)
+    store.close()
+    yield from mails
+
+
+def run(name: str, server: FakeIMAPServer, mails) -> dict:
+    server.reset_stats()
+    start = time.perf_counter()
+    first, uids = None, []
+    for mail in mails:
+        if first is None:
+            first = time.perf_counter() - start
+        uids.append(mail["uid"])
+    return {"name": name, "uids": uids, "first": first or 0.0, "seconds": time.perf_counter() - start}
+
+
+def expected(store_path: Path, hours: int, limit: int) -> list:
+    store = MailStore(store_path)
+    uids = [mail["uid"] for mail in store.recent("INBOX", hours=hours, limit=limit)]
+    store.close()
+    return uids
+
+
+def check_growing_window(tmp: Path, latency: float, now: datetime) -> list:
+    # --hours augmenté entre deux runs : les mails plus anciens que la première fenêtre doivent être rattrapés
+    errors = []
+    server = FakeIMAPServer(latency=latency).start()
+    seed(server, 300, now - timedelta(hours=70), timedelta(hours=69) / 300)
+    client = client_for(server)
+    truth = run("référence", server, fetch_mails(client, "INBOX", 72, 1000, store_path=tmp / "reference.db"))["uids"]
+    client.close()
+
+    store_path = tmp / "fenetre.db"
+    # Recherches SINCE attendues : première sync, rattrapage, puis plus rien pour une fenêtre déjà couverte
+    for hours, searches in ((24, 1), (72, 1), (72, 0)):
+        client = client_for(server)
+        result = run(f"fenêtre {hours}h", server, fetch_mails(client, "INBOX", hours, 1000, store_path=store_path))
+        client.close()
+        since = sum(1 for command in server.commands if " SEARCH " in command.upper() and "SINCE" in command.upper())
+        if result["uids"] != expected(store_path, hours, 1000):
+            errors.append(f"fenêtre {hours}h : mails ou ordre différents de MailStore.recent")
+        if hours == 72 and result["uids"] != truth:
+            errors.append(f"fenêtre élargie à 72h : {len(result['uids'])} mails au lieu de {len(truth)}, plus anciens non rattrapés")
+        if since != searches:
+            errors.append(f"fenêtre {hours}h : {since} recherche(s) SINCE au lieu de {searches}")
+    server.stop()
+    print(f"Fenêtre élargie de 24h à 72h : {len(truth)} mails attendus")
+    return errors
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sync incrémentale : premiers mails rendus pendant le fetch, ordre identique au store")
+    parser.add_argument("--mails", type=int, default=1000, help="Mails dans la fenêtre au premier run")
+    parser.add_argument("--new", type=int, default=300, help="Mails arrivés avant le second run")
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.005, help="Aller-retour réseau simulé (s)")
+    args = parser.parse_args()
+
+    errors = []
+    results = []
+    now = datetime.now(timezone.utc)
+    with tempfile.TemporaryDirectory() as tmp:
+        server = FakeIMAPServer(latency=args.latency).start()
+        seed(server, args.mails, now - timedelta(hours=20), timedelta(hours=18) / args.mails)
+        for name, fetch in (("sync puis store", legacy_fetch), ("flux", fetch_mails)):
+            store_path = Path(tmp) / f"{name}.db"
+            client = client_for(server)
+            results.append(run(f"{name} (premier run)", server, fetch(client, "INBOX", 24, args.mails, store_path=store_path) if fetch is fetch_mails
+                               else fetch(client, store_path, 24, args.mails)))
+            client.close()
+            if results[-1]["uids"] != expected(store_path, 24, args.mails):
+                errors.append(f"{name} : mails ou ordre différents de MailStore.recent")
+
+        # Second run : nouveaux mails par-dessus un store déjà rempli, limite plus petite que leur nombre
+        seed(server, args.new, now - timedelta(hours=1), timedelta(minutes=50) / args.new)
+        for limit in (args.limit, args.new + args.limit):
+            store_path = Path(tmp) / "flux.db"
+            client = client_for(server)
+            result = run(f"flux (incrémental, limit {limit})", server, fetch_mails(client, "INBOX", 24, limit, store_path=store_path))
+            client.close()
+            results.append(result)
+            if result["uids"] != expected(store_path, 24, limit):
+                errors.append(f"incrémental, limit {limit} : mails ou ordre différents de MailStore.recent")
+        server.stop()
+        errors += check_growing_window(Path(tmp), args.latency, now)
+
+    print(f"{args.mails} mails puis {args.new} nouveaux, aller-retour simulé de {args.latency * 1000:.0f} ms")
+    print(f"{'mode':<36} {'mails':>6} {'1er mail (s)':>13} {'total (s)':>10}")
+    for r in results:
+        print(f"{r['name']:<36} {len(r['uids']):>6} {r['first']:>13.3f} {r['seconds']:>10.3f}")
+    streamed = results[1]
+    if streamed["first"] > streamed["seconds"] / 2:
+        errors.append(f"premier mail rendu après {streamed['first']:.2f}s sur {streamed['seconds']:.2f}s : la sync n'est pas en flux")
+
+    for error in errors:
+        print(f"❌ {error}")
+    if errors:
+        sys.exit(1)
+    print("✅ Premiers mails rendus pendant la sync, mêmes mails et même ordre que le store, fenêtre élargie rattrapée")
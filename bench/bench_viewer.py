@@ -0,0 +1,94 @@
+import sys
+import json
+import time
+import random
+import asyncio
+import tempfile
+import argparse
+import tracemalloc
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from core.report_store import ReportIndex
+from viewer import MailViewer
+
+
+def write_report(path: Path, size: int, body_size: int):
+    rng = random.Random(42)
+    with path.open("w", encoding="utf-8") as f:
+        f.write("[\n")
+        for i in range(size):
+            record = {
+                "from_name": f"Sender {i}",
+                "from_email": f"sender{i}@example.com",
+                "subject": f"Notification {i}",
+                "date": "2025-07-05T10:00:00+02:00",
+                "body": " ".join(rng.choice(["build", "facture", "réunion", "alerte", "projet"]) for _ in range(body_size // 7)),
+                "tags": ["dev"] if i % 3 == 0 else [],
+                "score": 5 if i % 3 == 0 else None,
+                "summary": f"Résumé {i}",
+            }
+            f.write(("" if i == 0 else ",\n") + json.dumps(record, ensure_ascii=False, indent=2))
+        f.write("\n]")
+
+
+def measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+async def viewer_startup(path: Path, idle: float) -> tuple:
+    app = MailViewer(str(path))
+    start = time.perf_counter()
+    async with app.run_test() as pilot:
+        await pilot.pause()
+        startup = time.perf_counter() - start
+        # CPU consommé au repos : plus de polling toutes les 0.1 s
+        cpu = time.process_time()
+        await asyncio.sleep(idle)
+        idle_cpu = time.process_time() - cpu
+        for _ in range(3):
+            await pilot.press("ctrl+end")
+            await pilot.pause()
+    return startup, idle_cpu, app.loaded
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ouverture d'un gros rapport : json.load vs index d'offsets")
+    parser.add_argument("--mails", type=int, default=50_000)
+    parser.add_argument("--body-size", type=int, default=2000, help="Taille approximative des corps (caractères)")
+    parser.add_argument("--lookups", type=int, default=1000)
+    parser.add_argument("--idle", type=float, default=2.0, help="Durée d'observation du viewer au repos (secondes)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "report.json"
+        write_report(path, args.mails, args.body_size)
+        print(f"rapport : {args.mails} mails, {path.stat().st_size / 2**20:.0f} Mio")
+
+        mails, elapsed, peak = measure(lambda: json.load(path.open(encoding="utf-8")))
+        print(f"json.load         : {elapsed:>7.2f}s  pic {peak / 2**20:>7.1f} Mio")
+        del mails
+
+        report, elapsed, peak = measure(lambda: ReportIndex(path))
+        print(f"index (à froid)   : {elapsed:>7.2f}s  pic {peak / 2**20:>7.1f} Mio")
+        report.close()
+
+        report, elapsed, peak = measure(lambda: ReportIndex(path))
+        print(f"index (persisté)  : {elapsed:>7.2f}s  pic {peak / 2**20:>7.1f} Mio")
+
+        rng = random.Random(0)
+        start = time.perf_counter()
+        for _ in range(args.lookups):
+            report.get(rng.randrange(len(report)))
+        print(f"accès aléatoire   : {(time.perf_counter() - start) / args.lookups * 1e6:>7.0f} µs/mail")
+        report.close()
+
+        startup, idle_cpu, loaded = asyncio.run(viewer_startup(path, args.idle))
+        print(f"viewer démarrage  : {startup:>7.2f}s  ({loaded} lignes chargées après 3x 'ctrl+end')")
+        print(f"viewer au repos   : {idle_cpu:>7.2f}s CPU sur {args.idle:.0f}s")
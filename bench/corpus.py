@@ -0,0 +1,153 @@
+import sys
+import base64
+import random
+import argparse
+from pathlib import Path
+from email.utils import format_datetime
+from datetime import datetime, timezone, timedelta
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from bench.fake_imap import build_message
+
+# Corpus de boîtes aux lettres générés (graine fixe) : même contenu d'une machine à l'autre, pour comparer les runs
+SIZES = {"1k": 1_000, "10k": 10_000, "100k": 100_000}
+
+WORDS = ("bonjour", "projet", "réunion", "demain", "livraison", "équipe", "retour", "version", "client", "budget",
+         "planning", "merci", "semaine", "document", "validation", "échéance", "question", "point", "suite", "accord")
+SENDERS = [(f"Contact {i}", f"contact{i}@partenaire{i % 40}.fr") for i in range(300)]
+NEWSLETTERS = [(f"Boutique {i}", f"news@boutique{i}.com") for i in range(30)]
+# Mélange d'un vrai dossier : (genre, part du corpus)
+MIX = (("perso", 0.40), ("fil", 0.15), ("newsletter", 0.20), ("ci", 0.12), ("facture", 0.08), ("piece_jointe", 0.05))
+# Pied de page légal ajouté par les serveurs d'un partenaire sur quatre
+DISCLAIMER_DOMAINS = {f"partenaire{i}.fr" for i in range(0, 40, 4)}
+DISCLAIMER = ("Ce message et toutes les pièces jointes sont confidentiels et établis à l'intention exclusive de leurs "
+              "destinataires. Si vous avez reçu ce message par erreur, merci d'en avertir immédiatement l'émetteur et de le "
+              "détruire. Toute utilisation, diffusion ou publication, totale ou partielle, est interdite sauf autorisation.")
+# Historique cité gardé d'une réponse à l'autre, comme un client mail, dans la limite de cette taille
+QUOTE_MAX_CHARS = 6000
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    text = " ".join(rng.choices(WORDS, k=words)).capitalize()
+    # Caractères hors Latin-1 courants dans les vrais mails
+    return text + rng.choice((".", ".", " !", " — à suivre.", " (l’équipe)."))
+
+
+def _paragraphs(rng: random.Random, count: int) -> str:
+    return "\n\n".join(_sentence(rng, rng.randint(8, 40)) for _ in range(count))
+
+
+def _newsletter(rng: random.Random, i: int) -> str:
+    rows = "".join(
+        f'<tr><td style="padding:8px"><a href="https://track.example.com/c/{i}/{r}">{_sentence(rng, 8)}</a> '
+        f"&amp; -{rng.randrange(10, 70)}&nbsp;%</td></tr>"
+        for r in range(rng.randint(10, 40))
+    )
+    return (f"<html><head><style>td {{ color: #333; }}</style></head><body><h1>Newsletter n°{i} 🎉</h1>"
+            f"<table>{rows}</table><p><a href='https://example.com/unsubscribe/{i}'>Se désabonner</a></p></body></html>")
+
+
+def _with_attachment(sender: str, subject: str, body: str, date: datetime, rng: random.Random, headers: dict) -> bytes:
+    # multipart/mixed écrit à la main : email.generator est trop lent pour 5 000 pièces jointes
+    boundary = f"=_corpus_{rng.getrandbits(64):016x}"
+    attachment = base64.encodebytes(rng.randbytes(rng.randint(20_000, 120_000))).decode("ascii")
+    lines = [
+        f"From: {sender}",
+        f"Subject: {subject}",
+        f"Date: {format_datetime(date)}",
+        *(f"{name}: {value}" for name, value in headers.items()),
+        "MIME-Version: 1.0",
+        f'Content-Type: multipart/mixed; boundary="{boundary}"',
+        "",
+        f"--{boundary}",
+        "Content-Type: text/plain; charset=utf-8",
+        "Content-Transfer-Encoding: 8bit",
+        "",
+        body,
+        f"--{boundary}",
+        'Content-Type: application/pdf; name="document.pdf"',
+        "Content-Transfer-Encoding: base64",
+        'Content-Disposition: attachment; filename="document.pdf"',
+        "",
+        attachment,
+        f"--{boundary}--",
+        "",
+    ]
+    return "\n".join(lines).replace("\n", "\r\n").encode("utf-8")
+
+
+def generate(size: int, seed: int = 42, now: datetime = None, days: int = 7):
+    # (message brut, date de réception), du plus ancien au plus récent, répartis sur les `days` derniers jours
+    rng = random.Random(seed)
+    now = now or datetime.now(timezone.utc)
+    kinds, weights = zip(*MIX)
+    threads = []
+    for i in range(size):
+        date = now - timedelta(seconds=(size - i) * days * 86400 / size)
+        kind = rng.choices(kinds, weights)[0]
+        headers = {"Message-ID": f"<{seed}.{i}@corpus.example>"}
+        if kind == "fil" and threads:
+            # Réponse à un fil existant : message précédent cité en entier, avec son propre historique
+            thread = rng.choice(threads)
+            name, email = rng.choice(SENDERS)
+            quoted = "\n".join(f"> {line}" if line else ">" for line in thread["last"].splitlines())
+            body = f"{_paragraphs(rng, rng.randint(1, 2))}\n\n{name}\n\nLe {format_datetime(date)}, {thread['from']} a écrit :\n{quoted}"
+            headers.update({"In-Reply-To": thread["ids"][-1], "References": " ".join(thread["ids"][-5:])})
+            thread["ids"].append(headers["Message-ID"])
+            thread.update(last=body[:QUOTE_MAX_CHARS], **{"from": name})
+            yield build_message(f"{name} <{email}>", f"Re: {thread['subject']}", body, date, extra_headers=headers), date
+            continue
+        if kind in ("perso", "fil"):
+            name, email = rng.choice(SENDERS)
+            subject = f"{_sentence(rng, 4)[:-1]} #{i}"
+            body = f"Bonjour,\n\n{_paragraphs(rng, rng.randint(1, 6))}\n\nCordialement,\n{name}\n--\n{name} · Tél. 01 23 45 67 {i % 100:02d}"
+            if email.split("@")[1] in DISCLAIMER_DOMAINS:
+                body += f"\n\n{DISCLAIMER}"
+            if kind == "fil":
+                threads.append({"ids": [headers["Message-ID"]], "subject": subject, "last": body, "from": name})
+                threads = threads[-200:]
+            yield build_message(f"{name} <{email}>", subject, body, date, extra_headers=headers), date
+        elif kind == "newsletter":
+            name, email = rng.choice(NEWSLETTERS)
+            yield build_message(f"{name} <{email}>", f"Nos offres de la semaine n°{i}", _newsletter(rng, i), date, content_type="text/html", extra_headers=headers), date
+        elif kind == "ci":
+            # Notifications quasi identiques : ce que le dédoublonnage doit regrouper
+            repo = rng.choice(("api", "web", "worker"))
+            body = (f"The workflow {repo} run #{rng.randint(1, 99999)} failed on branch {rng.choice(('main', 'dev'))} "
+                    f"at commit {rng.getrandbits(28):07x}. View the logs at https://github.com/acme/{repo}/actions. "
+                    "You are receiving this because you are subscribed to this thread.")
+            yield build_message(f"GitHub <notifications@github.com>", f"[acme/{repo}] Run failed: CI - main", body, date, extra_headers=headers), date
+        elif kind == "facture":
+            amount = rng.randint(10, 5000)
+            body = f"Bonjour,\n\nVotre facture n°F-{i:06d} d’un montant de {amount},00 € est disponible.\n\nÉchéance : 30 jours.\n\nLe service comptabilité"
+            yield build_message(f"Comptabilité <factures@fournisseur{i % 12}.fr>", f"Facture F-{i:06d}", body, date, extra_headers=headers), date
+        else:
+            name, email = rng.choice(SENDERS)
+            yield _with_attachment(f"{name} <{email}>", f"Document à valider #{i}", f"Bonjour,\n\n{_paragraphs(rng, 2)}\n\n{name}", date, rng, headers), date
+
+
+def load(server, size: int, seed: int = 42, folder: str = "INBOX", now: datetime = None) -> int:
+    box = server.mailbox(folder)
+    for raw, date in generate(size, seed, now):
+        box.append(raw, internaldate=date)
+    return size
+
+
+def parse_size(value: str) -> int:
+    return SIZES.get(value) or int(value)
+
+
+if __name__ == "__main__":
+    from bench.fake_imap import FakeIMAPServer
+
+    parser = argparse.ArgumentParser(description="Faux serveur IMAP chargé d'un corpus généré (1k, 10k ou 100k messages)")
+    parser.add_argument("--size", default="1k", help="1k, 10k, 100k ou un nombre de messages")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--port", type=int, default=1143)
+    parser.add_argument("--starttls", action="store_true", help="Annonce STARTTLS (certificat auto-signé, nécessite openssl)")
+    args = parser.parse_args()
+
+    server = FakeIMAPServer(port=args.port, starttls=args.starttls)
+    count = load(server, parse_size(args.size), args.seed)
+    print(f"📡 Fake IMAP en écoute sur 127.0.0.1:{server.port} ({count} messages dans INBOX)")
+    server.serve_forever()
@@ -0,0 +1,501 @@
+import re
+import ssl
+import socket
+import time
+import select
+import tempfile
+import subprocess
+import socketserver
+import threading
+from pathlib import Path
+from email import message_from_bytes
+from email.utils import parsedate_to_datetime, format_datetime
+from datetime import datetime, timezone, timedelta
+
+MONTHS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
+
+def build_message(sender: str, subject: str, body: str, date: datetime, content_type: str = "text/plain", extra_headers: dict = None) -> bytes:
+    headers = [
+        f"From: {sender}",
+        f"Subject: {subject}",
+        f"Date: {format_datetime(date)}",
+        "MIME-Version: 1.0",
+        f"Content-Type: {content_type}; charset=utf-8",
+        "Content-Transfer-Encoding: 8bit",
+    ]
+    # Message-ID, In-Reply-To, References... ; les valeurs longues sont repliées comme le ferait un vrai client
+    for name, value in (extra_headers or {}).items():
+        headers.append(f"{name}: " + "\r\n ".join(value.split(" ")))
+    return ("\r\n".join(headers) + "\r\n\r\n" + body.replace("\n", "\r\n")).encode("utf-8")
+
+
+class Mailbox:
+    def __init__(self, name: str, uidvalidity: int = 1, attributes=()):
+        self.name = name
+        self.uidvalidity = uidvalidity
+        # Attributs renvoyés par LIST ; \Noselect : dossier parent sans messages (SELECT et STATUS refusés)
+        self.attributes = tuple(attributes) or ("\\HasNoChildren",)
+        self.next_uid = 1
+        self.messages = []  # [uid, raw, flags, internaldate]
+        # UID → position dans messages : un UID FETCH ne parcourt pas toute la boîte (corpus de 100k messages)
+        self.positions = {}
+        self.lock = threading.Lock()
+
+    def append(self, raw: bytes, flags=(), internaldate: datetime = None) -> int:
+        raw = raw.replace(b"\r\n", b"\n").replace(b"\n", b"\r\n")
+        if internaldate is None:
+            try:
+                internaldate = parsedate_to_datetime(message_from_bytes(raw)["Date"])
+            except Exception:
+                internaldate = datetime.now(timezone.utc)
+        with self.lock:
+            uid = self.next_uid
+            self.next_uid += 1
+            self.positions[uid] = len(self.messages)
+            self.messages.append([uid, raw, set(flags), internaldate])
+        return uid
+
+
+class FakeIMAPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, idle=True, latency=0.0, starttls=False, list_status=False):
+        super().__init__((host, port), FakeIMAPHandler)
+        self.mailboxes = {"INBOX": Mailbox("INBOX")}
+        self.idle = idle
+        # LIST-STATUS (RFC 5819) : compteurs renvoyés avec le LIST
+        self.list_status = list_status
+        # STARTTLS optionnel, comme le Bridge : certificat auto-signé généré au démarrage (le client ne le vérifie pas)
+        self.tls_context = _self_signed_context() if starttls else None
+        # Aller-retour réseau simulé, ajouté avant chaque réponse
+        self.latency = latency
+        self.command_count = 0
+        self.commands = []
+        self.connections = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def capabilities(self) -> str:
+        return ("IMAP4rev1 UIDPLUS" + (" IDLE" if self.idle else "") + (" STARTTLS" if self.tls_context else "")
+                + (" LIST-STATUS" if self.list_status else ""))
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def mailbox(self, name: str, attributes=()) -> Mailbox:
+        if name not in self.mailboxes:
+            self.mailboxes[name] = Mailbox(name, attributes=attributes)
+        return self.mailboxes[name]
+
+    def record(self, command: str):
+        with self._lock:
+            self.command_count += 1
+            self.commands.append(command)
+
+    def reset_stats(self):
+        with self._lock:
+            self.command_count = 0
+            self.commands = []
+
+    def drop_connections(self):
+        # Coupure réseau simulée : toutes les sessions ouvertes sont fermées côté serveur
+        with self._lock:
+            connections = list(self.connections)
+        for connection in connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        return len(connections)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def _self_signed_context() -> ssl.SSLContext:
+    with tempfile.TemporaryDirectory() as tmp:
+        cert, key = Path(tmp) / "cert.pem", Path(tmp) / "key.pem"
+        try:
+            subprocess.run(
+                ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1", "-subj", "/CN=127.0.0.1",
+                 "-keyout", str(key), "-out", str(cert)],
+                check=True, capture_output=True,
+            )
+        except (OSError, subprocess.CalledProcessError) as e:
+            raise RuntimeError(f"openssl est requis pour le STARTTLS du faux serveur IMAP ({e})")
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert, key)
+    return context
+
+
+def _split_items(spec: str) -> list:
+    items, depth, current = [], 0, ""
+    for c in spec:
+        if c in "[(<":
+            depth += 1
+        elif c in "])>":
+            depth -= 1
+        if c == " " and depth == 0:
+            if current:
+                items.append(current)
+            current = ""
+        else:
+            current += c
+    if current:
+        items.append(current)
+    return items
+
+
+def _parse_set(spec: str, max_value: int) -> set:
+    values = set()
+    for part in spec.split(","):
+        if ":" in part:
+            lo, hi = part.split(":")
+            lo = max_value if lo == "*" else int(lo)
+            hi = max_value if hi == "*" else int(hi)
+            lo, hi = min(lo, hi), max(lo, hi)
+            values.update(range(lo, hi + 1))
+        else:
+            values.add(max_value if part == "*" else int(part))
+    return values
+
+
+def _split_raw(raw: bytes):
+    idx = raw.find(b"\r\n\r\n")
+    if idx == -1:
+        return raw, b""
+    return raw[:idx + 2], raw[idx + 4:]
+
+
+def _quote(value) -> str:
+    if value is None:
+        return "NIL"
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _unquote(value: str) -> str:
+    value = value.strip()
+    if value.startswith('"') and value.endswith('"'):
+        return re.sub(r"\\(.)", r"\1", value[1:-1])
+    return value
+
+
+def _bodystructure(msg) -> str:
+    if msg.is_multipart():
+        parts = "".join(_bodystructure(p) for p in msg.get_payload())
+        return f"({parts} {_quote(msg.get_content_subtype().upper())})"
+    maintype, subtype = msg.get_content_maintype(), msg.get_content_subtype()
+    params = [(k, v) for k, v in msg.get_params()[1:]] if msg.get_params() else []
+    params_str = "(" + " ".join(f"{_quote(k.upper())} {_quote(v)}" for k, v in params) + ")" if params else "NIL"
+    encoding = msg.get("Content-Transfer-Encoding", "7bit").strip().upper()
+    payload = msg.get_payload(decode=False)
+    payload = payload.encode("utf-8", "surrogateescape") if isinstance(payload, str) else b""
+    fields = f"{_quote(maintype.upper())} {_quote(subtype.upper())} {params_str} NIL NIL {_quote(encoding)} {len(payload)}"
+    if maintype == "text":
+        fields += " %d" % (payload.count(b"\n") + 1)
+    return f"({fields})"
+
+
+def _section(raw: bytes, msg, section: str) -> bytes:
+    header, text = _split_raw(raw)
+    upper = section.upper()
+    if upper == "":
+        return raw
+    if upper == "TEXT":
+        return text
+    if upper == "HEADER":
+        return header + b"\r\n"
+    if upper.startswith("HEADER.FIELDS"):
+        wanted = [f.upper() for f in re.findall(r"[\w-]+", upper[len("HEADER.FIELDS"):])]
+        lines, keep = [], False
+        for line in header.split(b"\r\n"):
+            if line[:1] in (b" ", b"\t"):
+                if keep:
+                    lines.append(line)
+                continue
+            name = line.split(b":", 1)[0].decode("ascii", "replace").upper()
+            keep = name in wanted
+            if keep:
+                lines.append(line)
+        return b"\r\n".join(lines) + b"\r\n\r\n"
+    part = msg
+    for index in upper.split("."):
+        if not index.isdigit():
+            break
+        if part.is_multipart():
+            part = part.get_payload()[int(index) - 1]
+        elif index != "1":
+            return b""
+    payload = part.get_payload(decode=False)
+    if isinstance(payload, str):
+        return payload.encode("utf-8", "surrogateescape").replace(b"\r\n", b"\n").replace(b"\n", b"\r\n")
+    return text
+
+
+class FakeIMAPHandler(socketserver.StreamRequestHandler):
+    disable_nagle_algorithm = True
+    # Lecture sans tampon : une commande déjà envoyée reste visible sur la socket (voir _input_waiting)
+    rbufsize = 0
+
+    def send(self, line):
+        if isinstance(line, str):
+            line = line.encode("utf-8")
+        self.wfile.write(line + b"\r\n")
+
+    def handle(self):
+        with self.server._lock:
+            self.server.connections.add(self.connection)
+        try:
+            self.session()
+        except OSError:
+            pass  # connexion coupée (drop_connections) en cours de réponse
+        finally:
+            with self.server._lock:
+                self.server.connections.discard(self.connection)
+
+    def _input_waiting(self) -> bool:
+        # Une session TLS peut avoir déjà déchiffré la suite : select ne la verrait pas
+        pending = isinstance(self.connection, ssl.SSLSocket) and self.connection.pending()
+        return bool(pending) or bool(select.select([self.connection], [], [], 0)[0])
+
+    def session(self):
+        self.selected = None
+        self.reported = 0
+        self.send(f"* OK [CAPABILITY {self.server.capabilities}] Fake IMAP ready")
+        pipelined = False
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            line = line.decode("utf-8", "replace").rstrip("\r\n")
+            if not line:
+                continue
+            parts = line.split(" ", 2)
+            tag = parts[0]
+            command = parts[1].upper() if len(parts) > 1 else ""
+            args = parts[2] if len(parts) > 2 else ""
+            self.server.record(line)
+            if self.server.latency and not pipelined:
+                time.sleep(self.server.latency)
+            # Commande suivante déjà arrivée avant notre réponse : le client pipeline, elle ne coûte pas d'aller-retour de plus
+            pipelined = self._input_waiting()
+            uid_mode = False
+            if command == "UID":
+                uid_mode = True
+                sub = args.split(" ", 1)
+                command = sub[0].upper()
+                args = sub[1] if len(sub) > 1 else ""
+            handler = getattr(self, f"do_{command}", None)
+            if handler is None:
+                self.send(f"{tag} BAD unknown command {command}")
+                continue
+            try:
+                if handler(tag, args, uid_mode) is False:
+                    return
+            except Exception as e:
+                self.send(f"{tag} BAD {e}")
+
+    def do_CAPABILITY(self, tag, args, uid_mode):
+        self.send(f"* CAPABILITY {self.server.capabilities}")
+        self.send(f"{tag} OK CAPABILITY completed")
+
+    def do_STARTTLS(self, tag, args, uid_mode):
+        if not self.server.tls_context or isinstance(self.connection, ssl.SSLSocket):
+            self.send(f"{tag} BAD STARTTLS not available")
+            return
+        self.send(f"{tag} OK Begin TLS negotiation now")
+        with self.server._lock:
+            self.server.connections.discard(self.connection)
+            self.connection = self.server.tls_context.wrap_socket(self.connection, server_side=True)
+            self.server.connections.add(self.connection)
+        self.rfile = self.connection.makefile("rb", buffering=0)
+        self.wfile = self.connection.makefile("wb", buffering=0)
+
+    def do_LOGIN(self, tag, args, uid_mode):
+        self.send(f"{tag} OK LOGIN completed")
+
+    def do_NOOP(self, tag, args, uid_mode):
+        if self.selected:
+            self.reported = len(self.selected.messages)
+            self.send(f"* {self.reported} EXISTS")
+        self.send(f"{tag} OK NOOP completed")
+
+    def do_IDLE(self, tag, args, uid_mode):
+        if not self.server.idle:
+            self.send(f"{tag} BAD unknown command IDLE")
+            return
+        box = self.selected
+        seen = self.reported if box else 0
+        if box and len(box.messages) != seen:
+            # Mail arrivé entre le SELECT et l'IDLE : annoncé dans le même paquet que la continuation,
+            # comme le font les vrais serveurs ; le client le trouve déjà dans son tampon de lecture
+            seen = self.reported = len(box.messages)
+            self.wfile.write(f"+ idling\r\n* {seen} EXISTS\r\n".encode())
+        else:
+            self.send("+ idling")
+        while True:
+            if self._input_waiting() or select.select([self.connection], [], [], 0.05)[0]:
+                line = self.rfile.readline()
+                if not line:
+                    return False
+                if line.strip().upper() == b"DONE":
+                    self.send(f"{tag} OK IDLE terminated")
+                    return
+            if box and len(box.messages) != seen:
+                seen = self.reported = len(box.messages)
+                self.send(f"* {seen} EXISTS")
+
+    def do_LOGOUT(self, tag, args, uid_mode):
+        self.send("* BYE logging out")
+        self.send(f"{tag} OK LOGOUT completed")
+        return False
+
+    def do_LIST(self, tag, args, uid_mode):
+        # LIST "" "*" RETURN (STATUS (...)) : un STATUS par dossier sélectionnable, juste après sa ligne LIST
+        _, _, returned = args.partition(" RETURN ")
+        status = returned.upper().partition("STATUS (")[2].split(")")[0].split() if self.server.list_status else []
+        for name, box in list(self.server.mailboxes.items()):
+            self.send(f'* LIST ({" ".join(box.attributes)}) "/" {_quote(name)}')
+            if status and "\\Noselect" not in box.attributes:
+                self.send(self._status_line(box, status))
+        self.send(f"{tag} OK LIST completed")
+
+    @staticmethod
+    def _status_line(box: Mailbox, items: list) -> str:
+        unseen = sum(1 for message in box.messages if "\\Seen" not in message[2]) if "UNSEEN" in items else 0
+        values = {"MESSAGES": len(box.messages), "UIDNEXT": box.next_uid, "UIDVALIDITY": box.uidvalidity, "UNSEEN": unseen, "RECENT": 0}
+        return f"* STATUS {_quote(box.name)} (" + " ".join(f"{item} {values[item]}" for item in items if item in values) + ")"
+
+    def do_SELECT(self, tag, args, uid_mode):
+        name = _unquote(args)
+        box = self.server.mailboxes.get(name)
+        if box is None or "\\Noselect" in box.attributes:
+            self.send(f"{tag} NO no such mailbox")
+            return
+        self.selected = box
+        # Dernier EXISTS annoncé au client : IDLE signale tout de suite ce qui est arrivé depuis
+        self.reported = len(box.messages)
+        self.send(f"* {len(box.messages)} EXISTS")
+        self.send("* 0 RECENT")
+        self.send(f"* OK [UIDVALIDITY {box.uidvalidity}] UIDs valid")
+        self.send(f"* OK [UIDNEXT {box.next_uid}] Predicted next UID")
+        self.send(f"{tag} OK [READ-WRITE] SELECT completed")
+
+    do_EXAMINE = do_SELECT
+
+    def do_STATUS(self, tag, args, uid_mode):
+        name, _, items = args.rpartition(" (")
+        box = self.server.mailboxes.get(_unquote(name))
+        if box is None or "\\Noselect" in box.attributes:
+            self.send(f"{tag} NO no such mailbox")
+            return
+        self.send(self._status_line(box, items.rstrip(")").upper().split()))
+        self.send(f"{tag} OK STATUS completed")
+
+    def _resolve(self, spec: str, uid_mode: bool) -> list:
+        box = self.selected
+        if not box.messages:
+            return []
+        if uid_mode:
+            wanted = _parse_set(spec, box.messages[-1][0])
+            positions = sorted(box.positions[uid] for uid in wanted if uid in box.positions)
+        else:
+            wanted = _parse_set(spec, len(box.messages))
+            positions = sorted(n - 1 for n in wanted if 1 <= n <= len(box.messages))
+        return [(i + 1, box.messages[i]) for i in positions]
+
+    def do_SEARCH(self, tag, args, uid_mode):
+        tokens = args.split()
+        if tokens and tokens[0].upper() == "CHARSET":
+            tokens = tokens[2:]
+        matches = list(enumerate(self.selected.messages, start=1))
+        i = 0
+        while i < len(tokens):
+            key = tokens[i].upper()
+            if key == "ALL":
+                i += 1
+            elif key == "SINCE":
+                day, month, year = tokens[i + 1].strip('"').split("-")
+                since = datetime(int(year), MONTHS.index(month) + 1, int(day), tzinfo=timezone.utc)
+                matches = [(n, m) for n, m in matches if m[3] >= since]
+                i += 2
+            elif key in ("SEEN", "UNSEEN"):
+                matches = [(n, m) for n, m in matches if ("\\Seen" in m[2]) == (key == "SEEN")]
+                i += 1
+            elif key == "UID":
+                wanted = _parse_set(tokens[i + 1], self.selected.messages[-1][0] if self.selected.messages else 0)
+                matches = [(n, m) for n, m in matches if m[0] in wanted]
+                i += 2
+            else:
+                raise ValueError(f"unsupported search key {key}")
+        ids = [str(m[0] if uid_mode else n) for n, m in matches]
+        self.send("* SEARCH" + ("" if not ids else " " + " ".join(ids)))
+        self.send(f"{tag} OK SEARCH completed")
+
+    def do_FETCH(self, tag, args, uid_mode):
+        spec, items = args.split(" ", 1)
+        items = items.strip()
+        if items.startswith("(") and items.endswith(")"):
+            items = items[1:-1]
+        items = _split_items(items)
+        if uid_mode and not any(i.upper() == "UID" for i in items):
+            items.insert(0, "UID")
+        for seq, (uid, raw, flags, internaldate) in self._resolve(spec, uid_mode):
+            msg = None
+            chunks = []
+            for item in items:
+                upper = item.upper()
+                if upper == "UID":
+                    chunks.append(f"UID {uid}".encode())
+                elif upper == "FLAGS":
+                    chunks.append(f"FLAGS ({' '.join(sorted(flags))})".encode())
+                elif upper == "RFC822.SIZE":
+                    chunks.append(f"RFC822.SIZE {len(raw)}".encode())
+                elif upper == "BODYSTRUCTURE":
+                    msg = msg or message_from_bytes(raw)
+                    chunks.append(b"BODYSTRUCTURE " + _bodystructure(msg).encode())
+                elif upper.startswith("BODY"):
+                    match = re.match(r"BODY(\.PEEK)?\[(.*)\](?:<(\d+)\.(\d+)>)?$", item, re.I)
+                    peek, section, origin, length = match.groups()
+                    msg = msg or message_from_bytes(raw)
+                    data = _section(raw, msg, section)
+                    name = f"BODY[{section}]"
+                    if origin is not None:
+                        data = data[int(origin):int(origin) + int(length)]
+                        name += f"<{origin}>"
+                    if not peek:
+                        flags.add("\\Seen")
+                    chunks.append(name.encode() + f" {{{len(data)}}}\r\n".encode() + data)
+                else:
+                    raise ValueError(f"unsupported fetch item {item}")
+            self.wfile.write(f"* {seq} FETCH (".encode() + b" ".join(chunks) + b")\r\n")
+        self.send(f"{tag} OK FETCH completed")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serveur IMAP factice pour les benchmarks")
+    parser.add_argument("--port", type=int, default=1143)
+    parser.add_argument("--messages", type=int, default=1000)
+    args = parser.parse_args()
+
+    server = FakeIMAPServer(port=args.port)
+    now = datetime.now(timezone.utc)
+    for i in range(args.messages):
+        server.mailboxes["INBOX"].append(build_message(
+            f"Sender {i} <sender{i}@example.com>", f"Message {i}", f"Corps du message {i}",
+            now - timedelta(minutes=args.messages - i),
+        ))
+    print(f"📡 Fake IMAP en écoute sur 127.0.0.1:{server.port}")
+    server.serve_forever()
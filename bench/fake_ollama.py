@@ -0,0 +1,120 @@
+import re
+import json
+import zlib
+import time
+import random
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.05, failure_rate=0.0, token_latency=0.0, bad_json_rate=0.0):
+        super().__init__((host, port), FakeOllamaHandler)
+        self.latency = latency
+        self.failure_rate = failure_rate
+        # Coût proportionnel à la taille du prompt (~4 caractères par token), en plus du coût fixe par requête
+        self.token_latency = token_latency
+        self.bad_json_rate = bad_json_rate
+        self.request_count = 0
+        self.prompts = []
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/api/generate"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status: int, payload: dict):
+        body = json.dumps(payload).encode("utf-8")
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # Client parti avant la réponse (timeout, budget de temps épuisé)
+            self.close_connection = True
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        server = self.server
+        with server._lock:
+            server.request_count += 1
+            server.prompts.append(request.get("prompt", ""))
+
+        if self.path == "/api/embed":
+            texts = request.get("input", [])
+            time.sleep(server.latency)
+            self._reply(200, {"model": request.get("model", ""), "embeddings": [_embedding(text) for text in ([texts] if isinstance(texts, str) else texts)]})
+            return
+        if self.path != "/api/generate":
+            self._reply(404, {"error": "not found"})
+            return
+        prompt = request.get("prompt", "")
+        time.sleep(server.latency + server.token_latency * len(prompt) / 4)
+        if random.random() < server.failure_rate:
+            self._reply(503, {"error": "model busy"})
+            return
+
+        if request.get("format") == "json":
+            # Prompt groupé : un résumé par bloc "### Mail N"
+            if random.random() < server.bad_json_rate:
+                response = "Voici les résumés : 1. ..."
+            else:
+                blocks = re.findall(r"^### Mail (\d+)\n(.*?)(?=\n\n### Mail |\Z)", prompt, re.M | re.S)
+                response = json.dumps({n: _summary(text) for n, text in blocks}, ensure_ascii=False)
+        else:
+            response = _summary(prompt.rsplit("\n", 1)[-1])
+        self._reply(200, {
+            "model": request.get("model", ""),
+            "response": response,
+            "done": True,
+        })
+
+
+def _summary(text: str) -> str:
+    return "Résumé : " + " ".join(text.split()[:8])
+
+
+def _embedding(text: str, dim: int = 64) -> list:
+    # Vecteur déterministe : trigrammes de caractères hachés, deux textes proches restent proches
+    vector = [0.0] * dim
+    text = text.lower()
+    for i in range(len(text) - 2):
+        vector[zlib.crc32(text[i:i + 3].encode("utf-8")) % dim] += 1.0
+    return vector
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Faux serveur Ollama (/api/generate)")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--latency", type=float, default=0.5, help="Latence par requête (secondes)")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--token-latency", type=float, default=0.0, help="Latence par token de prompt (secondes)")
+    parser.add_argument("--bad-json-rate", type=float, default=0.0, help="Part des réponses JSON volontairement illisibles")
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(port=args.port, latency=args.latency, failure_rate=args.failure_rate,
+                              token_latency=args.token_latency, bad_json_rate=args.bad_json_rate)
+    print(f"🧠 Fake Ollama en écoute sur {server.url}")
+    server.serve_forever()
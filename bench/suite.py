@@ -0,0 +1,161 @@
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+from bench.fake_imap import FakeIMAPServer
+from bench.fake_ollama import FakeOllamaServer
+from bench import corpus
+
+BASELINE = Path(__file__).resolve().parent / "baseline.json"
+# Étapes mesurées, dans l'ordre : (nom, dossier de travail, arguments de main.py).
+# "pipeline" : run-all complet puis relancé sans nouveau mail ; "étapes" : chaque commande séparément
+STAGES = (
+    ("run-all", "pipeline", ["run-all"]),
+    ("run-all incrémental", "pipeline", ["run-all"]),
+    ("dump", "étapes", ["dump"]),
+    ("classify", "étapes", ["classify"]),
+    ("summarize", "étapes", ["summarize"]),
+    ("md", "étapes", ["md"]),
+)
+# Métriques comparées à la baseline : (clé, tolérance relative par défaut, marge absolue)
+CHECKS = (("wall_s", 0.30, 0.25), ("peak_rss_mib", 0.15, 8.0), ("imap_commands", 0.05, 2), ("llm_requests", 0.05, 2))
+
+
+def run_stage(args: list, cwd: Path, env: dict, log) -> tuple:
+    # (code retour, secondes, pic RSS en Mio) : os.wait4 donne le rusage de ce processus seul
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, str(ROOT / "main.py"), *args], cwd=cwd, env=env, stdout=log, stderr=subprocess.STDOUT)
+    _, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return process.returncode, elapsed, usage.ru_maxrss / 1024
+
+
+def report_size(workdir: Path) -> int:
+    reports = [p for p in (workdir / "reports").glob("report_*.jsonl") if not p.name.endswith(".columns.jsonl")]
+    if not reports:
+        return 0
+    with reports[0].open("rb") as f:
+        return sum(1 for line in f if line.strip())
+
+
+def run_size(size: str, args, imap: FakeIMAPServer, ollama: FakeOllamaServer) -> dict:
+    count = corpus.parse_size(size)
+    start = time.perf_counter()
+    imap.mailboxes.clear()
+    corpus.load(imap, count, args.seed)
+    print(f"\n📬 {size} : {count} messages générés en {time.perf_counter() - start:.1f}s")
+    print(f"{'étape':<22} {'secondes':>9} {'mails':>7} {'mails/s':>9} {'pic RSS Mio':>12} {'IMAP':>7} {'LLM':>6}")
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for _ in range(args.repeat):
+            for workdir in ("pipeline", "étapes"):
+                shutil.rmtree(Path(tmp) / workdir, ignore_errors=True)
+                (Path(tmp) / workdir).mkdir()
+            for name, workdir, stage_args in STAGES:
+                cwd = Path(tmp) / workdir
+                env = dict(
+                    os.environ, PYTHONPATH=str(ROOT), IMAP_HOST="127.0.0.1", IMAP_PORT=str(imap.port), IMAP_USER="bench",
+                    IMAP_PASS="bench", IMAP_STARTTLS="1" if args.starttls else "0", OLLAMA_URL=ollama.url,
+                    MAIL_STORE=str(cwd / "reports" / "mail_store.db"), SEARCH_INDEX=str(cwd / "reports" / "search_index.db"),
+                    SUMMARY_CACHE=str(cwd / "reports" / "summary_cache.db"), METRICS_FILE="",
+                )
+                window = ["--hours", str(24 * 8), "--limit", str(count)] if stage_args[0] in ("run-all", "dump") else []
+                imap.reset_stats()
+                ollama.request_count = 0
+                with (cwd / "bench.log").open("a", encoding="utf-8") as log:
+                    code, elapsed, rss = run_stage(stage_args + window, cwd, env, log)
+                if code != 0:
+                    tail = (cwd / "bench.log").read_text(encoding="utf-8")[-1500:]
+                    raise RuntimeError(f"{size} / {name} : code {code}\n{tail}")
+                result = {
+                    "wall_s": elapsed,
+                    "mails": report_size(cwd),
+                    "peak_rss_mib": rss,
+                    "imap_commands": imap.command_count,
+                    "llm_requests": ollama.request_count,
+                }
+                # Plusieurs répétitions : le meilleur temps et le plus petit pic, les moins bruités
+                best = results.setdefault(name, result)
+                best.update(wall_s=min(best["wall_s"], elapsed), peak_rss_mib=min(best["peak_rss_mib"], rss))
+    for name, result in results.items():
+        result["mails_per_s"] = result["mails"] / result["wall_s"]
+        print(f"{name:<22} {result['wall_s']:>9.2f} {result['mails']:>7} {result['mails_per_s']:>9.0f} "
+              f"{result['peak_rss_mib']:>12.1f} {result['imap_commands']:>7} {result['llm_requests']:>6}")
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float = None) -> list:
+    errors = []
+    for size, stages in results.items():
+        for name, result in stages.items():
+            reference = baseline.get("results", {}).get(size, {}).get(name)
+            if reference is None:
+                continue
+            if result["mails"] != reference["mails"]:
+                errors.append(f"{size} / {name} : {result['mails']} mails au lieu de {reference['mails']}")
+            for key, relative, slack in CHECKS:
+                limit = reference[key] * (1 + (relative if tolerance is None else tolerance)) + slack
+                if result[key] > limit:
+                    errors.append(f"{size} / {name} : {key} {result[key]:.2f} > {limit:.2f} (baseline {reference[key]:.2f})")
+    return errors
+
+
+def machine() -> dict:
+    return {"python": platform.python_version(), "system": platform.system(), "machine": platform.machine(), "cpus": os.cpu_count()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Suite de benchmarks de bout en bout : main.py contre les faux serveurs IMAP et Ollama")
+    parser.add_argument("--sizes", nargs="+", default=["1k", "10k"], help="Corpus à rejouer : 1k, 10k, 100k ou un nombre de messages")
+    parser.add_argument("--repeat", type=int, default=1, help="Répétitions par étape (meilleur temps et plus petit pic gardés)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--imap-latency", type=float, default=0.0, help="Aller-retour réseau simulé du faux serveur IMAP")
+    parser.add_argument("--ollama-latency", type=float, default=0.005, help="Latence par requête du faux Ollama")
+    parser.add_argument("--starttls", action="store_true", help="Session IMAP en STARTTLS (nécessite openssl)")
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--tolerance", type=float, default=None, help="Tolérance relative unique au lieu des tolérances par métrique")
+    parser.add_argument("--update-baseline", action="store_true", help="Enregistrer ces résultats comme nouvelle baseline")
+    args = parser.parse_args()
+
+    imap = FakeIMAPServer(latency=args.imap_latency, starttls=args.starttls).start()
+    ollama = FakeOllamaServer(latency=args.ollama_latency).start()
+    try:
+        results = {size: run_size(size, args, imap, ollama) for size in args.sizes}
+    finally:
+        imap.stop()
+        ollama.stop()
+
+    if args.update_baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8")) if args.baseline.exists() else {}
+        baseline.update(machine=machine(), settings={"seed": args.seed, "ollama_latency": args.ollama_latency, "imap_latency": args.imap_latency})
+        baseline.setdefault("results", {}).update({
+            size: {name: {key: round(value, 3) for key, value in result.items()} for name, result in stages.items()}
+            for size, stages in results.items()
+        })
+        args.baseline.write_text(json.dumps(baseline, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        print(f"\n📌 Baseline enregistrée : {args.baseline}")
+        sys.exit(0)
+    if not args.baseline.exists():
+        print(f"\n⚠️ Pas de baseline ({args.baseline}) : relancer avec --update-baseline pour en créer une")
+        sys.exit(0)
+
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+    if baseline.get("machine") != machine():
+        print(f"\n⚠️ Baseline mesurée sur une autre machine ({baseline.get('machine')}) : temps et mémoire peu comparables")
+    errors = compare(results, baseline, args.tolerance)
+    for error in errors:
+        print(f"❌ {error}")
+    if errors:
+        sys.exit(1)
+    print("\n✅ Aucune régression par rapport à la baseline")
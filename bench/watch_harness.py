@@ -0,0 +1,162 @@
+import os
+import sys
+import json
+import time
+import tempfile
+import argparse
+import threading
+from pathlib import Path
+from datetime import datetime, timezone, timedelta
+
+# Store, index et cache isolés dans un dossier temporaire, avant l'import des modules qui lisent ces variables
+TMP = tempfile.TemporaryDirectory()
+os.environ["SEARCH_INDEX"] = str(Path(TMP.name) / "search_index.db")
+os.environ["SUMMARY_CACHE"] = str(Path(TMP.name) / "summary_cache.db")
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from core import llm_wrapper
+from core.watcher import run_watch
+from core.reporter import report_base_name
+from core.report_store import Report, REPORT_FORMAT
+from bench.fake_imap import FakeIMAPServer, build_message
+from bench.fake_ollama import FakeOllamaServer
+
+FOLDERS = ("INBOX", "Alertes")
+
+
+def wait_for(predicate, timeout: float) -> float:
+    # Temps écoulé jusqu'à ce que la condition soit vraie, None si jamais
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        if predicate():
+            return time.perf_counter() - start
+        time.sleep(0.01)
+    return None
+
+
+def report_rows(report_dir: Path, folder: str) -> list:
+    path = report_dir / f"{report_base_name(folder)}.{REPORT_FORMAT}"
+    if not path.exists():
+        return []
+    with path.open("r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.endswith("\n")]
+
+
+def summarized(report_dir: Path, folder: str, subject: str) -> bool:
+    path = report_dir / f"{report_base_name(folder)}.{REPORT_FORMAT}"
+    return any(mail.subject == subject and mail.summary for mail in Report(path))
+
+
+def run_scenario(mode: str, alerts: int, poll_interval: float, timeout: float) -> dict:
+    root = Path(TMP.name) / mode
+    report_dir = root / "reports"
+    root.mkdir()
+    server = FakeIMAPServer(idle=(mode == "idle")).start()
+    now = datetime.now(timezone.utc)
+    for i in range(3):
+        server.mailbox("INBOX").append(build_message(f"Ancien {i} <old{i}@example.com>", f"Déjà là {i}", f"Mail {i} ({mode})", now - timedelta(hours=1)))
+    server.mailbox("Alertes")
+
+    stop = threading.Event()
+    watcher = threading.Thread(target=run_watch, args=(list(FOLDERS),), kwargs={
+        "store_path": root / "mail_store.db", "report_dir": report_dir, "poll_interval": poll_interval, "stop": stop,
+        "host": "127.0.0.1", "port": server.port, "user": "bench", "password": "bench", "starttls": False,
+    }, daemon=True)
+    watcher.start()
+
+    result = {"mode": mode, "latencies": [], "summaries": [], "errors": []}
+    if wait_for(lambda: len(report_rows(report_dir, "INBOX")) == 3, timeout) is None:
+        result["errors"].append("rattrapage initial incomplet")
+    time.sleep(0.5)
+
+    def deliver(n: int, label: str) -> tuple:
+        folder = FOLDERS[n % len(FOLDERS)]
+        subject = f"Security alert #{n} ({label})"
+        server.mailbox(folder).append(build_message("Monitoring <ops@example.com>", subject, f"Incident {n} détecté sur la prod ({mode}).", datetime.now(timezone.utc)))
+        seen = wait_for(lambda: any(m["subject"] == subject and m.get("score") == 8 for m in report_rows(report_dir, folder)), timeout)
+        summary = wait_for(lambda: summarized(report_dir, folder, subject), timeout)
+        if seen is None or summary is None:
+            result["errors"].append(f"{subject} absent du rapport ou sans résumé")
+        return seen, (seen or 0) + (summary or 0)
+
+    for n in range(alerts):
+        seen, summary = deliver(n, "direct")
+        result["latencies"].append(seen)
+        result["summaries"].append(summary)
+        time.sleep(0.2)
+
+    # Coupure réseau : la connexion doit être rétablie sans intervention et sans doublon dans le rapport
+    dropped = server.drop_connections()
+    time.sleep(0.2)
+    result["reconnect"], _ = deliver(alerts, "après coupure")
+    if dropped < len(FOLDERS):
+        result["errors"].append(f"{dropped} connexion(s) coupée(s) au lieu de {len(FOLDERS)}")
+
+    for folder in FOLDERS:
+        subjects = [m["subject"] for m in report_rows(report_dir, folder)]
+        if len(subjects) != len(set(subjects)):
+            result["errors"].append(f"doublons dans le rapport {folder}")
+
+    stop.set()
+    watcher.join(timeout)
+    server.stop()
+    return result
+
+
+def check_buffered_exists(timeout: float) -> list:
+    # Mail arrivé entre le SELECT et l'IDLE : le serveur l'annonce avec "+ idling", dans le même paquet.
+    # IDLE doit le voir tout de suite, pas au WATCH_IDLE_TIMEOUT suivant
+    from core.imap_client import IMAPClient
+    errors = []
+    for starttls in (False, True):
+        server = FakeIMAPServer(starttls=starttls).start()
+        box = server.mailbox("INBOX")
+        client = IMAPClient(host="127.0.0.1", port=server.port, user="bench", password="bench", starttls=starttls)
+        client.connect()
+        client._select("INBOX")
+        box.append(build_message("Monitoring <ops@example.com>", "Entre SELECT et IDLE", "Incident.", datetime.now(timezone.utc)))
+        start = time.perf_counter()
+        changed = client.idle(timeout)
+        elapsed = time.perf_counter() - start
+        client.close()
+        server.stop()
+        mode = "STARTTLS" if starttls else "clair"
+        print(f"EXISTS dans le paquet de '+ idling' ({mode}) : vu en {elapsed:.2f}s")
+        if not changed or elapsed > 1.0:
+            errors.append(f"EXISTS déjà reçu ({mode}) vu en {elapsed:.2f}s au lieu de tout de suite")
+    return errors
+
+
+def fmt(seconds) -> str:
+    return "   -" if seconds is None else f"{seconds:6.2f}s"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mode watch contre un faux IMAP (IDLE puis repli NOOP) et un faux Ollama")
+    parser.add_argument("--alerts", type=int, default=6, help="Alertes envoyées par mode")
+    parser.add_argument("--poll-interval", type=float, default=2.0, help="Intervalle NOOP du mode sans IDLE")
+    parser.add_argument("--llm-latency", type=float, default=0.3)
+    parser.add_argument("--timeout", type=float, default=20.0)
+    args = parser.parse_args()
+
+    ollama = FakeOllamaServer(latency=args.llm_latency).start()
+    llm_wrapper.OLLAMA_URL = ollama.url
+
+    results = [run_scenario(mode, args.alerts, args.poll_interval, args.timeout) for mode in ("idle", "noop")]
+    ollama.stop()
+
+    print(f"\n{'mode':<6} {'alerte→rapport (max)':>21} {'alerte→résumé (max)':>20} {'après coupure':>14}")
+    failed = False
+    for r in results:
+        latencies = [s for s in r["latencies"] if s is not None] or [None]
+        summaries = [s for s in r["summaries"] if s is not None] or [None]
+        print(f"{r['mode']:<6} {fmt(max(latencies, key=lambda s: s or 0)):>21} {fmt(max(summaries, key=lambda s: s or 0)):>20} {fmt(r['reconnect']):>14}")
+        for error in r["errors"]:
+            print(f"   ❌ {error}")
+        failed = failed or bool(r["errors"])
+    for error in check_buffered_exists(args.timeout):
+        print(f"   ❌ {error}")
+        failed = True
+    print("❌ Échec" if failed else "✅ Toutes les alertes sont arrivées dans le rapport, avec résumé, y compris après coupure")
+    TMP.cleanup()
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,278 @@
+import typer
+from pathlib import Path
+from typing import List
+
+from core.report_store import REPORT_DIR, report_base_name, find_report
+from core.llm_wrapper import LLM_CONCURRENCY, LLM_BATCH_TOKENS, LLM_BUDGET_SECONDS, LLM_BUDGET_TOKENS, LLM_EXTRACTIVE_FALLBACK
+from core.imap_client import IMAP_POOL_SIZE, IMAP_DECODE_WORKERS
+from core.mail_classifier import SEMANTIC_CLASSIFIER
+from core.preprocess import LLM_PREPROCESS, LLM_INPUT_TOKENS
+from core.metrics import METRICS_FILE, METRICS_PORT, PROFILE_STAGES, PROFILER
+
+app = typer.Typer(no_args_is_help=True)
+
+def build_report_filename(label: str) -> Path:
+    return find_report(REPORT_DIR / report_base_name(label))
+
+@app.command("dump")
+def dump(
+    hours: int = 24,
+    limit: int = 30,
+    label: str = "INBOX",
+    store: bool = typer.Option(True, help="Construire le rapport depuis le store local (sync incrémentale)"),
+    decode_workers: int = typer.Option(IMAP_DECODE_WORKERS, help="Processus de décodage et nettoyage des corps (0 = dans le thread IMAP)")
+):
+    from core.pipeline import run_pipeline
+    from core.imap_client import close_decode_pool
+    typer.echo(f"📥 Génération du rapport depuis : {label}")
+    run_pipeline(label, hours, limit, store, classify=False, summarize=False, decode_workers=decode_workers)
+    close_decode_pool()
+
+@app.command("classify")
+def classify(
+    file: Path = typer.Option(None, help="Rapport à classifier"),
+    label: str = "INBOX",
+    semantic: bool = typer.Option(SEMANTIC_CLASSIFIER, help="Tags par similarité avec des exemples pour les mails sans règle")
+):
+    from core.mail_classifier import classify_file
+    json_file = file or build_report_filename(label)
+    typer.echo("🏷️ Tagging & scoring...")
+    classify_file(json_file, json_file, semantic)
+
+@app.command("semantic-index")
+def semantic_index(
+    report: List[Path] = typer.Option([], help="Rapport tagué dont les mails servent aussi d'exemples (option répétable)"),
+    embedder: str = typer.Option(None, help="hash ou ollama (défaut : SEMANTIC_EMBEDDER)")
+):
+    from core.semantic import build_index, get_embedder, SEMANTIC_EXAMPLES, SEMANTIC_INDEX
+    index = build_index(SEMANTIC_EXAMPLES, SEMANTIC_INDEX, report, get_embedder(embedder) if embedder else None)
+    counts = {tag: int((index.labels == t).sum()) for t, tag in enumerate(index.tags)}
+    typer.echo(f"🧭 Index sémantique ({index.embedder.signature}) : {len(index.labels)} exemple(s) → {SEMANTIC_INDEX}")
+    for tag, count in counts.items():
+        typer.echo(f"   {tag:<12} {count:>6}")
+
+@app.command("summarize")
+def summarize(
+    file: Path = typer.Option(None, help="Rapport à résumer"),
+    label: str = "INBOX",
+    concurrency: int = typer.Option(LLM_CONCURRENCY, help="Nombre de requêtes Ollama en parallèle"),
+    batch_tokens: int = typer.Option(LLM_BATCH_TOKENS, help="Budget en tokens d'un prompt groupé de mails courts (0 = un appel par mail)"),
+    dedup: bool = typer.Option(True, help="Un seul résumé par groupe de mails quasi identiques ou par fil de discussion"),
+    budget_seconds: float = typer.Option(LLM_BUDGET_SECONDS, help="Temps maximal des résumés, mails prioritaires d'abord (0 = illimité)"),
+    budget_tokens: int = typer.Option(LLM_BUDGET_TOKENS, help="Tokens maximum envoyés au LLM, mails prioritaires d'abord (0 = illimité)"),
+    fallback: bool = typer.Option(LLM_EXTRACTIVE_FALLBACK, help="Première phrase du mail comme résumé provisoire hors budget"),
+    preprocess: bool = typer.Option(LLM_PREPROCESS, help="Retirer historique cité, signatures, mentions légales et URLs avant résumé"),
+    input_tokens: int = typer.Option(LLM_INPUT_TOKENS, help="Tokens estimés maximum par mail envoyé au LLM (0 = pas de troncature)")
+):
+    from core.llm_wrapper import enrich_file
+    json_file = file or build_report_filename(label)
+    typer.echo("🧠 Résumés LLM...")
+    enrich_file(json_file, concurrency=concurrency, batch_tokens=batch_tokens, dedup=dedup, budget_seconds=budget_seconds, budget_tokens=budget_tokens, fallback=fallback,
+                preprocess=preprocess, input_tokens=input_tokens)
+
+@app.command("md")
+def markdown(
+    file: Path = typer.Option(None, help="Rapport à transformer en résumé .md"),
+    label: str = "INBOX"
+):
+    from core.generate_summary_md import summary
+    json_file = file or build_report_filename(label)
+    typer.echo("📄 Génération Markdown résumé...")
+    summary(json_file)
+
+@app.command("compact")
+def compact(
+    file: Path = typer.Option(None, help="Rapport à compacter"),
+    label: str = "INBOX"
+):
+    from core.report_store import open_report
+    report = open_report(file or build_report_filename(label))
+    report.compact()
+    typer.echo(f"🗜️ Colonnes réintégrées dans : {report.path}")
+
+@app.command("cache-stats")
+def cache_stats():
+    from core.llm_wrapper import get_cache, close_cache
+    summary_cache = get_cache()
+    if not summary_cache:
+        typer.echo("⚠️ Cache désactivé (SUMMARY_CACHE vide)")
+        raise typer.Exit(0)
+    stats = summary_cache.stats()
+    total = stats["hits"] + stats["misses"]
+    ratio = f"{100 * stats['hits'] / total:.1f}%" if total else "n/a"
+    typer.echo(f"🗃️ {stats['entries']} entrée(s), {stats['bytes'] / 1024:.1f} / {stats['max_bytes'] / 1024:.0f} Kio")
+    typer.echo(f"   hits {stats['hits']} - misses {stats['misses']} ({ratio}) - évictions {stats['evictions']}")
+    close_cache()
+
+@app.command("cache-clear")
+def cache_clear(
+    all_entries: bool = typer.Option(False, "--all", help="Vider tout le cache, pas seulement les entrées d'un autre prompt/modèle")
+):
+    from core.llm_wrapper import get_cache, close_cache, PROMPT_TEMPLATE, OLLAMA_MODEL
+    summary_cache = get_cache()
+    if not summary_cache:
+        typer.echo("⚠️ Cache désactivé (SUMMARY_CACHE vide)")
+        raise typer.Exit(0)
+    removed = summary_cache.invalidate(PROMPT_TEMPLATE, OLLAMA_MODEL, stale_only=not all_entries)
+    close_cache()
+    typer.echo(f"🧹 {removed} résumé(s) supprimé(s) du cache")
+
+@app.command("run-all")
+def run_all(
+    hours: int = 24,
+    limit: int = 30,
+    label: str = "INBOX",
+    store: bool = typer.Option(True, help="Construire le rapport depuis le store local (sync incrémentale)"),
+    concurrency: int = typer.Option(LLM_CONCURRENCY, help="Nombre de requêtes Ollama en parallèle"),
+    batch_tokens: int = typer.Option(LLM_BATCH_TOKENS, help="Budget en tokens d'un prompt groupé de mails courts (0 = un appel par mail)"),
+    dedup: bool = typer.Option(True, help="Un seul résumé par groupe de mails quasi identiques ou par fil de discussion"),
+    budget_seconds: float = typer.Option(LLM_BUDGET_SECONDS, help="Temps maximal des résumés, mails prioritaires d'abord (0 = illimité)"),
+    budget_tokens: int = typer.Option(LLM_BUDGET_TOKENS, help="Tokens maximum envoyés au LLM, mails prioritaires d'abord (0 = illimité)"),
+    fallback: bool = typer.Option(LLM_EXTRACTIVE_FALLBACK, help="Première phrase du mail comme résumé provisoire hors budget"),
+    preprocess: bool = typer.Option(LLM_PREPROCESS, help="Retirer historique cité, signatures, mentions légales et URLs avant résumé"),
+    input_tokens: int = typer.Option(LLM_INPUT_TOKENS, help="Tokens estimés maximum par mail envoyé au LLM (0 = pas de troncature)"),
+    semantic: bool = typer.Option(SEMANTIC_CLASSIFIER, help="Tags par similarité avec des exemples pour les mails sans règle"),
+    decode_workers: int = typer.Option(IMAP_DECODE_WORKERS, help="Processus de décodage et nettoyage des corps (0 = dans le thread IMAP)"),
+    metrics_file: str = typer.Option(METRICS_FILE, help="Fichier de métriques au format texte Prometheus (vide = pas d'export)"),
+    profile: str = typer.Option(PROFILE_STAGES, help="Étapes à profiler, ex. fetch,summarize (profils dans PROFILE_DIR)"),
+    profiler: str = typer.Option(PROFILER, help="Profileur : cprofile ou pyinstrument"),
+    if_changed: bool = typer.Option(False, "--if-changed", help="Ne rien faire si le dossier n'a pas reçu de mail depuis le dernier run-all avec les mêmes --hours et --limit (STATUS UIDNEXT, vérifié par main.py avant de charger le CLI)")
+):
+    from core import metrics
+    from core.pipeline import run_pipeline
+    from core.precheck import save_marker
+    from core.llm_wrapper import close_cache
+    from core.imap_client import IMAPClient, close_decode_pool
+    if profile:
+        metrics.configure_profiling(profile.split(","), profiler)
+    typer.echo(f"🚀 Pipeline fetch → tag → résumé → rendu depuis {label}...")
+    client = IMAPClient(decode_workers=decode_workers)
+    client.connect()
+    json_file = run_pipeline(
+        label, hours, limit, store, concurrency=concurrency, batch_tokens=batch_tokens, dedup=dedup,
+        budget_seconds=budget_seconds, budget_tokens=budget_tokens, fallback=fallback, semantic=semantic,
+        decode_workers=decode_workers, preprocess=preprocess, input_tokens=input_tokens, client=client
+    )
+    # UIDNEXT lu au SELECT du fetch : ce que --if-changed comparera au prochain run (sans UIDNEXT, pas de marqueur)
+    if json_file and client.uidnext:
+        save_marker(label, hours, limit, client.uidvalidity, client.uidnext, json_file)
+    client.close()
+    close_cache()
+    close_decode_pool()
+    metrics.REGISTRY.summary()
+    metrics.dump_profiles()
+    if metrics_file:
+        typer.echo(f"📈 Métriques écrites : {metrics.REGISTRY.write_textfile(metrics_file)}")
+    if json_file:
+        typer.echo("✅ Pipeline complet exécuté avec succès")
+
+@app.command("watch")
+def watch(
+    label: List[str] = typer.Option(["INBOX"], help="Dossier à surveiller (option répétable)"),
+    hours: int = typer.Option(24, help="Fenêtre du premier rattrapage si le dossier n'a jamais été synchronisé"),
+    concurrency: int = typer.Option(LLM_CONCURRENCY, help="Nombre de requêtes Ollama en parallèle"),
+    batch_tokens: int = typer.Option(LLM_BATCH_TOKENS, help="Budget en tokens d'un prompt groupé de mails courts (0 = un appel par mail)"),
+    metrics_file: str = typer.Option(METRICS_FILE, help="Fichier de métriques Prometheus, réécrit régulièrement (vide = pas d'export)"),
+    metrics_port: int = typer.Option(METRICS_PORT, help="Port HTTP local servant /metrics (0 = désactivé)")
+):
+    from core import metrics
+    from core.watcher import run_watch
+    if metrics_port:
+        metrics.REGISTRY.serve(metrics_port)
+        typer.echo(f"📈 Métriques sur http://127.0.0.1:{metrics_port}/metrics")
+    typer.echo(f"👀 Surveillance de {', '.join(label)} (Ctrl+C pour arrêter)...")
+    run_watch(list(label), hours=hours, concurrency=concurrency, batch_tokens=batch_tokens, metrics_file=metrics_file)
+    metrics.REGISTRY.stop()
+
+@app.command("dump-labels")
+def dump_labels(
+    label: List[str] = typer.Option(None, help="Label IMAP à traiter (option répétable)"),
+    all_labels: bool = typer.Option(False, "--all-labels", help="Traiter tous les dossiers sous Labels/"),
+    hours: int = 24,
+    limit: int = 30,
+    pool_size: int = typer.Option(IMAP_POOL_SIZE, help="Nombre de connexions IMAP en parallèle"),
+    full: bool = typer.Option(False, help="Tagging + résumés LLM en plus du dump"),
+    store: bool = typer.Option(True, help="Construire les rapports depuis le store local (sync incrémentale)"),
+    concurrency: int = typer.Option(LLM_CONCURRENCY, help="Nombre de requêtes Ollama en parallèle"),
+    decode_workers: int = typer.Option(IMAP_DECODE_WORKERS, help="Processus de décodage et nettoyage des corps, partagés par les connexions (0 = dans les threads IMAP)")
+):
+    from core.imap_client import IMAPPool, close_decode_pool
+    from core.pipeline import run_pipeline
+    from core.llm_wrapper import close_cache
+
+    pool = IMAPPool(size=pool_size, decode_workers=decode_workers)
+    labels = list(label or [])
+    if all_labels:
+        with pool.client() as client:
+            labels += [
+                name for name in (client.decode_utf7(f["name"]) for f in client.list_all_accessible_folders())
+                if name.startswith("Labels/") and name not in labels
+            ]
+    if not labels:
+        typer.echo("⚠️ Aucun label à traiter (--label ou --all-labels)")
+        raise typer.Exit(1)
+
+    typer.echo(f"📥 {len(labels)} label(s) sur {pool.size} connexion(s) IMAP...")
+    results = pool.map_folders(labels, lambda client, name: run_pipeline(
+        name, hours, limit, store, classify=full, summarize=full, concurrency=concurrency, client=client
+    ))
+    pool.close()
+    close_cache()
+    close_decode_pool()
+
+    for name, json_file in results.items():
+        typer.echo(f"   {'✅' if json_file else '⚠️'} {name} → {json_file or 'aucun mail'}")
+
+@app.command("search")
+def search(
+    query: str = typer.Argument(..., help="Mots recherchés (sujet, expéditeur, corps, tags, résumé)"),
+    limit: int = typer.Option(20, help="Nombre maximum de résultats"),
+    open_viewer: bool = typer.Option(False, "--open", help="Ouvrir les résultats dans le viewer")
+):
+    import time
+    from core.search_index import get_index, SearchResults
+    index = get_index()
+    if index is None:
+        typer.echo("⚠️ Index désactivé (SEARCH_INDEX vide)")
+        raise typer.Exit(0)
+
+    start = time.perf_counter()
+    if open_viewer:
+        from viewer import MailViewer
+        ids = index.search_ids(query, limit)
+        if not ids:
+            typer.echo("⚠️ Aucun résultat")
+            raise typer.Exit(0)
+        MailViewer(source=SearchResults(index, ids), title=f"🔎 {query}").run()
+        return
+
+    results = index.search(query, limit)
+    elapsed = time.perf_counter() - start
+    for record in results:
+        tags = ", ".join(record.tags) or "aucun tag"
+        typer.echo(f"📧 {record.date[:16]}  {record.from_name} <{record.from_email}> - {record.subject}")
+        typer.echo(f"   📌 {tags} - {record.extra['snippet']}")
+    typer.echo(f"🔎 {len(results)} résultat(s) sur {len(index)} mail(s) indexé(s) en {elapsed * 1000:.1f} ms")
+
+@app.command("reindex")
+def reindex(
+    folder: Path = typer.Option(Path("reports"), help="Dossier des rapports à indexer")
+):
+    from core.search_index import get_index
+    from core.report_store import read_report, report_stem, REPORT_SUFFIXES
+    index = get_index()
+    if index is None:
+        typer.echo("⚠️ Index désactivé (SEARCH_INDEX vide)")
+        raise typer.Exit(0)
+
+    # Un rapport par nom (JSON Lines de préférence au JSON historique), du plus ancien au plus récent :
+    # la dernière version d'un mail (tags, résumé) gagne
+    stems = {
+        report_stem(p) for p in folder.iterdir()
+        if p.name.endswith(REPORT_SUFFIXES) and not p.name.endswith(".columns.jsonl")
+    }
+    reports = sorted((find_report(folder / stem) for stem in stems), key=lambda p: p.stat().st_mtime)
+    total = 0
+    for report in reports:
+        total += index.index(read_report(report), report)
+    typer.echo(f"🔎 {total} mail(s) indexé(s), {len(index)} mail(s) distincts dans l'index")
@@ -0,0 +1,140 @@
+import os
+import re
+import hashlib
+from collections import Counter
+
+from core.mail import Mail
+
+# Distance de Hamming maximale entre deux SimHash 64 bits pour considérer deux mails comme quasi identiques
+DEDUP_MAX_DISTANCE = int(os.getenv("DEDUP_MAX_DISTANCE", "3"))
+# En dessous, deux mails courts ("Merci !") se ressemblent sans être des doublons
+DEDUP_MIN_WORDS = int(os.getenv("DEDUP_MIN_WORDS", "5"))
+# Taille maximale du texte envoyé au LLM pour un fil de discussion
+DEDUP_THREAD_MAX_CHARS = int(os.getenv("DEDUP_THREAD_MAX_CHARS", "8000"))
+
+_BITS = 64
+# Un compteur de 24 bits par bit du SimHash (moins de 2^23 mots par mail), tous additionnés dans un seul entier Python
+_LANE = 24
+_ONES = sum(1 << (bit * _LANE) for bit in range(_BITS))
+_TOPS = _ONES << (_LANE - 1)
+_SPREAD = [sum(1 << (bit * _LANE) for bit in range(8) if byte >> bit & 1) for byte in range(256)]
+# Nombre de mails comparés par case LSH : au-delà, une case pleine de doublons ne coûte plus rien
+_BUCKET_SIZE = 8
+_FEATURES_MAX = 500_000
+
+_WORD_RE = re.compile(r"\w+")
+_DIGITS_RE = re.compile(r"\d+")
+_MSGID_RE = re.compile(r"<[^<>\s]+>")
+
+_features = {}
+
+
+def _spread(word: str) -> int:
+    # Hash du mot étalé sur 64 compteurs : sommer ces entiers revient à compter les bits à 1
+    spread = _features.get(word)
+    if spread is None:
+        if len(_features) >= _FEATURES_MAX:
+            _features.clear()
+        h = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+        spread = 0
+        for k in range(8):
+            spread |= _SPREAD[(h >> (8 * k)) & 0xFF] << (8 * k * _LANE)
+        _features[word] = spread
+    return spread
+
+
+def simhash(text: str, min_words: int = 1) -> int:
+    # Numéros de build, de PR, dates... remplacés par 0 : les alertes répétées ne diffèrent que par eux
+    words = Counter(_WORD_RE.findall(_DIGITS_RE.sub("0", text.lower())))
+    total = sum(words.values())
+    if total < min_words:
+        return 0
+    counts = sum((_features.get(word) or _spread(word)) * n for word, n in words.items())
+    # Bit à 1 si plus de la moitié des mots l'ont : le décalage fait déborder ces compteurs sur leur bit de poids fort
+    counts += ((1 << (_LANE - 1)) - 1 - total // 2) * _ONES
+    tops = format(counts & _TOPS, "b").zfill(_BITS * _LANE)[::-1]
+    return int(tops[_LANE - 1::_LANE][::-1], 2)
+
+
+def thread_ids(record: Mail) -> list:
+    ids = _MSGID_RE.findall(record.message_id or "")
+    ids += _MSGID_RE.findall(record.in_reply_to or "")
+    ids += _MSGID_RE.findall(record.references or "")
+    return ids
+
+
+def _find(parent: list, i: int) -> int:
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def group_records(records, max_distance: int = DEDUP_MAX_DISTANCE) -> list:
+    # Une seule passe, en temps linéaire : les records peuvent être lus en flux, seuls les hash sont gardés
+    parent = []
+    fingerprints = []
+    buckets = {}
+    owners = {}
+    thread_links = []
+    bands = max_distance + 1
+    width = _BITS // bands
+    band_mask = (1 << width) - 1
+
+    for i, record in enumerate(records):
+        parent.append(i)
+        fingerprint = simhash(record.body, DEDUP_MIN_WORDS)
+        fingerprints.append(fingerprint)
+
+        # Distance <= max_distance : au moins une des max_distance + 1 bandes est identique (LSH)
+        for band in range(bands if fingerprint else 0):
+            members = buckets.setdefault((band, (fingerprint >> (band * width)) & band_mask), [])
+            for j in members:
+                if (fingerprint ^ fingerprints[j]).bit_count() <= max_distance:
+                    parent[_find(parent, i)] = _find(parent, j)
+                    break
+            if len(members) < _BUCKET_SIZE:
+                members.append(i)
+
+        # Fil de discussion : deux mails qui partagent un Message-ID (le leur ou une référence)
+        for message_id in thread_ids(record):
+            j = owners.setdefault(message_id, i)
+            if j != i:
+                parent[_find(parent, i)] = _find(parent, j)
+                thread_links.append(i)
+
+    # Groupes dans l'ordre de leur premier membre, membres dans l'ordre du rapport
+    groups = {}
+    for i in range(len(parent)):
+        groups.setdefault(_find(parent, i), []).append(i)
+    threads = {_find(parent, i) for i in thread_links}
+    return [{"members": members, "kind": "fil" if root in threads else "doublons"} for root, members in groups.items()]
+
+
+def group_fields(group: dict) -> dict:
+    # Colonnes ajoutées aux mails d'un groupe ; le premier membre (le plus récent) représente le groupe
+    if len(group["members"]) < 2:
+        return {}
+    return {"group": group["members"][0], "group_size": len(group["members"]), "group_kind": group["kind"]}
+
+
+def group_label(record: Mail) -> str:
+    if record.group_kind == "fil":
+        return f"Fil de discussion : {record.group_size} messages"
+    return f"×{record.group_size} mails quasi identiques"
+
+
+def distinct_bodies(bodies: list) -> list:
+    # Doublons : un seul corps, le plus récent. Fil : les messages distincts du plus ancien au plus récent
+    unique = {}
+    for body in reversed(bodies):
+        unique.setdefault(simhash(body) or body, body)
+    return bodies[:1] if len(unique) == 1 else list(unique.values())
+
+
+def join_thread(texts: list) -> str:
+    return "\n\n---\n\n".join(texts)[-DEDUP_THREAD_MAX_CHARS:] if len(texts) > 1 else texts[0]
+
+
+def group_text(bodies: list) -> str:
+    return join_thread(distinct_bodies(bodies))
@@ -1,43 +1,29 @@
-import json
+import sys
 from pathlib import Path
-from datetime import datetime
 import typer
 
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from core.report_store import read_report, report_stem
+from core.render import render_markdown
+
 app = typer.Typer()
 
+def summary_path(input_file: Path) -> Path:
+    return input_file.parent / f"{report_stem(input_file)}.summary.md"
+
+def write_summary(mails, output_file: Path) -> Path:
+    render_markdown(mails, summary_file=output_file)
+
+    typer.echo(f"✅ Résumé Markdown généré : {output_file}")
+    return output_file
+
 @app.command()
-def summary(input_file: Path = typer.Argument(..., help="Fichier JSON enrichi")):
+def summary(input_file: Path = typer.Argument(..., help="Rapport enrichi (.jsonl, .jsonl.gz ou .json historique)")):
     if not input_file.exists():
         typer.echo("❌ Fichier introuvable")
         raise typer.Exit(1)
-    
-    with input_file.open("r", encoding="utf-8") as f:
-        mails = json.load(f)
-
-    lines = [f"# Résumé du {datetime.now().strftime('%d %B %Y')}\n"]
-    
-    for mail in mails:
-        name = mail.get("from_name", "")
-        email = mail.get("from_email", "")
-        subject = mail.get("subject", "")
-        tags = ", ".join(mail.get("tags", [])) or "aucun tag"
-        summary = mail.get("summary") or "(pas de résumé)"
-
-        try:
-            dt = datetime.fromisoformat(mail["date"])
-            short_date = dt.strftime("%d %b %H:%M")
-        except Exception:
-            short_date = mail["date"]
-
-        lines.append(f"## {name} <{email}>")
-        lines.append(f"🕒 {short_date} - 📌 {tags}")
-        lines.append(f"🧠 {summary}\n")
-
-    output_file = input_file.parent / f"{input_file.stem}.summary.md"
-    with output_file.open("w", encoding="utf-8") as f:
-        f.write("\n".join(lines))
 
-    typer.echo(f"✅ Résumé Markdown généré : {output_file}")
+    write_summary(read_report(input_file), summary_path(input_file))
 
 if __name__ == "__main__":
     app()
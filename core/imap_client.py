@@ -1,14 +1,28 @@
 
 import os
 import re
-import quopri
+import sys
+import json
+import time
+import queue
+import ssl
+import select
 import imaplib
 import base64
+import threading
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor
 from dotenv import load_dotenv
 from email.header import decode_header
 from datetime import datetime, timezone, timedelta
 from email.utils import parsedate_to_datetime
-from bs4 import BeautifulSoup
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from core.rules import rule_headers
+from core.mime import parse_bodystructure, find_text_part, decode_part, guess_decode, html_to_text, clean_body, render_body
+from core import metrics
 
 load_dotenv()
 
@@ -16,133 +30,737 @@ IMAP_HOST = os.getenv("IMAP_HOST", "127.0.0.1")
 IMAP_PORT = int(os.getenv("IMAP_PORT", "1143"))
 IMAP_USER = os.getenv("IMAP_USER")
 IMAP_PASS = os.getenv("IMAP_PASS")
+IMAP_STARTTLS = os.getenv("IMAP_STARTTLS", "1") != "0"
+IMAP_FETCH_CHUNK = int(os.getenv("IMAP_FETCH_CHUNK", "200"))
+IMAP_POOL_SIZE = int(os.getenv("IMAP_POOL_SIZE", "4"))
+IMAP_MAX_BODY_BYTES = int(os.getenv("IMAP_MAX_BODY_BYTES", str(64 * 1024)))
+# Processus dédiés au décodage / HTML → texte / nettoyage des corps (0 = dans le thread IMAP)
+IMAP_DECODE_WORKERS = int(os.getenv("IMAP_DECODE_WORKERS", "0"))
+# STATUS envoyés d'un bloc sans attendre les réponses (pipelining) quand le serveur n'a pas LIST-STATUS
+IMAP_STATUS_CHUNK = int(os.getenv("IMAP_STATUS_CHUNK", "50"))
+# Arborescence des dossiers gardée sur disque (une entrée par compte) et sa durée de validité en secondes (0 = pas de cache)
+FOLDER_CACHE = os.getenv("FOLDER_CACHE", "reports/folders_cache.json")
+FOLDER_CACHE_TTL = int(os.getenv("FOLDER_CACHE_TTL", "3600"))
+
+HEADER_FIELDS = "FROM SUBJECT DATE MESSAGE-ID IN-REPLY-TO REFERENCES"
+PROTON_BLACKLIST = (
+    "@notify.proton.me",
+    "@calendar.proton.me",
+    "@mail.proton.me",
+    "@support.proton.me",
+)
+IMAP_MONTHS = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+
+_FETCH_START_RE = re.compile(rb"^\d+ \(")
+_FETCH_UID_RE = re.compile(rb"UID (\d+)")
+_FETCH_FLAGS_RE = re.compile(rb"FLAGS \(([^)]*)\)")
+_FETCH_LITERAL_RE = re.compile(rb"(BODY\[[^\]]*\])(?:<\d+>)? \{\d+\}$")
+_UNTAGGED_RE = re.compile(rb"^\* (\d+) (EXISTS|EXPUNGE)")
+_STATUS_RE = re.compile(rb"(UIDNEXT|UIDVALIDITY|MESSAGES|UNSEEN) (\d+)")
+_LIST_RE = re.compile(rb'^\(([^)]*)\) (NIL|"(?:[^"\\]|\\.)*") ?(.*)$')
+_MAILBOX_RE = re.compile(rb'^("(?:[^"\\]|\\.)*"|[^ ]+) \((.*)\)$')
+_LITERAL_END_RE = re.compile(rb"\{(\d+)\}\r?\n?$")
+FOLDER_STATUS_ITEMS = "(MESSAGES UNSEEN UIDNEXT)"
+# Attributs LIST d'un dossier qui ne contient pas de messages : ni SELECT ni STATUS possibles
+NOSELECT_FLAGS = {"\\noselect", "\\nonexistent"}
+
+IMAP_SECONDS = metrics.histogram("imap_command_seconds", "Durée des commandes IMAP (aller-retour complet)", ("command",))
+IMAP_CONNECTS = metrics.counter("imap_connections_total", "Connexions IMAP ouvertes", ("outcome",))
+DECODE_SECONDS = metrics.histogram("mail_decode_seconds", "Décodage d'un corps : transfer-encoding et charset", ("subtype",))
+HTML_SECONDS = metrics.histogram("mail_html_to_text_seconds", "Conversion HTML vers texte")
+CLEAN_SECONDS = metrics.histogram("mail_clean_seconds", "Nettoyage d'un corps (citations, signatures)")
+
+_decode_pool = None
+_decode_pool_size = 0
+_decode_lock = threading.Lock()
+
+
+def get_decode_pool(workers: int = IMAP_DECODE_WORKERS):
+    # Pool partagé par tous les clients du processus (IMAPPool compris), créé au premier corps à décoder
+    global _decode_pool, _decode_pool_size
+    with _decode_lock:
+        if _decode_pool is None or _decode_pool_size < workers:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            if _decode_pool is not None:
+                _decode_pool.shutdown()
+            # spawn plutôt que fork : le pipeline a déjà des threads en cours quand le pool démarre
+            _decode_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _decode_pool_size = workers
+        return _decode_pool
+
+
+def close_decode_pool():
+    global _decode_pool, _decode_pool_size
+    with _decode_lock:
+        if _decode_pool is not None:
+            _decode_pool.shutdown()
+            _decode_pool, _decode_pool_size = None, 0
+
 
 class IMAPClient:
-    def __init__(self, host=IMAP_HOST, port=IMAP_PORT, user=IMAP_USER, password=IMAP_PASS):
+    def __init__(self, host=IMAP_HOST, port=IMAP_PORT, user=IMAP_USER, password=IMAP_PASS, starttls=IMAP_STARTTLS, max_body_bytes=IMAP_MAX_BODY_BYTES, decode_workers=IMAP_DECODE_WORKERS, extra_headers=None):
         self.host = host
         self.port = port
         self.user = user
         self.password = password
+        self.starttls = starttls
+        self.max_body_bytes = max_body_bytes
+        self.decode_workers = decode_workers
+        # En-têtes fetchés en plus de HEADER_FIELDS, rangés dans mail["headers"] : par défaut ceux des règles "header:<nom>"
+        self.extra_headers = tuple(h.lower() for h in extra_headers) if extra_headers is not None else rule_headers()
         self.conn = None
+        self.round_trips = 0
+        self.selected = None
+        self.uidvalidity = 0
+        self.uidnext = 0
+        self.exists = 0
+        self.folder_cache = FOLDER_CACHE
+        self.folder_cache_ttl = FOLDER_CACHE_TTL
+        # Tags des commandes envoyées hors imaplib (IDLE, STATUS pipelinés)
+        self._raw_tags = 0
 
     def connect(self):
         try:
-            self.conn = imaplib.IMAP4(self.host, self.port)
-            self.conn.starttls()
-            self.conn.login(self.user, self.password)
+            with IMAP_SECONDS.time(command="CONNECT"):
+                self.conn = imaplib.IMAP4(self.host, self.port)
+                if self.starttls:
+                    self.conn.starttls()
+                self.conn.login(self.user, self.password)
+            IMAP_CONNECTS.inc(outcome="ok")
             print(f"✅ IMAP connecté à {self.host}:{self.port}")
         except Exception as e:
+            IMAP_CONNECTS.inc(outcome="error")
             print(f"❌ Echec de connexion IMAP : {e}")
             self.conn = None
 
-    def list_all_accessible_folders(self) -> list:
+    @contextmanager
+    def _command(self, name: str):
+        # Chaque aller-retour IMAP est compté et chronométré par commande
+        self.round_trips += 1
+        with IMAP_SECONDS.time(command=name):
+            yield
+
+    def is_alive(self) -> bool:
         if not self.conn:
+            return False
+        try:
+            with self._command("NOOP"):
+                typ, _ = self.conn.noop()
+            return typ == "OK"
+        except Exception:
+            return False
+
+    def reconnect(self):
+        self.close()
+        self.connect()
+
+    def close(self):
+        if self.conn:
+            try:
+                self.conn.logout()
+            except Exception:
+                pass
+            self.conn = None
+
+    def list_all_accessible_folders(self) -> list:
+        return [folder for folder in self.list_folders() if folder["selectable"]]
+
+    def list_folders(self, counts: bool = False, refresh: bool = False) -> list:
+        # Arborescence d'après les attributs de LIST seuls (\Noselect, \NonExistent) : plus de SELECT par dossier,
+        # qui coûtait un aller-retour chacun et changeait le dossier sélectionné.
+        # counts : MESSAGES, UNSEEN et UIDNEXT par dossier, dans la réponse au LIST (LIST-STATUS) ou en STATUS pipelinés
+        if counts and not self.conn:
             self.connect()
             if not self.conn:
                 return []
+        folders = None if refresh else self._cached_folders()
+        if folders is not None and not (counts and self._has_list_status()):
+            # Arborescence en cache : sans compteurs, aucune commande ni même de connexion
+            if counts:
+                self._add_counts(folders, self.status_many([f["name"] for f in folders if f["selectable"]]))
+            return folders
 
-        folders = []
-        seen = set()
-
-        typ, data = self.conn.list("", "*")
+        if not self.conn:
+            self.connect()
+            if not self.conn:
+                return []
+        statuses = []
+        with self._command("LIST"):
+            if counts and self._has_list_status():
+                # RFC 5819 : imaplib ne connaît pas RETURN, on le glisse dans le motif
+                typ, data = self.conn.list('""', f'"*" RETURN (STATUS {FOLDER_STATUS_ITEMS})')
+                _, statuses = self.conn.response("STATUS")
+            else:
+                typ, data = self.conn.list()
         if typ != "OK":
             return []
 
-        for raw in data:
-            decoded = raw.decode()
-            if decoded in seen:
-                continue
-            seen.add(decoded)
+        folders = self._parse_list(data)
+        self._save_folders(folders)
+        if counts:
+            found = self._parse_statuses(statuses) if statuses and statuses[0] else self.status_many(
+                [f["name"] for f in folders if f["selectable"]]
+            )
+            self._add_counts(folders, found)
+        return folders
 
-            parts = re.search(r'\((.*?)\)\s+"?([^"]+)"?\s+"?([^"]+)"?', decoded)
-            if parts:
-                flags, separator, name = parts.groups()
-                try:
-                    self.conn.select(name)
-                    folders.append({
-                        "name": name,
-                        "separator": separator,
-                        "flags": flags.split()
-                    })
-                except:
+    def status_many(self, folders: list) -> dict:
+        # {nom encodé: {"messages", "unseen", "uidnext"}} ; un dossier refusé par le serveur est absent du résultat.
+        # Les STATUS d'un lot partent ensemble et les réponses sont lues ensuite : un aller-retour par lot
+        if not self.conn:
+            self.connect()
+            if not self.conn:
+                return {}
+        results = {}
+        for chunk in self._chunks(folders, IMAP_STATUS_CHUNK):
+            tags = set()
+            commands = []
+            for name in chunk:
+                self._raw_tags += 1
+                tag = f"S{self._raw_tags:04d}".encode()
+                tags.add(tag)
+                commands.append(tag + b" STATUS " + self._quote(name) + f" {FOLDER_STATUS_ITEMS}\r\n".encode())
+            lines = []
+            with self._command("STATUS"):
+                self.conn.send(b"".join(commands))
+                while tags:
+                    line = self.conn.readline()
+                    if not line:
+                        raise imaplib.IMAP4.abort("connexion fermée pendant STATUS")
+                    tags.discard(line.split(b" ", 1)[0])
+                    if not line.startswith(b"* STATUS "):
+                        continue
+                    line = line[9:]
+                    literal = _LITERAL_END_RE.search(line)
+                    if literal:
+                        # Nom de dossier envoyé en littéral : même forme que les réponses d'imaplib
+                        lines.append((line[:literal.start()], self.conn.read(int(literal.group(1)))))
+                        line = self.conn.readline()
+                    lines.append(line.rstrip(b"\r\n"))
+            results.update(self._parse_statuses(lines))
+        return results
+
+    def _has_list_status(self) -> bool:
+        return bool(self.conn) and "LIST-STATUS" in self.conn.capabilities
+
+    @staticmethod
+    def _quote(name: str) -> bytes:
+        return b'"' + name.encode().replace(b"\\", b"\\\\").replace(b'"', b'\\"') + b'"'
+
+    @staticmethod
+    def _unquote(value: bytes) -> str:
+        if value.startswith(b'"'):
+            value = re.sub(rb"\\(.)", rb"\1", value[1:-1])
+        return value.decode()
+
+    @staticmethod
+    def _literal_items(data: list):
+        # (en-tête, reste) par réponse : un littéral (tuple d'imaplib) remplace la fin de l'en-tête,
+        # la suite de la ligne arrive dans l'élément suivant
+        items = iter(data)
+        for item in items:
+            if isinstance(item, tuple):
+                yield item[0], item[1], next(items, b"")
+            elif item:
+                yield item, None, b""
+
+    def _parse_list(self, data: list) -> list:
+        folders = {}
+        for head, literal, _ in self._literal_items(data):
+            match = _LIST_RE.match(head)
+            if not match:
+                continue
+            flags, separator, name = match.groups()
+            name = literal.decode() if literal is not None else self._unquote(name)
+            flags = flags.decode().split()
+            folders.setdefault(name, {
+                "name": name,
+                "separator": None if separator == b"NIL" else self._unquote(separator),
+                "flags": flags,
+                "selectable": not any(flag.lower() in NOSELECT_FLAGS for flag in flags),
+            })
+        return list(folders.values())
+
+    def _parse_statuses(self, data: list) -> dict:
+        results = {}
+        for head, literal, rest in self._literal_items(data):
+            if literal is not None:
+                name, items = literal.decode(), rest
+            else:
+                match = _MAILBOX_RE.match(head.strip())
+                if not match:
                     continue
+                name, items = self._unquote(match.group(1)), match.group(2)
+            results[name] = {key.decode().lower(): int(value) for key, value in _STATUS_RE.findall(items)}
+        return results
 
-        return folders
+    @staticmethod
+    def _add_counts(folders: list, statuses: dict):
+        for folder in folders:
+            folder.update(statuses.get(folder["name"], {}))
+
+    def _cache_key(self) -> str:
+        return f"{self.user}@{self.host}:{self.port}"
+
+    def _cached_folders(self) -> list:
+        # Arborescence seule : les compteurs changent trop souvent pour être mis en cache
+        if self.folder_cache_ttl <= 0 or not self.folder_cache:
+            return None
+        try:
+            entry = json.loads(Path(self.folder_cache).read_text(encoding="utf-8")).get(self._cache_key())
+        except (OSError, ValueError):
+            return None
+        if not entry or time.time() - entry["saved_at"] > self.folder_cache_ttl:
+            return None
+        return entry["folders"]
+
+    def _save_folders(self, folders: list):
+        if self.folder_cache_ttl <= 0 or not self.folder_cache:
+            return
+        path = Path(self.folder_cache)
+        try:
+            cache = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            cache = {}
+        cache[self._cache_key()] = {"saved_at": time.time(), "folders": [dict(folder) for folder in folders]}
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(path.name + ".tmp")
+            tmp.write_text(json.dumps(cache, ensure_ascii=False), encoding="utf-8")
+            tmp.replace(path)
+        except OSError as e:
+            print(f"⚠️ Cache des dossiers non écrit ({path}) : {e}")
 
     def fetch_recent(self, limit=10, hours=24, folder="INBOX"):
+        return list(self.iter_recent(limit=limit, hours=hours, folder=folder))
+
+    def iter_recent(self, limit=10, hours=24, folder="INBOX"):
         if not self.conn:
             print("❌ Pas de connexion active")
-            return []
+            return
 
-        messages = []
         cutoff = datetime.now(timezone.utc) - timedelta(hours=hours)
 
         try:
-            encoded_folder = self.encode_utf7(folder)
-            self.conn.select(encoded_folder)
-            typ, data = self.conn.search(None, 'ALL')
-            ids = data[0].split()
+            self._select(folder)
+            uids = self._search_since(cutoff)
+            yield from self._iter_messages(uids, cutoff=cutoff, limit=limit)
+        except Exception as e:
+            print(f"❌ Erreur fetch IMAP (recent) : {e}")
 
-            for num in reversed(ids):
-                typ, msg_data = self.conn.fetch(num, '(BODY[HEADER.FIELDS (FROM SUBJECT DATE)])')
-                raw = msg_data[0][1].decode()
-                headers = self._parse_header(raw)
+    def sync_folder(self, store, folder="INBOX", hours=24) -> int:
+        return sum(1 for _ in self.iter_sync(store, folder=folder, hours=hours))
 
+    def iter_sync(self, store, folder="INBOX", hours=24):
+        # Nouveaux mails rendus lot par lot, une fois enregistrés, du plus récent au plus ancien :
+        # ils sont plus récents que tout ce que le store contenait, le pipeline peut les traiter pendant la suite du fetch
+        if not self.conn:
+            print("❌ Pas de connexion active")
+            return
+
+        try:
+            uidvalidity = self._select(folder)
+            state = store.folder_state(folder)
+            if state and state["uidvalidity"] != uidvalidity:
+                print(f"🔄 UIDVALIDITY modifiée sur {folder} : resynchronisation complète")
+                store.reset_folder(folder)
+                state = None
+
+            window = datetime.now(timezone.utc) - timedelta(hours=hours)
+            if state:
+                last_uid = state["last_uid"]
+                with self._command("SEARCH"):
+                    typ, data = self.conn.uid("SEARCH", None, "UID", f"{last_uid + 1}:*")
+                # "n:*" renvoie toujours le dernier message, même si son UID est < n
+                uids = sorted(int(u) for u in (data[0] or b"").split() if int(u) > last_uid)
+                cutoff = None
+            else:
+                last_uid = 0
+                cutoff = window
+                uids = self._search_since(cutoff)
+
+            # Écriture par lots : la mémoire reste bornée quel que soit le nombre de mails.
+            # last_uid n'avance qu'à la fin, une sync interrompue reprend donc là où elle en était
+            count = 0
+            mails = []
+            for mail in self._iter_messages(uids, cutoff=cutoff):
+                mails.append(mail)
+                if len(mails) >= IMAP_FETCH_CHUNK:
+                    store.save(folder, uidvalidity, last_uid, mails)
+                    count += len(mails)
+                    yield from mails
+                    mails = []
+            # UIDNEXT lu au SELECT, donc avant la recherche : un mail arrivé entre-temps relancera bien la sync suivante
+            store.save(folder, uidvalidity, max(uids, default=last_uid), mails, uidnext=self.uidnext,
+                       since=None if state else window.timestamp())
+            count += len(mails)
+            yield from mails
+            print(f"🔁 {folder} : {count} nouveau(x) mail(s) synchronisé(s)")
+
+            # Fenêtre plus large que tout ce qui a déjà été synchronisé (--hours augmenté) : rattrapage des plus anciens.
+            # Pas rendus ici : plus anciens que le store, le pipeline les relit avec lui
+            if state and (state["synced_since"] is None or window.timestamp() < state["synced_since"]):
+                backfilled = self._backfill(store, folder, uidvalidity, last_uid, window)
+                if backfilled:
+                    print(f"⏪ {folder} : {backfilled} mail(s) plus ancien(s) rattrapé(s) pour la fenêtre de {hours}h")
+        except Exception as e:
+            print(f"❌ Erreur sync IMAP ({folder}) : {e}")
+
+    def _backfill(self, store, folder: str, uidvalidity: int, last_uid: int, window: datetime) -> int:
+        # Seuls les UID déjà couverts par la sync et absents du store : une seule recherche, puis le fetch des manquants
+        uids = []
+        if last_uid:
+            known = store.uids(folder)
+            uids = [uid for uid in self._search_since(window, max_uid=last_uid) if uid not in known]
+        count = 0
+        mails = []
+        for mail in self._iter_messages(uids, cutoff=window):
+            mails.append(mail)
+            if len(mails) >= IMAP_FETCH_CHUNK:
+                store.save(folder, uidvalidity, last_uid, mails)
+                count += len(mails)
+                mails = []
+        # Début de fenêtre enregistré à la fin seulement : un rattrapage interrompu sera refait
+        store.save(folder, uidvalidity, last_uid, mails, since=window.timestamp())
+        return count + len(mails)
+
+    def _select(self, folder: str) -> int:
+        with self._command("SELECT"):
+            typ, data = self.conn.select(self.encode_utf7(folder))
+        if typ != "OK":
+            raise imaplib.IMAP4.error(f"SELECT {folder} : {data}")
+        _, validity = self.conn.response("UIDVALIDITY")
+        _, uidnext = self.conn.response("UIDNEXT")
+        self.selected = folder
+        self.uidvalidity = int(validity[0]) if validity and validity[0] else 0
+        self.uidnext = int(uidnext[0]) if uidnext and uidnext[0] else 0
+        self.exists = int(data[0]) if data and data[0] else 0
+        return self.uidvalidity
+
+    def status(self, folder: str) -> dict:
+        # STATUS ne sélectionne pas le dossier : un seul aller-retour, sans toucher aux drapeaux \Recent
+        if not self.conn:
+            self.connect()
+            if not self.conn:
+                return {}
+        with self._command("STATUS"):
+            typ, data = self.conn.status(self.encode_utf7(folder), "(UIDNEXT UIDVALIDITY MESSAGES)")
+        if typ != "OK" or not data or not data[0]:
+            return {}
+        items = _STATUS_RE.findall(data[0])
+        return {key.decode().lower(): int(value) for key, value in items}
+
+    def supports_idle(self) -> bool:
+        return bool(self.conn) and "IDLE" in self.conn.capabilities
+
+    def idle(self, timeout: float, stop: threading.Event = None) -> bool:
+        # IDLE (RFC 2177) sur le dossier sélectionné : True dès que le serveur annonce un changement
+        self._raw_tags += 1
+        tag = f"W{self._raw_tags:04d}".encode()
+        with self._command("IDLE"):
+            self.conn.send(tag + b" IDLE\r\n")
+            line = self.conn.readline()
+        if not line:
+            raise imaplib.IMAP4.abort("connexion fermée au lancement de IDLE")
+        if not line.startswith(b"+"):
+            raise imaplib.IMAP4.error(f"IDLE refusé : {line.decode(errors='replace').strip()}")
+
+        changed = False
+        deadline = time.monotonic() + timeout
+        while not changed and time.monotonic() < deadline and not (stop and stop.is_set()):
+            # Attente par tranches d'une seconde : un arrêt demandé est pris en compte rapidement.
+            # Lignes déjà lues par imaplib d'abord : select() ne voit que ce qui reste sur le socket
+            if not self._buffered() and not select.select([self.conn.sock], [], [], min(1.0, max(0.0, deadline - time.monotonic())))[0]:
+                continue
+            line = self.conn.readline()
+            if not line:
+                raise imaplib.IMAP4.abort("connexion fermée pendant IDLE")
+            changed = self._changed(line)
+
+        self.conn.send(b"DONE\r\n")
+        while True:
+            line = self.conn.readline()
+            if not line:
+                raise imaplib.IMAP4.abort("connexion fermée pendant IDLE")
+            if line.startswith(tag + b" "):
+                if not line.startswith(tag + b" OK"):
+                    raise imaplib.IMAP4.error(f"IDLE : {line.decode(errors='replace').strip()}")
+                return changed
+            changed = self._changed(line) or changed
+
+    def _buffered(self) -> bool:
+        # Un "* n EXISTS" arrivé dans le même paquet que "+ idling" est déjà dans le tampon de self.conn.file.
+        # peek() sur un socket non bloquant rend ce tampon sans attendre, ou ce que le socket (et TLS) a déjà reçu
+        sock = self.conn.sock
+        timeout = sock.gettimeout()
+        sock.setblocking(False)
+        try:
+            return bool(self.conn.file.peek(1))
+        except (BlockingIOError, ssl.SSLWantReadError):
+            return False
+        finally:
+            sock.settimeout(timeout)
+
+    def poll(self, interval: float, stop: threading.Event = None) -> bool:
+        # Repli sans IDLE : un NOOP régulier, le serveur y joint les EXISTS/EXPUNGE en attente
+        if stop:
+            stop.wait(interval)
+        else:
+            time.sleep(interval)
+        with self._command("NOOP"):
+            typ, _ = self.conn.noop()
+        if typ != "OK":
+            raise imaplib.IMAP4.abort("NOOP refusé")
+        _, expunged = self.conn.response("EXPUNGE")
+        _, exists = self.conn.response("EXISTS")
+        count = int(exists[-1]) if exists and exists[-1] else self.exists
+        changed = count != self.exists or bool(expunged and expunged[0])
+        self.exists = count
+        return changed
+
+    def _changed(self, line: bytes) -> bool:
+        match = _UNTAGGED_RE.match(line)
+        if not match:
+            return False
+        if match.group(2) == b"EXISTS":
+            count = int(match.group(1))
+            changed, self.exists = count != self.exists, count
+            return changed
+        return True
+
+    def _iter_messages(self, uids: list, cutoff=None, limit=None):
+        count = 0
+        # Corps en cours de décodage, dans l'ordre des UIDs : (uid, en-têtes, part, tronqué, Future ou résultat)
+        pending = deque()
+        # Du plus récent au plus ancien, par lots : en-têtes d'abord, corps seulement pour les survivants
+        for chunk in self._chunks(uids[::-1], IMAP_FETCH_CHUNK):
+            candidates = []
+            for uid, headers, part in self._fetch_headers(chunk):
                 from_email = headers["from"].lower()
-                proton_blacklist = [
-                    "@notify.proton.me",
-                    "@calendar.proton.me",
-                    "@mail.proton.me",
-                    "@support.proton.me",
-                ]
-                if any(bad in from_email for bad in proton_blacklist):
+                if any(bad in from_email for bad in PROTON_BLACKLIST):
                     print(f"⏭️ Mail Proton technique ignoré : {from_email}")
                     continue
-
-                typ, body_data = self.conn.fetch(num, '(BODY[TEXT])')
-                body_raw = body_data[0][1]
-
                 try:
-                    body = base64.b64decode(body_raw).decode("utf-8")
+                    if cutoff and parsedate_to_datetime(headers["date"]) < cutoff:
+                        continue
                 except Exception:
-                    try:
-                        body = quopri.decodestring(body_raw).decode("utf-8", errors="replace")
-                    except Exception:
-                        body = body_raw.decode("utf-8", errors="replace")
-
-                body = self._clean_body(self._html_to_text(body))
+                    continue
+                candidates.append((uid, headers, part))
+
+            while candidates and (limit is None or count + len(pending) < limit):
+                size = len(candidates) if limit is None else limit - count - len(pending)
+                batch, candidates = candidates[:size], candidates[size:]
+                bodies = self._fetch_bodies([(uid, part) for uid, _, part in batch])
+                previous = len(pending)
+                for uid, headers, part in batch:
+                    if uid in bodies:
+                        payload, truncated = bodies[uid]
+                        pending.append((uid, headers, part, truncated, self._render(payload, part)))
+                # Le lot précédent s'est décodé pendant le fetch de celui-ci, qui reste en cours
+                # pendant le fetch suivant. Limite atteinte : on attend tout (les invitations sont écartées au décodage)
+                ready = len(pending) if limit is not None and count + len(pending) >= limit else previous
+                for mail in self._collect(pending, ready):
+                    count += 1
+                    yield mail
+
+            if limit is not None and count >= limit:
+                return
+        yield from self._collect(pending, len(pending))
+
+    def _render(self, payload: bytes, part):
+        if self.decode_workers > 0:
+            return get_decode_pool(self.decode_workers).submit(render_body, payload, part)
+        return render_body(payload, part)
+
+    def _collect(self, pending: deque, count: int):
+        for _ in range(count):
+            uid, headers, part, truncated, result = pending.popleft()
+            body, subtype, (decode, html, clean) = result.result() if isinstance(result, Future) else result
+            DECODE_SECONDS.observe(decode, subtype=subtype)
+            if html is not None:
+                HTML_SECONDS.observe(html)
+            CLEAN_SECONDS.observe(clean)
+            if "BEGIN:VCALENDAR" in body or "PRODID:-//ProtonCalendar//" in body:
+                continue
+            headers["body"] = body
+            if truncated:
+                headers["body_ref"] = self._body_ref(uid, part)
+            yield headers
+
+    def _search_since(self, cutoff: datetime, max_uid: int = 0) -> list:
+        # SINCE est à la journée (date interne serveur) : marge d'un jour, le filtre fin se fait sur Date
+        since = cutoff - timedelta(days=1)
+        criteria = f"{since.day:02d}-{IMAP_MONTHS[since.month - 1]}-{since.year}"
+        uid_range = ("UID", f"1:{max_uid}") if max_uid else ()
+        with self._command("SEARCH"):
+            typ, data = self.conn.uid("SEARCH", None, *uid_range, "SINCE", criteria)
+        if typ != "OK" or not data or not data[0]:
+            return []
+        return sorted(int(uid) for uid in data[0].split())
 
-                if "BEGIN:VCALENDAR" in body or "PRODID:-//ProtonCalendar//" in body:
+    def _fetch_headers(self, uids: list) -> list:
+        if not uids:
+            return []
+        # BODYSTRUCTURE voyage avec les en-têtes : aucun aller-retour de plus
+        fields = " ".join((HEADER_FIELDS, *(name.upper() for name in self.extra_headers)))
+        fetched = self._uid_fetch(uids, f"(UID FLAGS BODYSTRUCTURE BODY[HEADER.FIELDS ({fields})])")
+        results = []
+        for uid in uids:
+            meta, literals = fetched.get(uid, (b"", {}))
+            raw = next((v for k, v in literals.items() if k.startswith("BODY[HEADER")), None)
+            if raw is None:
+                continue
+            headers = self._parse_header(raw.decode("utf-8", errors="replace"))
+            flags = _FETCH_FLAGS_RE.search(meta)
+            headers["uid"] = uid
+            headers["flags"] = flags.group(1).decode().split() if flags else []
+            results.append((uid, headers, find_text_part(parse_bodystructure(meta))))
+        return results
+
+    def _fetch_bodies(self, batch: list) -> dict:
+        # Une commande FETCH par section distincte : en pratique "1", "1.1" ou "TEXT".
+        # Fetch partiel <0.N> : une pièce jointe encodée en ligne ne remonte jamais en entier
+        partial = f"<0.{self.max_body_bytes}>" if self.max_body_bytes else ""
+        sections = {}
+        for uid, part in batch:
+            sections.setdefault(part[0] if part else "TEXT", []).append((uid, part))
+
+        bodies = {}
+        for section, items in sections.items():
+            fetched = self._uid_fetch([uid for uid, _ in items], f"(UID BODY[{section}]{partial})")
+            for uid, part in items:
+                _, literals = fetched.get(uid, (b"", {}))
+                payload = next((v for k, v in literals.items() if k.startswith("BODY[")), None)
+                if payload is None:
                     continue
+                truncated = bool(self.max_body_bytes) and (
+                    part[4] > self.max_body_bytes if part and part[4] is not None else len(payload) >= self.max_body_bytes
+                )
+                # Corps brut : décodé ensuite par _render, éventuellement dans un autre processus
+                bodies[uid] = (payload, truncated)
+        return bodies
+
+    def _decode_part(self, payload: bytes, part) -> str:
+        if part is None:
+            # Structure inconnue : ancien décodage par essais successifs
+            with DECODE_SECONDS.time(subtype="inconnu"):
+                text = self._decode_body(payload)
+            return self._html_to_text(text)
+        _, subtype, encoding, charset, _ = part
+        with DECODE_SECONDS.time(subtype=subtype):
+            text = decode_part(payload, encoding, charset)
+        return self._html_to_text(text) if subtype == "html" else text
+
+    def _body_ref(self, uid: int, part) -> dict:
+        ref = {"folder": self.selected, "uidvalidity": self.uidvalidity, "uid": uid}
+        if part:
+            ref.update(zip(("section", "subtype", "encoding", "charset"), part[:4]))
+        return ref
+
+    def load_body(self, ref: dict) -> str:
+        if not self.conn:
+            self.connect()
+            if not self.conn:
+                return None
+        try:
+            if self._select(ref["folder"]) != ref["uidvalidity"]:
+                print(f"⚠️ UIDVALIDITY modifiée sur {ref['folder']} : corps complet introuvable")
+                return None
+            section = ref.get("section", "TEXT")
+            fetched = self._uid_fetch([ref["uid"]], f"(UID BODY.PEEK[{section}])")
+            _, literals = fetched.get(ref["uid"], (b"", {}))
+            payload = next((v for k, v in literals.items() if k.startswith("BODY[")), None)
+            if payload is None:
+                return None
+            part = (section, ref["subtype"], ref["encoding"], ref["charset"], None) if "subtype" in ref else None
+            return self._clean_body(self._decode_part(payload, part))
+        except Exception as e:
+            print(f"❌ Erreur chargement du corps complet : {e}")
+            return None
 
-                headers["body"] = body
+    def _uid_fetch(self, uids: list, items: str) -> dict:
+        with self._command("FETCH"):
+            typ, data = self.conn.uid("FETCH", self._uid_set(uids), items)
+        if typ != "OK":
+            return {}
+        return self._parse_fetch(data)
 
-                try:
-                    msg_date = parsedate_to_datetime(headers["date"])
-                    if msg_date >= cutoff:
-                        messages.append(headers)
-                        if len(messages) >= limit:
-                            break
-                except Exception:
-                    continue
+    def _parse_fetch(self, data: list) -> dict:
+        # imaplib renvoie des tuples (en-tête, littéral) et des bytes de fin de réponse ;
+        # l'UID peut apparaître avant ou après le littéral selon le serveur
+        results = {}
+        meta, literals = b"", {}
 
-        except Exception as e:
-            print(f"❌ Erreur fetch IMAP (recent) : {e}")
-        return messages
+        def flush():
+            match = _FETCH_UID_RE.search(meta)
+            if match:
+                results[int(match.group(1))] = (meta, literals)
+
+        for item in data:
+            if isinstance(item, tuple):
+                head, payload = item
+                if _FETCH_START_RE.match(head):
+                    if meta:
+                        flush()
+                    meta, literals = b"", {}
+                meta += head
+                name = _FETCH_LITERAL_RE.search(head)
+                literals[name.group(1).decode() if name else f"#{len(literals)}"] = payload
+            elif isinstance(item, bytes):
+                if _FETCH_START_RE.match(item):
+                    if meta:
+                        flush()
+                    meta, literals = b"", {}
+                meta += item
+        if meta:
+            flush()
+        return results
+
+    @staticmethod
+    def _uid_set(uids: list) -> str:
+        ranges = []
+        for uid in sorted(uids):
+            if ranges and uid == ranges[-1][1] + 1:
+                ranges[-1][1] = uid
+            else:
+                ranges.append([uid, uid])
+        return ",".join(str(lo) if lo == hi else f"{lo}:{hi}" for lo, hi in ranges)
+
+    @staticmethod
+    def _chunks(items: list, size: int):
+        for i in range(0, len(items), size):
+            yield items[i:i + size]
+
+    def _decode_body(self, body_raw: bytes) -> str:
+        return guess_decode(body_raw)
 
     def _parse_header(self, raw: str) -> dict:
         headers = {}
+        key = None
         for line in raw.splitlines():
-            if ':' in line:
+            if line[:1] in (" ", "\t") and key:
+                # En-tête replié sur plusieurs lignes (References en particulier)
+                headers[key] += " " + line.strip()
+            elif ':' in line:
                 key, value = line.split(':', 1)
-                headers[key.strip().lower()] = value.strip()
-        return {
+                key = key.strip().lower()
+                headers[key] = value.strip()
+        parsed = {
             "from": headers.get("from", ""),
             "subject": headers.get("subject", ""),
-            "date": headers.get("date", "")
+            "date": headers.get("date", ""),
+            "message_id": headers.get("message-id", ""),
+            "in_reply_to": headers.get("in-reply-to", ""),
+            "references": headers.get("references", "")
         }
+        extra = {name: headers[name] for name in self.extra_headers if name in headers}
+        if extra:
+            parsed["headers"] = extra
+        return parsed
 
-    def _parse_from(self, raw_from: str) -> dict:
+    @staticmethod
+    def _parse_from(raw_from: str) -> dict:
         match = re.match(r'(.*)<(.+?)>', raw_from)
         if match:
             name = match.group(1).strip().strip('"')
@@ -152,27 +770,22 @@ class IMAPClient:
             return {"name": "", "email": raw_from.strip()}
 
     def _html_to_text(self, html: str) -> str:
-        soup = BeautifulSoup(html, "html.parser")
-        return soup.get_text(separator=" ", strip=True)
+        with HTML_SECONDS.time():
+            return html_to_text(html)
 
     def _clean_body(self, raw_body: str) -> str:
-        lines = raw_body.splitlines()
-        clean = []
-        skip = False
-
-        for line in lines:
-            l = line.lower()
-            if any(
-                l.startswith(prefix)
-                for prefix in ("content-", "mime-version", "x-", "boundary=", "--", "begin", "encoded", "calendar", "charset")
-            ):
-                skip = True
-            elif skip and line.strip() == "":
-                skip = False
-            elif not skip:
-                clean.append(line)
-
-        return "\n".join(clean).strip()
+        with CLEAN_SECONDS.time():
+            return clean_body(raw_body)
+
+    @staticmethod
+    def decode_utf7(folder: str) -> str:
+        def decode(match):
+            chunk = match.group(1)
+            if not chunk:
+                return "&"
+            chunk = chunk.replace(",", "/")
+            return base64.b64decode(chunk + "=" * (-len(chunk) % 4)).decode("utf-16be")
+        return re.sub(r"&([^-]*)-", decode, folder)
 
     @staticmethod
     def encode_utf7(folder: str) -> str:
@@ -196,6 +809,65 @@ class IMAPClient:
         flush()
         return "".join(res)
 
+class IMAPPool:
+    def __init__(self, size=IMAP_POOL_SIZE, **client_kwargs):
+        self.size = max(1, size)
+        self.client_kwargs = client_kwargs
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> IMAPClient:
+        try:
+            client = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                create = self._created < self.size
+                if create:
+                    self._created += 1
+            if create:
+                client = IMAPClient(**self.client_kwargs)
+                client.connect()
+                return client
+            client = self._idle.get()
+
+        # Health check avant réutilisation : une connexion morte est rétablie
+        if not client.is_alive():
+            print("🔌 Connexion IMAP inactive, reconnexion...")
+            client.reconnect()
+        return client
+
+    def release(self, client: IMAPClient):
+        self._idle.put(client)
+
+    @contextmanager
+    def client(self):
+        client = self.acquire()
+        try:
+            yield client
+        finally:
+            self.release(client)
+
+    def map_folders(self, folders: list, fn) -> dict:
+        def run(folder):
+            try:
+                with self.client() as client:
+                    return fn(client, folder)
+            except Exception as e:
+                print(f"❌ Erreur sur {folder} : {e}")
+                return None
+
+        with ThreadPoolExecutor(max_workers=self.size) as executor:
+            return dict(zip(folders, executor.map(run, folders)))
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
 if __name__ == "__main__":
     client = IMAPClient()
     client.connect()
@@ -1,48 +1,437 @@
+import os
+import re
+import sys
 import json
-import requests
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from pathlib import Path
 import typer
 
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from core.summary_cache import SummaryCache, SUMMARY_CACHE
+from core.search_index import index_report
+from core.report_store import open_report
+from core.dedup import group_records, group_fields, group_text
+from core.preprocess import LLM_PREPROCESS, LLM_INPUT_TOKENS, estimate_tokens, prepare, prepare_group
+from core.mail import Mail
+from core import metrics
+
 app = typer.Typer()
 
-OLLAMA_URL = "http://127.0.0.1:11434/api/generate"
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://127.0.0.1:11434/api/generate")
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "mistral")
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "4"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))
+LLM_RETRIES = int(os.getenv("LLM_RETRIES", "3"))
+LLM_BACKOFF = float(os.getenv("LLM_BACKOFF", "1.0"))
+# Mode batch : 0 = un appel par mail, sinon budget (en tokens estimés) d'un prompt groupé
+LLM_BATCH_TOKENS = int(os.getenv("LLM_BATCH_TOKENS", "0"))
+LLM_BATCH_MAIL_TOKENS = int(os.getenv("LLM_BATCH_MAIL_TOKENS", "300"))
+# Budget d'un run de résumés (0 = illimité) : au-delà, les mails les moins prioritaires sont marqués summary_pending
+LLM_BUDGET_SECONDS = float(os.getenv("LLM_BUDGET_SECONDS", "0"))
+LLM_BUDGET_TOKENS = int(os.getenv("LLM_BUDGET_TOKENS", "0"))
+# Repli sans LLM pour les mails hors budget : première phrase utile du corps
+LLM_EXTRACTIVE_FALLBACK = os.getenv("LLM_EXTRACTIVE_FALLBACK", "1") == "1"
+LLM_EXTRACT_MAX_CHARS = int(os.getenv("LLM_EXTRACT_MAX_CHARS", "200"))
+
+PROMPT_TEMPLATE = "Tu es un assistant francophone. Résume le mail ci-dessous en **français** et en **une seul phrase courte**. Ignore les signatures et pieds de page.n\n{text}"
+BATCH_PROMPT_TEMPLATE = (
+    "Tu es un assistant francophone. Résume chacun des mails ci-dessous en **français** et en **une seule phrase courte**. "
+    "Ignore les signatures et pieds de page. Réponds uniquement en JSON, un objet qui associe l'identifiant de chaque mail "
+    "à son résumé : {{\"1\": \"résumé du mail 1\", \"2\": \"résumé du mail 2\"}}.\n\n{mails}"
+)
+
+_client = None
+_client_size = 0
+_client_lock = threading.Lock()
+_cache = None
+
+# Résultat d'un mail que le budget n'a pas laissé partir vers le LLM (à distinguer d'une erreur Ollama : None)
+SKIPPED = object()
+
+_GREETING_RE = re.compile(r"^(bonjour|bonsoir|salut|hello|hi|dear|cher|chère|madame|monsieur)\b[^,.!:]*[,.!:]?\s*", re.IGNORECASE)
+_NOISE_LINE_RE = re.compile(r"^(>|-- ?$|https?://\S+$|le .* a écrit ?:$|on .* wrote:$)", re.IGNORECASE)
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+
+LLM_SECONDS = metrics.histogram("llm_request_seconds", "Durée d'une requête Ollama (par tentative)", ("kind", "outcome"))
+LLM_RETRIES_TOTAL = metrics.counter("llm_retries_total", "Tentatives Ollama supplémentaires après une erreur")
+LLM_PROMPT_TOKENS = metrics.counter("llm_prompt_tokens_total", "Tokens de prompt envoyés à Ollama (estimation)", ("kind",))
+CACHE_LOOKUPS = metrics.counter("summary_cache_lookups_total", "Recherches dans le cache des résumés", ("result",))
+BATCH_FALLBACKS = metrics.counter("llm_batch_fallbacks_total", "Mails d'un prompt groupé repartis en appel unitaire")
+BUDGET_SKIPPED = metrics.counter("llm_budget_skipped_total", "Mails laissés sans résumé LLM faute de budget", ("budget",))
+
+
+def get_client(max_connections: int = LLM_CONCURRENCY):
+    # httpx n'est chargé qu'au premier appel au LLM
+    import httpx
+    global _client, _client_size
+    with _client_lock:
+        if _client is None or _client_size < max_connections:
+            if _client is not None:
+                _client.close()
+            _client = httpx.Client(
+                timeout=LLM_TIMEOUT,
+                limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            )
+            _client_size = max_connections
+        return _client
+
+
+def get_cache():
+    global _cache
+    with _client_lock:
+        if _cache is None and SUMMARY_CACHE:
+            _cache = SummaryCache(SUMMARY_CACHE)
+        return _cache
+
+
+def close_cache():
+    global _cache
+    with _client_lock:
+        if _cache is not None:
+            _cache.close()
+            _cache = None
+
+
+def _generate(payload: dict, timeout: float, retries: int, deadline: float = None) -> str:
+    import httpx
+    error = None
+    kind = "batch" if payload.get("format") == "json" else "unitaire"
+    LLM_PROMPT_TOKENS.inc(estimate_tokens(payload["prompt"]), kind=kind)
+    for attempt in range(retries + 1):
+        # Budget de temps : aucune tentative ne dépasse l'échéance du run
+        left = deadline - time.monotonic() if deadline else timeout
+        if left <= 0:
+            return None
+        start = time.perf_counter()
+        try:
+            response = get_client().post(OLLAMA_URL, json=payload, timeout=min(timeout, left))
+        except httpx.HTTPError as e:
+            error = f"{type(e).__name__} - {e}"
+            LLM_SECONDS.observe(time.perf_counter() - start, kind=kind, outcome="error")
+        else:
+            LLM_SECONDS.observe(time.perf_counter() - start, kind=kind, outcome="ok" if response.status_code == 200 else str(response.status_code))
+            if response.status_code == 200:
+                data = response.json()
+                return data.get("response", "")
+            error = f"{response.status_code} - {response.text}"
+            # Les erreurs client (hors 429) ne se corrigent pas en réessayant
+            if response.status_code < 500 and response.status_code != 429:
+                break
+        if deadline and time.monotonic() >= deadline:
+            # Requête coupée par l'échéance : le mail passe en summary_pending, ce n'est pas une panne
+            return None
+        if attempt < retries:
+            LLM_RETRIES_TOTAL.inc()
+            pause = LLM_BACKOFF * 2 ** attempt
+            time.sleep(max(0.0, min(pause, deadline - time.monotonic())) if deadline else pause)
 
-def summarize_text(text: str) -> str:
-    prompt = f"Tu es un assistant francophone. Résume le mail ci-dessous en **français** et en **une seul phrase courte**. Ignore les signatures et pieds de page.n\n{text}"
+    typer.echo(f"❌ Erreur Ollama : {error}")
+    return None
 
-    response = requests.post(OLLAMA_URL, json={
-        "model": "mistral",
-        "prompt": prompt,
+
+def summarize_text(text: str, timeout: float = LLM_TIMEOUT, retries: int = LLM_RETRIES, use_cache: bool = True, deadline: float = None) -> str:
+    cache = get_cache() if use_cache else None
+    key = SummaryCache.make_key(text, PROMPT_TEMPLATE, OLLAMA_MODEL) if cache else None
+    if cache:
+        cached = cache.get(key)
+        CACHE_LOOKUPS.inc(result="hit" if cached is not None else "miss")
+        if cached is not None:
+            return cached
+
+    summary = _generate({
+        "model": OLLAMA_MODEL,
+        "prompt": PROMPT_TEMPLATE.format(text=text),
         "stream": False
-    })
+    }, timeout, retries, deadline)
+    if summary is not None and cache:
+        cache.put(key, summary, PROMPT_TEMPLATE, OLLAMA_MODEL)
+    return summary
 
-    if response.status_code != 200:
-        typer.echo(f"❌ Erreur Ollama : {response.status_code} - {response.text}")
-        return None
 
-    data = response.json()
-    return data.get("response", "")
+def batchable(text: str, batch_tokens: int = LLM_BATCH_TOKENS) -> bool:
+    return batch_tokens > 0 and estimate_tokens(text) <= min(LLM_BATCH_MAIL_TOKENS, batch_tokens)
 
 
-@app.command()
-def enrich_summary(
-    input_file: Path = typer.Argument(..., help="Fichier .json à enrichir avec un résumé"),
-):
+def pack_batches(texts: list, batch_tokens: int = LLM_BATCH_TOKENS) -> list:
+    batches, current, used = [], [], 0
+    for text in texts:
+        tokens = estimate_tokens(text)
+        if current and used + tokens > batch_tokens:
+            batches.append(current)
+            current, used = [], 0
+        current.append(text)
+        used += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _parse_batch(raw: str, count: int) -> dict:
+    try:
+        data = json.loads(raw)
+    except (TypeError, ValueError):
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    return {
+        int(key) - 1: value.strip()
+        for key, value in data.items()
+        if str(key).isdigit() and 0 < int(key) <= count and isinstance(value, str) and value.strip()
+    }
+
+
+def summarize_batch(texts: list, timeout: float = LLM_TIMEOUT, retries: int = LLM_RETRIES, use_cache: bool = True, deadline: float = None) -> list:
+    cache = get_cache() if use_cache else None
+    keys = [SummaryCache.make_key(text, PROMPT_TEMPLATE, OLLAMA_MODEL) for text in texts]
+    summaries = [cache.get(key) if cache else None for key in keys]
+    todo = [i for i, summary in enumerate(summaries) if summary is None]
+    if cache:
+        CACHE_LOOKUPS.inc(len(keys) - len(todo), result="hit")
+        CACHE_LOOKUPS.inc(len(todo), result="miss")
+
+    if len(todo) > 1:
+        # Un seul prompt pour plusieurs mails courts, réponse JSON { id: résumé }
+        mails = "\n\n".join(f"### Mail {n}\n{texts[i]}" for n, i in enumerate(todo, 1))
+        raw = _generate({
+            "model": OLLAMA_MODEL,
+            "prompt": BATCH_PROMPT_TEMPLATE.format(mails=mails),
+            "format": "json",
+            "stream": False
+        }, timeout, retries, deadline)
+        for n, summary in _parse_batch(raw, len(todo)).items():
+            i = todo[n]
+            summaries[i] = summary
+            if cache:
+                cache.put(keys[i], summary, PROMPT_TEMPLATE, OLLAMA_MODEL)
+
+    # Réponse illisible ou mail oublié par le modèle : retour à l'appel unitaire
+    for i in todo:
+        if summaries[i] is None:
+            if len(todo) > 1:
+                BATCH_FALLBACKS.inc()
+            summaries[i] = summarize_text(texts[i], timeout=timeout, retries=retries, use_cache=use_cache, deadline=deadline)
+    return summaries
+
+
+class Budget:
+    # Partagé par les workers : tokens réservés à la soumission (ordre de priorité), temps vérifié au départ de chaque requête
+    def __init__(self, seconds: float = LLM_BUDGET_SECONDS, tokens: int = LLM_BUDGET_TOKENS):
+        self.deadline = time.monotonic() + seconds if seconds > 0 else None
+        self.tokens = tokens if tokens > 0 else None
+        self.skipped = 0
+        self._lock = threading.Lock()
+
+    def reserve(self, text: str) -> bool:
+        if self.tokens is None:
+            return True
+        needed = estimate_tokens(text)
+        with self._lock:
+            if needed > self.tokens:
+                self.skipped += 1
+                BUDGET_SKIPPED.inc(budget="tokens")
+                return False
+            self.tokens -= needed
+            return True
+
+    def expired(self) -> bool:
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def skip(self, count: int):
+        with self._lock:
+            self.skipped += count
+        BUDGET_SKIPPED.inc(count, budget="temps")
+
+
+def priority(record: Mail) -> tuple:
+    # Score d'abord (alertes, finance), puis les plus récents
+    try:
+        received = datetime.fromisoformat(record.date or "").timestamp()
+    except (TypeError, ValueError):
+        received = 0.0
+    return (record.score or 0, received)
+
+
+def extractive_summary(text: str) -> str:
+    # Première phrase qui porte du contenu : ni formule d'appel, ni citation, ni lien seul
+    for line in text.splitlines():
+        line = _GREETING_RE.sub("", line.strip())
+        if len(line.split()) < 4 or _NOISE_LINE_RE.match(line):
+            continue
+        sentence = _SENTENCE_END_RE.split(line, 1)[0]
+        if len(sentence) > LLM_EXTRACT_MAX_CHARS:
+            sentence = sentence[:LLM_EXTRACT_MAX_CHARS].rsplit(" ", 1)[0] + "…"
+        return sentence
+    return " ".join(text.split())[:LLM_EXTRACT_MAX_CHARS]
+
+
+def pending_fields(text: str, fallback: bool = LLM_EXTRACTIVE_FALLBACK) -> dict:
+    # Mail hors budget : résumé LLM repris au prochain run, extrait en attendant
+    return {"summary": extractive_summary(text) if fallback else None, "summary_pending": True}
+
+
+def summarize_job(texts: list, timeout: float = LLM_TIMEOUT, retries: int = LLM_RETRIES, use_cache: bool = True, budget: Budget = None) -> list:
+    # Un prompt (unitaire ou groupé) ; une fois l'échéance passée, ses mails reviennent en SKIPPED
+    if budget and budget.expired():
+        budget.skip(len(texts))
+        return [SKIPPED] * len(texts)
+    deadline = budget.deadline if budget else None
+    if len(texts) == 1:
+        summaries = [summarize_text(texts[0], timeout=timeout, retries=retries, use_cache=use_cache, deadline=deadline)]
+    else:
+        summaries = summarize_batch(texts, timeout=timeout, retries=retries, use_cache=use_cache, deadline=deadline)
+    if budget and budget.expired() and None in summaries:
+        budget.skip(summaries.count(None))
+        summaries = [SKIPPED if summary is None else summary for summary in summaries]
+    return summaries
+
+
+def summarize_many(texts: list, concurrency: int = LLM_CONCURRENCY, timeout: float = LLM_TIMEOUT, retries: int = LLM_RETRIES, use_cache: bool = True, batch_tokens: int = LLM_BATCH_TOKENS, priorities: list = None, budget: Budget = None) -> list:
+    if not texts:
+        return []
+    concurrency = max(1, concurrency)
+    get_client(concurrency)
+
+    # Les corps identiques (une fois normalisés) ne partent qu'une fois vers le LLM
+    unique, ranks = {}, {}
+    for n, text in enumerate(texts):
+        key = SummaryCache.make_key(text, PROMPT_TEMPLATE, OLLAMA_MODEL)
+        unique.setdefault(key, text)
+        if priorities is not None:
+            ranks[key] = max(ranks.get(key, priorities[n]), priorities[n])
+    # Plus prioritaires en tête : le pool traite les jobs dans l'ordre de soumission
+    keys = sorted(unique, key=ranks.__getitem__, reverse=True) if priorities is not None else list(unique)
+
+    summaries = {}
+    admitted = []
+    for key in keys:
+        if budget and not budget.reserve(unique[key]):
+            summaries[key] = SKIPPED
+        else:
+            admitted.append(key)
+
+    short = [unique[key] for key in admitted if batchable(unique[key], batch_tokens)]
+    jobs = pack_batches(short, batch_tokens) + [[unique[key]] for key in admitted if not batchable(unique[key], batch_tokens)]
+    if priorities is not None:
+        jobs.sort(key=lambda job: ranks[SummaryCache.make_key(job[0], PROMPT_TEMPLATE, OLLAMA_MODEL)], reverse=True)
+
+    def run(job):
+        return summarize_job(job, timeout=timeout, retries=retries, use_cache=use_cache, budget=budget)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for job, results in zip(jobs, pool.map(run, jobs)):
+            for text, summary in zip(job, results):
+                summaries[SummaryCache.make_key(text, PROMPT_TEMPLATE, OLLAMA_MODEL)] = summary
+    return [summaries[SummaryCache.make_key(text, PROMPT_TEMPLATE, OLLAMA_MODEL)] for text in texts]
+
+
+def enrich_file(
+    input_file: Path,
+    concurrency: int = LLM_CONCURRENCY,
+    timeout: float = LLM_TIMEOUT,
+    retries: int = LLM_RETRIES,
+    cache: bool = True,
+    batch_tokens: int = LLM_BATCH_TOKENS,
+    dedup: bool = True,
+    budget_seconds: float = LLM_BUDGET_SECONDS,
+    budget_tokens: int = LLM_BUDGET_TOKENS,
+    fallback: bool = LLM_EXTRACTIVE_FALLBACK,
+    preprocess: bool = LLM_PREPROCESS,
+    input_tokens: int = LLM_INPUT_TOKENS,
+) -> Path:
     if not input_file.exists():
         typer.echo("❌ Fichier introuvable")
         raise typer.Exit(1)
 
-    with input_file.open("r", encoding="utf-8") as f:
-        mails = json.load(f)
+    report = open_report(input_file)
+    if report.path != input_file:
+        typer.echo(f"🔁 Rapport JSON converti : {report.path}")
+
+    # Seuls les corps sans résumé (ou laissés hors budget au run précédent) restent en mémoire, le rapport est lu en flux
+    pending, ranks, flagged = {}, {}, set()
+    for i, mail in enumerate(report):
+        if not mail.summary or mail.summary_pending:
+            pending[i] = mail.body
+            ranks[i] = priority(mail)
+            if mail.summary_pending:
+                flagged.add(i)
+    if dedup:
+        # Doublons et fils de discussion : un seul résumé par groupe (deuxième lecture, seuls les hash sont gardés)
+        groups = group_records(report)
+        report.update_columns((i, group_fields(group)) for group in groups if len(group["members"]) > 1 for i in group["members"])
+        groups = [group for group in groups if any(i in pending for i in group["members"])]
+        needed = {i for group in groups for i in group["members"]}
+        bodies = pending if needed <= pending.keys() else {i: mail.body for i, mail in enumerate(report) if i in needed}
+        todo = [(group["members"], [bodies[i] for i in group["members"]]) for group in groups]
+    else:
+        todo = [([i], [body]) for i, body in pending.items()]
+    # Texte envoyé au LLM : sans historique cité, signatures ni mentions légales, tronqué au budget par mail
+    tokens = [0, 0]
+    for n, (members, texts) in enumerate(todo):
+        if preprocess:
+            text, before, after = prepare_group(texts, input_tokens)
+            tokens[0] += before
+            tokens[1] += after
+        else:
+            text = group_text(texts)
+        todo[n] = (members, text)
 
-    for mail in mails:
-        if not mail.get("summary"):
-            mail["summary"] = summarize_text(mail["body"])
+    # Groupe aussi prioritaire que son mail le plus prioritaire encore sans résumé
+    priorities = [max(ranks[i] for i in members if i in ranks) for members, _ in todo]
+    budget = Budget(budget_seconds, budget_tokens)
+    start = time.perf_counter()
+    summaries = summarize_many([text for _, text in todo], concurrency=concurrency, timeout=timeout, retries=retries, use_cache=cache, batch_tokens=batch_tokens, priorities=priorities, budget=budget)
+    elapsed = time.perf_counter() - start
 
-    with input_file.open("w", encoding="utf-8") as f:
-        json.dump(mails, f, ensure_ascii=False, indent=2)
+    def columns():
+        for (members, text), summary in zip(todo, summaries):
+            if summary is SKIPPED:
+                # Les mails du groupe déjà résumés gardent leur résumé
+                fields = pending_fields(text, fallback)
+                yield from ((i, fields) for i in members if i in pending)
+                continue
+            for i in members:
+                if i in pending:
+                    yield i, {"summary": summary, "summary_pending": False} if i in flagged else {"summary": summary}
+                elif summary is not None:
+                    # Échec Ollama (None) : les mails du groupe déjà résumés gardent leur résumé
+                    yield i, {"summary": summary}
 
-    typer.echo(f"✅ Résumés ajoutés dans : {input_file}")
+    report.update_columns(columns())
+    index_report(report, report.path)
+
+    if todo:
+        typer.echo(f"⚡ {len(todo)} résumé(s) en {elapsed:.1f}s ({len(todo) / elapsed:.2f} mails/s, concurrence {concurrency})")
+    if tokens[0]:
+        typer.echo(f"✂️ Prétraitement : {tokens[0] - tokens[1]} tokens estimés en moins ({1 - tokens[1] / tokens[0]:.0%}), {tokens[1]} envoyés")
+    if budget.skipped:
+        typer.echo(f"⏳ {budget.skipped} résumé(s) hors budget, marqué(s) summary_pending pour le prochain run")
+    summary_cache = get_cache() if cache else None
+    if summary_cache:
+        typer.echo(f"🗃️ Cache résumés : {summary_cache.hits} hit(s), {summary_cache.misses} miss(es)")
+        close_cache()
+    typer.echo(f"✅ Résumés ajoutés dans : {report.path}")
+    return report.path
+
+
+@app.command()
+def enrich_summary(
+    input_file: Path = typer.Argument(..., help="Rapport à enrichir avec un résumé (.jsonl, .jsonl.gz ou .json historique)"),
+    concurrency: int = typer.Option(LLM_CONCURRENCY, help="Nombre de requêtes Ollama en parallèle"),
+    timeout: float = typer.Option(LLM_TIMEOUT, help="Timeout par requête (secondes)"),
+    retries: int = typer.Option(LLM_RETRIES, help="Nombre de tentatives supplémentaires par mail"),
+    cache: bool = typer.Option(True, help="Réutiliser les résumés déjà calculés (cache disque)"),
+    batch_tokens: int = typer.Option(LLM_BATCH_TOKENS, help="Budget en tokens d'un prompt groupé de mails courts (0 = un appel par mail)"),
+    budget_seconds: float = typer.Option(LLM_BUDGET_SECONDS, help="Temps maximal des résumés, mails prioritaires d'abord (0 = illimité)"),
+    budget_tokens: int = typer.Option(LLM_BUDGET_TOKENS, help="Tokens maximum envoyés au LLM, mails prioritaires d'abord (0 = illimité)"),
+    fallback: bool = typer.Option(LLM_EXTRACTIVE_FALLBACK, help="Première phrase du mail comme résumé provisoire hors budget"),
+    preprocess: bool = typer.Option(LLM_PREPROCESS, help="Retirer historique cité, signatures, mentions légales et URLs avant résumé"),
+    input_tokens: int = typer.Option(LLM_INPUT_TOKENS, help="Tokens estimés maximum par mail envoyé au LLM (0 = pas de troncature)"),
+):
+    enrich_file(input_file, concurrency, timeout, retries, cache, batch_tokens, budget_seconds=budget_seconds, budget_tokens=budget_tokens, fallback=fallback,
+                preprocess=preprocess, input_tokens=input_tokens)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,95 @@
+import sys
+from dataclasses import dataclass, fields
+from datetime import datetime
+
+
+@dataclass(slots=True)
+class Mail:
+    # Mail normalisé d'un rapport : mêmes noms que les clés du JSON, une instance sans __dict__ par mail.
+    # Le corps est gardé en UTF-8 (moitié moins de place qu'une str dès qu'un caractère sort du Latin-1 :
+    # ’, €, emoji) et décodé seulement quand on le lit
+    from_name: str = ""
+    from_email: str = ""
+    subject: str = ""
+    date: str = ""
+    raw_body: bytes = b""
+    message_id: str = None
+    in_reply_to: str = None
+    references: str = None
+    body_truncated: bool = False
+    body_ref: dict = None
+    # None : mail pas encore classé ; [] : classé, sans tag
+    tags: list = None
+    score: int = None
+    summary: str = None
+    summary_pending: bool = False
+    group: int = None
+    group_size: int = None
+    group_kind: str = None
+    # Clés inconnues du modèle (ajoutées par un outil externe, "snippet" d'une recherche...) : relues et réécrites telles quelles
+    extra: dict = None
+
+    @property
+    def body(self) -> str:
+        return self.raw_body.decode("utf-8")
+
+    @body.setter
+    def body(self, value: str):
+        self.raw_body = value.encode("utf-8")
+
+    def preview(self, length: int) -> str:
+        # Début du corps sans décoder le reste : length caractères tiennent dans 4 * length octets
+        return self.raw_body[:4 * length].decode("utf-8", "ignore")[:length]
+
+    @property
+    def short_date(self) -> str:
+        try:
+            return datetime.fromisoformat(self.date).strftime("%d %b %H:%M")
+        except Exception:
+            return self.date
+
+    @classmethod
+    def from_record(cls, record: dict) -> "Mail":
+        values = {key: value for key, value in record.items() if key in _SETTABLE}
+        mail = cls(raw_body=record.get("body", "").encode("utf-8"), **values)
+        if len(values) + ("body" in record) < len(record):
+            mail.extra = {key: value for key, value in record.items() if key not in _SETTABLE and key != "body"}
+        # Expéditeurs répétés d'un mail à l'autre : une seule chaîne en mémoire par valeur
+        if mail.from_name.__class__ is str:
+            mail.from_name = sys.intern(mail.from_name)
+        if mail.from_email.__class__ is str:
+            mail.from_email = sys.intern(mail.from_email)
+        return mail
+
+    def update(self, values: dict):
+        for key, value in values.items():
+            if key == "body":
+                self.raw_body = value.encode("utf-8")
+            elif key in _SETTABLE:
+                setattr(self, key, value)
+            else:
+                if self.extra is None:
+                    self.extra = {}
+                self.extra[key] = value
+
+    def to_record(self) -> dict:
+        # Schéma JSON des rapports : champs de base toujours présents, optionnels seulement s'ils sont renseignés
+        record = {
+            "from_name": self.from_name,
+            "from_email": self.from_email,
+            "subject": self.subject,
+            "date": self.date,
+            "body": self.body,
+        }
+        for key in OPTIONAL_FIELDS:
+            value = getattr(self, key)
+            if value is not None and value is not False:
+                record[key] = value
+        if self.extra:
+            record.update(self.extra)
+        return record
+
+
+FIELDS = tuple(f.name for f in fields(Mail) if f.name not in ("raw_body", "extra"))
+OPTIONAL_FIELDS = FIELDS[4:]
+_SETTABLE = frozenset(FIELDS)
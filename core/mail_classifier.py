@@ -1,57 +1,94 @@
+import os
+import sys
 import typer
-import json
+from itertools import islice
 from pathlib import Path
 from typing import Optional
 
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from core.mail import Mail
+from core.rules import RuleEngine, RULES_FILE
+from core.search_index import index_report
+from core.report_store import open_report, read_report, save_report
+from core import metrics
+
+CLASSIFY_SECONDS = metrics.histogram("classify_seconds", "Tagging et scoring d'un mail par le moteur de règles")
+TAGS = metrics.counter("mail_tags_total", "Tags posés par le classifieur", ("tag",))
+
+# Étage sémantique (core/semantic.py) pour les mails qu'aucune règle ne reconnaît
+SEMANTIC_CLASSIFIER = os.getenv("SEMANTIC_CLASSIFIER", "0") == "1"
+
 
 app = typer.Typer()
 
-def classify_mail(mail:dict) -> dict:
-    tags = []
-    subject = mail["subject"].lower()
-    sender = mail["from_email"].lower()
-
-    if "github" in sender or "gitlab" in sender:
-        tags.append("dev")
-    if "alert" in subject or "security" in subject:
-        tags.append("alert")
-    if any(word in subject for word in ["facture", "paiement", "stripe", "recu"]):
-        tags.append("finance")
-
-    score = 0
-    if "alert" in tags:
-        score = 8
-    elif "finance" in tags:
-        score = 6
-    elif "dev" in tags:
-        score = 5
-
-    mail["tags"] = tags
-    mail["score"] = score or None
-    mail["summary"] = None
+_engine = None
+
+def get_engine() -> RuleEngine:
+    global _engine
+    if _engine is None:
+        _engine = RuleEngine.from_file(RULES_FILE)
+    return _engine
 
+def classify_mail(mail: Mail, semantic: bool = SEMANTIC_CLASSIFIER) -> Mail:
+    with CLASSIFY_SECONDS.time():
+        mail = get_engine().classify(mail)
+        if semantic and not mail.tags:
+            from core.semantic import classify_semantic
+            classify_semantic([mail])
+    for tag in mail.tags:
+        TAGS.inc(tag=tag)
     return mail
 
-@app.command()
-def tag(
-    input_file: Path = typer.Argument(..., help="Fichier .json à enrichir"),
-    output_file: Optional[Path] = typer.Option(None, help="Fichier de sortie (.json)"),
-):
+def classify_many(mails: list, semantic: bool = SEMANTIC_CLASSIFIER) -> list:
+    mails = get_engine().classify_many(mails)
+    if semantic:
+        from core.semantic import classify_semantic
+        classify_semantic(mails)
+    return mails
+
+def classify_stream(mails, semantic: bool = SEMANTIC_CLASSIFIER, batch_size: int = 1000):
+    # Règles mail par mail, étage sémantique par lots : un seul produit matriciel pour tout le lot
+    mails = iter(mails)
+    while True:
+        batch = [classify_mail(mail, semantic=False) for mail in islice(mails, batch_size)]
+        if not batch:
+            return
+        if semantic:
+            from core.semantic import classify_semantic
+            classify_semantic(batch)
+        yield from batch
+
+def classify_file(input_file: Path, output_file: Optional[Path] = None, semantic: bool = SEMANTIC_CLASSIFIER) -> Path:
     if not input_file.exists():
         typer.echo(f"❌ Fichier introuvable: {input_file}")
         raise typer.Exit(1)
 
-    with input_file.open("r", encoding="utf-8") as f:
-        mails = json.load(f)
-
-    updated = [classify_mail(m) for m in mails]
+    report = open_report(input_file)
+    if report.path != input_file:
+        typer.echo(f"🔁 Rapport JSON converti : {report.path}")
 
-    target_file = output_file or input_file
-
-    with target_file.open("w", encoding="utf-8") as f:
-        json.dump(updated, f, ensure_ascii=False, indent = 2)
+    if output_file and output_file not in (input_file, report.path):
+        target_file = save_report(classify_stream(report, semantic), output_file)
+        index_report(read_report(target_file), target_file)
+    else:
+        # Seules les colonnes tags/score sont écrites, les corps ne sont pas réécrits
+        target_file = report.path
+        report.update_columns(
+            (i, {"tags": mail.tags, "score": mail.score})
+            for i, mail in enumerate(classify_stream(report, semantic))
+        )
+        index_report(report, target_file)
 
     typer.echo(f"✅ Classifications ajoutées dans : {target_file}")
+    return target_file
+
+@app.command()
+def tag(
+    input_file: Path = typer.Argument(..., help="Rapport à enrichir (.jsonl, .jsonl.gz ou .json historique)"),
+    output_file: Optional[Path] = typer.Option(None, help="Fichier de sortie (.jsonl, .jsonl.gz ou .json)"),
+    semantic: bool = typer.Option(SEMANTIC_CLASSIFIER, help="Tags par similarité avec des exemples pour les mails sans règle"),
+):
+    classify_file(input_file, output_file, semantic)
 
 if __name__ == "__main__":
     app()
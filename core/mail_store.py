@@ -0,0 +1,142 @@
+import os
+import json
+import sqlite3
+from pathlib import Path
+from datetime import datetime, timezone, timedelta
+from email.utils import parsedate_to_datetime
+
+MAIL_STORE = os.getenv("MAIL_STORE", "reports/mail_store.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS folders (
+    name TEXT PRIMARY KEY,
+    uidvalidity INTEGER NOT NULL,
+    last_uid INTEGER NOT NULL DEFAULT 0,
+    uidnext INTEGER NOT NULL DEFAULT 0,
+    synced_at TEXT,
+    synced_since REAL
+);
+CREATE TABLE IF NOT EXISTS messages (
+    folder TEXT NOT NULL,
+    uid INTEGER NOT NULL,
+    sender TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    date TEXT NOT NULL,
+    date_ts REAL,
+    body TEXT NOT NULL,
+    flags TEXT NOT NULL DEFAULT '[]',
+    body_ref TEXT,
+    message_id TEXT,
+    in_reply_to TEXT,
+    refs TEXT,
+    headers TEXT,
+    PRIMARY KEY (folder, uid)
+);
+CREATE INDEX IF NOT EXISTS messages_folder_date ON messages (folder, date_ts);
+"""
+
+
+class MailStore:
+    def __init__(self, path=MAIL_STORE):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(self.path))
+        self.db.executescript(SCHEMA)
+        # Stores créés avant la troncature des corps, le suivi des fils de discussion ou les règles sur en-têtes
+        columns = {row[1] for row in self.db.execute("PRAGMA table_info(messages)")}
+        for column in ("body_ref", "message_id", "in_reply_to", "refs", "headers"):
+            if column not in columns:
+                self.db.execute(f"ALTER TABLE messages ADD COLUMN {column} TEXT")
+        folder_columns = {row[1] for row in self.db.execute("PRAGMA table_info(folders)")}
+        if "uidnext" not in folder_columns:
+            self.db.execute("ALTER TABLE folders ADD COLUMN uidnext INTEGER NOT NULL DEFAULT 0")
+        # Début de la plus large fenêtre synchronisée : inconnu (NULL) pour un store plus ancien, qui sera complété
+        if "synced_since" not in folder_columns:
+            self.db.execute("ALTER TABLE folders ADD COLUMN synced_since REAL")
+
+    def close(self):
+        self.db.close()
+
+    def folder_state(self, folder: str):
+        row = self.db.execute(
+            "SELECT uidvalidity, last_uid, uidnext, synced_since FROM folders WHERE name = ?", (folder,)
+        ).fetchone()
+        return {"uidvalidity": row[0], "last_uid": row[1], "uidnext": row[2], "synced_since": row[3]} if row else None
+
+    def uids(self, folder: str) -> set:
+        return {uid for uid, in self.db.execute("SELECT uid FROM messages WHERE folder = ?", (folder,))}
+
+    def reset_folder(self, folder: str):
+        with self.db:
+            self.db.execute("DELETE FROM messages WHERE folder = ?", (folder,))
+            self.db.execute("DELETE FROM folders WHERE name = ?", (folder,))
+
+    def save(self, folder: str, uidvalidity: int, last_uid: int, mails: list, uidnext: int = 0, since: float = None):
+        # since : début (timestamp) de la fenêtre désormais entièrement synchronisée, seulement à la fin d'une sync
+        rows = []
+        for mail in mails:
+            try:
+                date_ts = parsedate_to_datetime(mail["date"]).timestamp()
+            except Exception:
+                date_ts = None
+            rows.append((
+                folder, mail["uid"], mail["from"], mail["subject"], mail["date"], date_ts,
+                mail["body"], json.dumps(mail.get("flags", [])),
+                json.dumps(mail["body_ref"]) if mail.get("body_ref") else None,
+                mail.get("message_id", ""), mail.get("in_reply_to", ""), mail.get("references", ""),
+                json.dumps(mail["headers"], ensure_ascii=False) if mail.get("headers") else None,
+            ))
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO messages (folder, uid, sender, subject, date, date_ts, body, flags, body_ref, "
+                "message_id, in_reply_to, refs, headers) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self.db.execute(
+                "INSERT INTO folders (name, uidvalidity, last_uid, uidnext, synced_at, synced_since) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET uidvalidity = excluded.uidvalidity, "
+                "last_uid = MAX(folders.last_uid, excluded.last_uid), uidnext = MAX(folders.uidnext, excluded.uidnext), "
+                "synced_at = excluded.synced_at, "
+                "synced_since = COALESCE(MIN(folders.synced_since, excluded.synced_since), folders.synced_since, excluded.synced_since)",
+                (folder, uidvalidity, last_uid, uidnext, datetime.now(timezone.utc).isoformat(), since),
+            )
+
+    def recent(self, folder: str, hours: int = 24, limit: int = 30) -> list:
+        cutoff = (datetime.now(timezone.utc) - timedelta(hours=hours)).timestamp()
+        rows = self.db.execute(
+            "SELECT uid, sender, subject, date, body, flags, body_ref, message_id, in_reply_to, refs, headers FROM messages "
+            "WHERE folder = ? AND date_ts >= ? ORDER BY uid DESC LIMIT ?",
+            (folder, cutoff, limit),
+        ).fetchall()
+        return self._mails(rows)
+
+    def since(self, folder: str, uid: int) -> list:
+        # Mails arrivés après un UID donné (mode watch), du plus récent au plus ancien
+        rows = self.db.execute(
+            "SELECT uid, sender, subject, date, body, flags, body_ref, message_id, in_reply_to, refs, headers FROM messages "
+            "WHERE folder = ? AND uid > ? ORDER BY uid DESC",
+            (folder, uid),
+        ).fetchall()
+        return self._mails(rows)
+
+    @staticmethod
+    def _mails(rows: list) -> list:
+        mails = []
+        for uid, sender, subject, date, body, flags, body_ref, message_id, in_reply_to, refs, headers in rows:
+            mail = {
+                "uid": uid,
+                "from": sender,
+                "subject": subject,
+                "date": date,
+                "body": body,
+                "flags": json.loads(flags),
+                "message_id": message_id or "",
+                "in_reply_to": in_reply_to or "",
+                "references": refs or "",
+            }
+            if body_ref:
+                mail["body_ref"] = json.loads(body_ref)
+            if headers:
+                mail["headers"] = json.loads(headers)
+            mails.append(mail)
+        return mails
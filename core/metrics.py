@@ -0,0 +1,309 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+# Importé par presque tous les modules : typer et http.server ne sont chargés qu'à l'affichage ou au service
+
+# Export au format texte Prometheus : fichier (collecteur textfile de node_exporter) et/ou endpoint HTTP local
+METRICS_FILE = os.getenv("METRICS_FILE", "")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_PREFIX = "mcp_mail_"
+# Étapes profilées (ex. "fetch,summarize"), profileur "cprofile" ou "pyinstrument"
+PROFILE_STAGES = os.getenv("PROFILE_STAGES", "")
+PROFILER = os.getenv("PROFILER", "cprofile")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "reports/profiles")
+
+# Secondes : de l'aller-retour IMAP local (ms) à l'appel LLM lent (minute)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in values)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, escaped)) + "}"
+
+
+def _value(value) -> str:
+    # Valeur exacte : un compteur au-delà de 10⁶ ne doit pas être arrondi (":g" garde 6 chiffres significatifs)
+    if isinstance(value, int):
+        return str(int(value))
+    if value != value:
+        return "NaN"
+    if value in (float("inf"), float("-inf")):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in sorted(self.values.items())]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.values = {}  # labels -> [compteurs par bucket..., +Inf, somme]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            counts = self.values.get(key)
+            if counts is None:
+                counts = self.values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[len(self.buckets)] += 1
+            counts[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def stats(self):
+        # (labels, nombre, somme, borne haute du p95) par série, pour le tableau de fin de run
+        with self._lock:
+            items = [(key, list(counts)) for key, counts in sorted(self.values.items())]
+        rows = []
+        for key, counts in items:
+            total = sum(counts[:-1])
+            seen, p95 = 0, float("inf")
+            for bound, count in zip(self.buckets, counts):
+                seen += count
+                if seen >= 0.95 * total:
+                    p95 = bound
+                    break
+            rows.append((key, total, counts[-1], p95))
+        return rows
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(counts)) for key, counts in sorted(self.values.items())]
+        samples = []
+        for key, counts in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                samples.append((f"{self.name}_bucket", key + (le,), cumulative))
+            samples.append((f"{self.name}_sum", key, counts[-1]))
+            samples.append((f"{self.name}_count", key, cumulative))
+        return samples
+
+
+class Registry:
+    def __init__(self, prefix: str = METRICS_PREFIX):
+        self.prefix = prefix
+        self.metrics = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    def _get(self, cls, name: str, help_text: str, labelnames: tuple, **kwargs):
+        with self._lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(self.prefix + name, help_text, labelnames, **kwargs)
+            return metric
+
+    def counter(self, name: str, help_text: str, labelnames: tuple = ()) -> Counter:
+        return self._get(Counter, name, help_text, labelnames)
+
+    def histogram(self, name: str, help_text: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help_text, labelnames, buckets=buckets)
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            names = metric.labelnames + (("le",) if metric.kind == "histogram" else ())
+            for sample, key, value in metric.samples():
+                lines.append(f"{sample}{_labels(names[:len(key)], key)} {_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path) -> Path:
+        # Écriture atomique : le collecteur ne lit jamais un fichier à moitié écrit
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".tmp-{path.name}")
+        tmp.write_text(self.render(), encoding="utf-8")
+        os.replace(tmp, path)
+        return path
+
+    def serve(self, port: int, host: str = "127.0.0.1"):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                body = registry.render().encode("utf-8")
+                self.send_response(200 if self.path in ("/", "/metrics") else 404)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self._server
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def summary(self):
+        import typer
+        typer.echo(f"📊 {'métrique':<48} {'nombre':>8} {'total':>10} {'moyenne':>10} {'p95 ≤':>8}")
+        for metric in list(self.metrics.values()):
+            short = metric.name[len(self.prefix):]
+            if metric.kind == "counter":
+                for _, key, value in metric.samples():
+                    typer.echo(f"   {short + _labels(metric.labelnames, key):<48} {value:>8g}")
+                continue
+            for key, count, total, p95 in metric.stats():
+                if not count:
+                    continue
+                p95_text = "> max" if p95 == float("inf") else f"{p95 * 1000:g} ms"
+                typer.echo(
+                    f"   {short + _labels(metric.labelnames, key):<48} {count:>8} {total:>9.2f}s "
+                    f"{total / count * 1000:>8.1f}ms {p95_text:>8}"
+                )
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, help_text: str, labelnames: tuple = ()) -> Counter:
+    return REGISTRY.counter(name, help_text, labelnames)
+
+
+def histogram(name: str, help_text: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.histogram(name, help_text, labelnames, buckets)
+
+
+class StageProfiler:
+    # Un profileur par (étape, thread) : cProfile ne suit que le thread qui l'a activé
+    def __init__(self, stages, backend: str = PROFILER, directory=PROFILE_DIR):
+        self.stages = {stage.strip() for stage in stages if stage.strip()}
+        self.backend = backend
+        self.directory = Path(directory)
+        self.profilers = {}
+        self._lock = threading.Lock()
+        if backend == "pyinstrument":
+            try:
+                import pyinstrument  # noqa: F401
+            except ImportError:
+                import typer
+                typer.echo("⚠️ pyinstrument non installé : profilage avec cProfile")
+                self.backend = "cprofile"
+
+    def _profiler(self, stage: str):
+        key = (stage, threading.get_ident())
+        with self._lock:
+            profiler = self.profilers.get(key)
+            if profiler is None:
+                if self.backend == "pyinstrument":
+                    from pyinstrument import Profiler
+                    profiler = Profiler(async_mode="disabled")
+                else:
+                    import cProfile
+                    profiler = cProfile.Profile()
+                self.profilers[key] = profiler
+            return profiler
+
+    @contextmanager
+    def __call__(self, stage: str):
+        if stage not in self.stages:
+            yield
+            return
+        profiler = self._profiler(stage)
+        if self.backend == "pyinstrument":
+            profiler.start()
+            try:
+                yield
+            finally:
+                profiler.stop()
+        else:
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+
+    def dump(self) -> list:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        written = []
+        for stage in sorted(self.stages):
+            profilers = [p for (s, _), p in self.profilers.items() if s == stage]
+            if not profilers:
+                continue
+            if self.backend == "pyinstrument":
+                for n, profiler in enumerate(profilers):
+                    path = self.directory / f"{stage}-{n}.html"
+                    path.write_text(profiler.output_html(), encoding="utf-8")
+                    written.append(path)
+            else:
+                import pstats
+                stats = pstats.Stats(profilers[0])
+                for profiler in profilers[1:]:
+                    stats.add(profiler)
+                path = self.directory / f"{stage}.prof"
+                stats.dump_stats(str(path))
+                written.append(path)
+        import typer
+        for path in written:
+            typer.echo(f"🔬 Profil écrit : {path}")
+        return written
+
+
+_profiler = StageProfiler(PROFILE_STAGES.split(","))
+
+
+def configure_profiling(stages, backend: str = PROFILER, directory=PROFILE_DIR) -> StageProfiler:
+    global _profiler
+    _profiler = StageProfiler(stages, backend, directory)
+    return _profiler
+
+
+def profile(stage: str):
+    # Sans effet (hors un test d'appartenance) pour une étape non profilée
+    return _profiler(stage)
+
+
+def dump_profiles() -> list:
+    return _profiler.dump()
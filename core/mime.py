@@ -0,0 +1,197 @@
+import re
+import time
+import codecs
+import base64
+import quopri
+import binascii
+from html import unescape
+from html.parser import HTMLParser
+
+_TOKEN_RE = re.compile(rb'\s*(?:(\()|(\))|"((?:[^"\\]|\\.)*)"|([^\s()"]+))')
+
+
+def parse_sexp(data: bytes, start: int = 0):
+    stack = [[]]
+    pos = start
+    while pos < len(data):
+        match = _TOKEN_RE.match(data, pos)
+        if not match:
+            break
+        pos = match.end()
+        opening, closing, quoted, atom = match.groups()
+        if opening:
+            stack.append([])
+        elif closing:
+            if len(stack) == 1:
+                break
+            item = stack.pop()
+            stack[-1].append(item)
+            if len(stack) == 1:
+                break
+        elif quoted is not None:
+            stack[-1].append(re.sub(rb"\\(.)", rb"\1", quoted).decode("utf-8", errors="replace"))
+        else:
+            text = atom.decode("utf-8", errors="replace")
+            stack[-1].append(None if text.upper() == "NIL" else text)
+    return stack[0][0] if stack[0] else None
+
+
+def parse_bodystructure(meta: bytes):
+    idx = meta.find(b"BODYSTRUCTURE (")
+    if idx == -1:
+        return None
+    try:
+        return parse_sexp(meta, idx + len(b"BODYSTRUCTURE "))
+    except Exception:
+        return None
+
+
+def _params(value) -> dict:
+    if not isinstance(value, list):
+        return {}
+    return {str(k).lower(): v for k, v in zip(value[::2], value[1::2])}
+
+
+def _is_attachment(part: list) -> bool:
+    # disposition : index 9 pour text/* (après lines et md5), 8 pour les autres types
+    index = 9 if str(part[0]).lower() == "text" else 8
+    disposition = part[index] if len(part) > index else None
+    return isinstance(disposition, list) and bool(disposition) and str(disposition[0]).lower() == "attachment"
+
+
+def _walk(structure, path: list):
+    if not isinstance(structure, list) or not structure:
+        return
+    if isinstance(structure[0], list):
+        # Multipart : les sous-parties sont les listes en tête, avant le subtype et les extensions
+        for i, child in enumerate(structure):
+            if not isinstance(child, list):
+                break
+            yield from _walk(child, path + [str(i + 1)])
+        return
+    yield path, structure
+
+
+# (section, subtype, encoding, charset, size) de la partie texte à récupérer, text/plain en priorité
+def find_text_part(structure):
+    if not isinstance(structure, list):
+        return None
+
+    candidates = {}
+    for path, part in _walk(structure, []):
+        if len(part) < 6 or str(part[0]).lower() != "text" or _is_attachment(part):
+            continue
+        subtype = str(part[1]).lower()
+        if subtype in ("plain", "html") and subtype not in candidates:
+            section = ".".join(path) if path else "TEXT"
+            encoding = str(part[5] or "7bit").lower()
+            charset = _params(part[2]).get("charset") or "utf-8"
+            size = int(part[6]) if len(part) > 6 and str(part[6]).isdigit() else None
+            candidates[subtype] = (section, subtype, encoding, charset, size)
+
+    return candidates.get("plain") or candidates.get("html")
+
+
+_B64_JUNK_RE = re.compile(rb"[^A-Za-z0-9+/]")
+
+
+def _b64decode(payload: bytes) -> bytes:
+    # Tolérant aux retours ligne, au padding manquant et aux corps tronqués
+    data = _B64_JUNK_RE.sub(b"", payload)
+    data = data[:len(data) - len(data) % 4] if len(data) % 4 == 1 else data + b"=" * (-len(data) % 4)
+    try:
+        return binascii.a2b_base64(data)
+    except binascii.Error:
+        return payload
+
+
+def decode_part(payload: bytes, encoding: str, charset: str) -> str:
+    encoding = (encoding or "7bit").lower()
+    if encoding == "base64":
+        payload = _b64decode(payload)
+    elif encoding == "quoted-printable":
+        payload = quopri.decodestring(payload)
+
+    try:
+        codecs.lookup(charset)
+    except LookupError:
+        charset = "utf-8"
+    return payload.decode(charset, errors="replace")
+
+
+def guess_decode(payload: bytes) -> str:
+    # Structure inconnue : ancien décodage par essais successifs
+    try:
+        return base64.b64decode(payload).decode("utf-8")
+    except Exception:
+        try:
+            return quopri.decodestring(payload).decode("utf-8", errors="replace")
+        except Exception:
+            return payload.decode("utf-8", errors="replace")
+
+
+class _TextExtractor(HTMLParser):
+    SKIP = {"script", "style", "head", "title", "template"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.chunks = []
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self._skip += 1
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP and self._skip:
+            self._skip -= 1
+
+    def handle_data(self, data):
+        if not self._skip:
+            data = data.strip()
+            if data:
+                self.chunks.append(data)
+
+
+def html_to_text(html: str) -> str:
+    if "<" not in html:
+        return unescape(html).strip()
+    parser = _TextExtractor()
+    parser.feed(html)
+    parser.close()
+    return " ".join(parser.chunks)
+
+
+_SKIP_PREFIXES = ("content-", "mime-version", "x-", "boundary=", "--", "begin", "encoded", "calendar", "charset")
+
+
+def clean_body(raw_body: str) -> str:
+    clean = []
+    skip = False
+    for line in raw_body.splitlines():
+        l = line.lower()
+        if l.startswith(_SKIP_PREFIXES):
+            skip = True
+        elif skip and line.strip() == "":
+            skip = False
+        elif not skip:
+            clean.append(line)
+    return "\n".join(clean).strip()
+
+
+def render_body(payload: bytes, part) -> tuple:
+    # Décodage, HTML → texte et nettoyage d'un corps, sans état : exécutable dans un processus du pool.
+    # Renvoie (texte, sous-type, durées décodage / HTML / nettoyage) : les métriques restent dans le processus parent
+    start = time.perf_counter()
+    if part is None:
+        subtype, text = "inconnu", guess_decode(payload)
+    else:
+        _, subtype, encoding, charset, _ = part
+        text = decode_part(payload, encoding, charset)
+    decoded = time.perf_counter()
+    html = subtype in ("html", "inconnu")
+    if html:
+        text = html_to_text(text)
+    converted = time.perf_counter()
+    text = clean_body(text)
+    return text, subtype, (decoded - start, converted - decoded if html else None, time.perf_counter() - converted)
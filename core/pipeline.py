@@ -0,0 +1,340 @@
+import time
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from datetime import datetime, timezone, timedelta
+from email.utils import parsedate_to_datetime
+import typer
+
+from core.imap_client import IMAPClient, IMAP_DECODE_WORKERS
+from core.mail_store import MailStore, MAIL_STORE
+from core.mail_classifier import classify_mail, SEMANTIC_CLASSIFIER
+from core.summary_cache import SummaryCache
+from core import llm_wrapper
+from core.mail import Mail
+from core.reporter import to_mail, write_report
+from core.dedup import group_records, group_fields, group_text
+from core.preprocess import LLM_PREPROCESS, LLM_INPUT_TOKENS, estimate_tokens, prepare, prepare_group
+from core import metrics
+from core.metrics import profile
+
+_DONE = object()
+
+STAGE_SECONDS = metrics.counter("pipeline_stage_seconds_total", "Temps cumulé par étape du pipeline", ("stage",))
+STAGE_ITEMS = metrics.counter("pipeline_stage_items_total", "Mails traités par étape du pipeline", ("stage",))
+
+
+class StageTimer:
+    def __init__(self):
+        self.seconds = {}
+        self.counts = {}
+        # Tokens estimés des textes à résumer, avant et après prétraitement
+        self.tokens = [0, 0]
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float, count: int = 1):
+        with self._lock:
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+            self.counts[stage] = self.counts.get(stage, 0) + count
+        STAGE_SECONDS.inc(seconds, stage=stage)
+        STAGE_ITEMS.inc(count, stage=stage)
+
+    def add_tokens(self, before: int, after: int):
+        with self._lock:
+            self.tokens[0] += before
+            self.tokens[1] += after
+
+    def report(self, wall: float):
+        typer.echo(f"⏱️ {'étape':<13} {'mails':>6} {'secondes':>9}")
+        for stage, seconds in self.seconds.items():
+            typer.echo(f"   {stage:<13} {self.counts[stage]:>6} {seconds:>9.2f}")
+        typer.echo(f"   {'total':<13} {'':>6} {wall:>9.2f}")
+        before, after = self.tokens
+        if before:
+            typer.echo(f"✂️ Prétraitement : {before - after} tokens estimés en moins ({1 - after / before:.0%}), {after} envoyés")
+
+
+def _in_window(mail: dict, cutoff: float) -> bool:
+    # Même filtre que MailStore.recent : date du mail lisible et dans la fenêtre
+    try:
+        return parsedate_to_datetime(mail["date"]).timestamp() >= cutoff
+    except Exception:
+        return False
+
+
+def fetch_mails(client: IMAPClient, label: str, hours: int, limit: int, store: bool = True, store_path: Path = Path(MAIL_STORE)):
+    if not store:
+        yield from client.iter_recent(limit=limit, hours=hours, folder=label)
+        return
+    # Les nouveaux mails passent au fil des lots de la sync : plus récents que tout le store, ils ouvrent le rapport.
+    # Le store complète ensuite jusqu'à limit, dans le même ordre que MailStore.recent (UID décroissant)
+    mail_store = MailStore(store_path)
+    cutoff = (datetime.now(timezone.utc) - timedelta(hours=hours)).timestamp()
+    sent = set()
+    try:
+        for mail in client.iter_sync(mail_store, folder=label, hours=hours):
+            # La sync continue au-delà de limit : le store doit rester complet
+            if len(sent) < limit and _in_window(mail, cutoff):
+                sent.add(mail["uid"])
+                yield mail
+        if len(sent) < limit:
+            yield from (mail for mail in mail_store.recent(label, hours=hours, limit=limit) if mail["uid"] not in sent)
+    finally:
+        mail_store.close()
+
+
+def fetch_stage(mails, timer: StageTimer, maxsize: int = 100):
+    # L'IMAP tourne dans son propre thread : les étapes suivantes consomment au fil de l'eau
+    buffer = queue.Queue(maxsize=maxsize)
+    errors = []
+
+    def produce():
+        try:
+            start = time.perf_counter()
+            # Le fetch tourne dans ce thread : profilé d'un bloc, attente de la queue comprise
+            with profile("fetch"):
+                for mail in mails:
+                    timer.add("fetch", time.perf_counter() - start)
+                    buffer.put(mail)
+                    start = time.perf_counter()
+        except Exception as e:
+            errors.append(e)
+        finally:
+            buffer.put(_DONE)
+
+    threading.Thread(target=produce, daemon=True).start()
+    while True:
+        mail = buffer.get()
+        if mail is _DONE:
+            break
+        yield mail
+    if errors:
+        raise errors[0]
+
+
+def normalize_stage(mails, timer: StageTimer):
+    for mail in mails:
+        start = time.perf_counter()
+        with profile("normalize"):
+            record = to_mail(mail)
+        timer.add("normalize", time.perf_counter() - start)
+        yield record
+
+
+def classify_stage(records, timer: StageTimer, semantic: bool = SEMANTIC_CLASSIFIER):
+    for record in records:
+        start = time.perf_counter()
+        with profile("classify"):
+            classify_mail(record, semantic=semantic)
+        timer.add("classify", time.perf_counter() - start)
+        yield record
+
+
+def summarize_stage(records, timer: StageTimer, concurrency: int = llm_wrapper.LLM_CONCURRENCY, use_cache: bool = True, batch_tokens: int = llm_wrapper.LLM_BATCH_TOKENS, budget: llm_wrapper.Budget = None, fallback: bool = llm_wrapper.LLM_EXTRACTIVE_FALLBACK, preprocess: bool = LLM_PREPROCESS, input_tokens: int = LLM_INPUT_TOKENS):
+    concurrency = max(1, concurrency)
+    llm_wrapper.get_client(concurrency)
+
+    def timed_summaries(texts):
+        start = time.perf_counter()
+        with profile("summarize"):
+            summaries = llm_wrapper.summarize_job(texts, use_cache=use_cache, budget=budget)
+        timer.add("summarize", time.perf_counter() - start, len(texts))
+        return summaries
+
+    def new_batch():
+        return {"texts": [], "tokens": 0, "future": None}
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        pending = deque()
+        in_flight = {}
+        batch = new_batch()
+
+        def flush():
+            nonlocal batch
+            if batch["texts"]:
+                batch["future"] = pool.submit(timed_summaries, batch["texts"])
+                batch = new_batch()
+
+        for record in records:
+            job = None
+            if not record.summary:
+                # Corps décodé une fois ici, le temps de l'envoyer au LLM
+                body = record.body
+                if preprocess:
+                    start = time.perf_counter()
+                    text = prepare(body, input_tokens)
+                    timer.add("prétraitement", time.perf_counter() - start)
+                    timer.add_tokens(estimate_tokens(body), estimate_tokens(text))
+                    body = text
+                # Corps identiques dans le même run : un seul appel, résultat partagé
+                key = SummaryCache.make_key(body, llm_wrapper.PROMPT_TEMPLATE, llm_wrapper.OLLAMA_MODEL)
+                job = in_flight.get(key)
+                if job is None:
+                    if budget and not budget.reserve(body):
+                        job = _skipped()
+                    elif llm_wrapper.batchable(body, batch_tokens):
+                        # Mails courts regroupés dans un même prompt jusqu'au budget de tokens
+                        tokens = estimate_tokens(body)
+                        if batch["texts"] and batch["tokens"] + tokens > batch_tokens:
+                            flush()
+                        job = (batch, len(batch["texts"]))
+                        batch["texts"].append(body)
+                        batch["tokens"] += tokens
+                    else:
+                        job = ({"future": pool.submit(timed_summaries, [body])}, 0)
+                    in_flight[key] = job
+            pending.append((record, job))
+
+            # Sortie dans l'ordre d'entrée, sans laisser filer plus de 2x la concurrence en mémoire
+            # (plus le batch en cours de remplissage, lui-même borné par son budget de tokens)
+            while pending and (len(pending) > 2 * concurrency + len(batch["texts"]) or _ready(pending[0][1])):
+                if pending[0][1] and pending[0][1][0]["future"] is None:
+                    flush()
+                yield _finish(*pending.popleft(), fallback)
+        flush()
+        while pending:
+            yield _finish(*pending.popleft(), fallback)
+
+
+def dedup_stage(stream, timer: StageTimer) -> tuple:
+    # Seule étape bloquante : un groupe (doublons ou fil) n'est connu qu'une fois tous les mails reçus.
+    # Les mails sont hachés au fil de l'eau, pendant le fetch ; seule cette étape les garde tous en mémoire
+    records = []
+    seconds = 0.0
+    start = None
+
+    def collect():
+        nonlocal seconds, start
+        for record in stream:
+            records.append(record)
+            # Chronométré et profilé entre deux mails seulement : l'attente du fetch n'est pas du regroupement
+            start = time.perf_counter()
+            with profile("dedup"):
+                yield record
+            seconds += time.perf_counter() - start
+        start = time.perf_counter()
+
+    groups = group_records(collect())
+    for group in groups:
+        fields = group_fields(group)
+        for i in group["members"]:
+            records[i].update(fields)
+    timer.add("dedup", seconds + time.perf_counter() - start, len(records))
+    return records, groups
+
+
+def summarize_groups(records: list, groups: list, timer: StageTimer, concurrency: int = llm_wrapper.LLM_CONCURRENCY, use_cache: bool = True, batch_tokens: int = llm_wrapper.LLM_BATCH_TOKENS, budget: llm_wrapper.Budget = None, fallback: bool = llm_wrapper.LLM_EXTRACTIVE_FALLBACK, preprocess: bool = LLM_PREPROCESS, input_tokens: int = LLM_INPUT_TOKENS):
+    # Un seul résumé par groupe, recopié sur chacun de ses mails
+    todo = [group for group in groups if any(not records[i].summary for i in group["members"])]
+    # Alertes et mails récents d'abord : ce sont eux qui passent si le budget ne suffit pas pour tout
+    todo.sort(key=lambda group: max(llm_wrapper.priority(records[i]) for i in group["members"]), reverse=True)
+
+    def group_prompt(group) -> Mail:
+        bodies = [records[i].body for i in group["members"]]
+        if not preprocess:
+            return Mail.from_record({"body": group_text(bodies)})
+        # Prétraitement message par message, avant l'assemblage du fil : summarize_stage reçoit le texte final
+        start = time.perf_counter()
+        text, before, after = prepare_group(bodies, input_tokens)
+        timer.add("prétraitement", time.perf_counter() - start, len(bodies))
+        timer.add_tokens(before, after)
+        return Mail.from_record({"body": text})
+
+    texts = (group_prompt(group) for group in todo)
+    results = summarize_stage(texts, timer, concurrency=concurrency, use_cache=use_cache, batch_tokens=batch_tokens, budget=budget, fallback=fallback, preprocess=False)
+    for group, result in zip(todo, results):
+        for i in group["members"]:
+            # Échec ou hors budget : les mails du groupe déjà résumés gardent leur résumé
+            if records[i].summary and (result.summary is None or result.summary_pending):
+                continue
+            records[i].summary = result.summary
+            records[i].summary_pending = result.summary_pending
+
+
+def _skipped():
+    # Job déjà terminé : mail refusé par le budget de tokens, sans passer par le pool
+    future = Future()
+    future.set_result([llm_wrapper.SKIPPED])
+    return ({"future": future}, 0)
+
+
+def _ready(job) -> bool:
+    return job is None or (job[0]["future"] is not None and job[0]["future"].done())
+
+
+def _finish(record: Mail, job, fallback: bool = llm_wrapper.LLM_EXTRACTIVE_FALLBACK):
+    if job is not None:
+        holder, index = job
+        summary = holder["future"].result()[index]
+        if summary is llm_wrapper.SKIPPED:
+            record.update(llm_wrapper.pending_fields(record.body, fallback))
+        else:
+            record.summary = summary
+    return record
+
+
+def run_pipeline(
+    label: str = "INBOX",
+    hours: int = 24,
+    limit: int = 30,
+    store: bool = True,
+    store_path: Path = Path(MAIL_STORE),
+    classify: bool = True,
+    summarize: bool = True,
+    concurrency: int = llm_wrapper.LLM_CONCURRENCY,
+    use_cache: bool = True,
+    client: IMAPClient = None,
+    batch_tokens: int = llm_wrapper.LLM_BATCH_TOKENS,
+    dedup: bool = True,
+    budget_seconds: float = llm_wrapper.LLM_BUDGET_SECONDS,
+    budget_tokens: int = llm_wrapper.LLM_BUDGET_TOKENS,
+    fallback: bool = llm_wrapper.LLM_EXTRACTIVE_FALLBACK,
+    semantic: bool = SEMANTIC_CLASSIFIER,
+    decode_workers: int = IMAP_DECODE_WORKERS,
+    preprocess: bool = LLM_PREPROCESS,
+    input_tokens: int = LLM_INPUT_TOKENS,
+):
+    timer = StageTimer()
+    wall_start = time.perf_counter()
+
+    if client is None:
+        client = IMAPClient(decode_workers=decode_workers)
+        client.connect()
+
+    stream = fetch_stage(fetch_mails(client, label, hours, limit, store, store_path), timer)
+    stream = normalize_stage(stream, timer)
+    if classify:
+        stream = classify_stage(stream, timer, semantic=semantic)
+    if summarize and not dedup:
+        # Sans regroupement, les mails sont résumés dans l'ordre d'arrivée : le budget s'applique sans tri par priorité
+        budget = llm_wrapper.Budget(budget_seconds, budget_tokens)
+        stream = summarize_stage(stream, timer, concurrency=concurrency, use_cache=use_cache, batch_tokens=batch_tokens, budget=budget, fallback=fallback,
+                                 preprocess=preprocess, input_tokens=input_tokens)
+
+    if dedup:
+        records, groups = dedup_stage(stream, timer)
+    else:
+        records = list(stream)
+    if not records:
+        typer.echo("⚠️ Aucun mail récupéré.")
+        return None
+
+    if dedup:
+        typer.echo(f"🔁 {len(records)} mails regroupés en {len(groups)} groupe(s) (doublons et fils de discussion)")
+        if summarize:
+            budget = llm_wrapper.Budget(budget_seconds, budget_tokens)
+            summarize_groups(records, groups, timer, concurrency=concurrency, use_cache=use_cache, batch_tokens=batch_tokens, budget=budget, fallback=fallback,
+                             preprocess=preprocess, input_tokens=input_tokens)
+
+    if summarize and budget.skipped:
+        typer.echo(f"⏳ {budget.skipped} résumé(s) hors budget, marqué(s) summary_pending pour le prochain run")
+
+    start = time.perf_counter()
+    with profile("render"):
+        json_file = write_report(records, label, with_summary=classify or summarize)
+    timer.add("render", time.perf_counter() - start, len(records))
+
+    timer.report(time.perf_counter() - wall_start)
+    return json_file
@@ -0,0 +1,101 @@
+import os
+import sys
+import json
+from pathlib import Path
+from datetime import datetime, timezone
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from core.report_store import REPORT_DIR, report_base_name, find_report
+
+# Pré-contrôle de "run-all --if-changed", lancé par main.py avant de charger le CLI :
+# ni typer, ni parsing des mails, ni client LLM tant qu'on ne sait pas qu'il y a du nouveau
+
+# Dernier run-all complet par dossier et options : UIDNEXT traité et rapport produit.
+# dump, watch et dump-labels avancent aussi le store, lui ne bouge qu'avec run-all
+RUN_MARKERS = os.getenv("RUN_MARKERS", str(REPORT_DIR / "run_markers.json"))
+# Valeurs par défaut de run-all (core/cli.py) pour les options absentes de la ligne de commande
+RUN_DEFAULTS = {"--label": "INBOX", "--hours": "24", "--limit": "30"}
+
+
+def run_key(label: str, hours: int, limit: int) -> str:
+    # Même dossier mais autre fenêtre ou autre limite : un autre rapport, donc un autre marqueur
+    return f"{label}|hours={hours}|limit={limit}"
+
+
+def _load_markers(path) -> dict:
+    try:
+        return json.loads(Path(path).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def save_marker(label: str, hours: int, limit: int, uidvalidity: int, uidnext: int, report: Path, path=RUN_MARKERS):
+    # Appelé par run-all seulement, une fois le rapport écrit
+    if not path:
+        return
+    markers = _load_markers(path)
+    markers[run_key(label, hours, limit)] = {
+        "uidvalidity": uidvalidity,
+        "uidnext": uidnext,
+        "report": str(report),
+        # Rapport réécrit depuis (dump, autre run-all) : le marqueur ne le décrit plus
+        "report_mtime": Path(report).stat().st_mtime_ns,
+        "at": datetime.now(timezone.utc).isoformat(),
+    }
+    path = Path(path)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(json.dumps(markers, ensure_ascii=False, indent=2), encoding="utf-8")
+        tmp.replace(path)
+    except OSError as e:
+        print(f"⚠️ Marqueur de run-all non écrit ({path}) : {e}")
+
+
+def folder_unchanged(client, marker: dict, folder: str) -> bool:
+    status = client.status(folder)
+    if not status.get("uidnext") or status.get("uidvalidity") != marker["uidvalidity"]:
+        return False
+    return status["uidnext"] <= marker["uidnext"]
+
+
+def _option(argv: list, name: str, default: str = None) -> str:
+    for i, arg in enumerate(argv):
+        if arg == name and i + 1 < len(argv):
+            return argv[i + 1]
+        if arg.startswith(f"{name}="):
+            return arg.split("=", 1)[1]
+    return default
+
+
+def skip_run(argv: list) -> bool:
+    # True seulement si le dernier run-all avec les mêmes options a traité tout ce que le dossier contient
+    # et que son rapport du jour n'a pas été réécrit depuis
+    if not argv or argv[0] != "run-all" or "--if-changed" not in argv or "--help" in argv:
+        return False
+    label = _option(argv, "--label", RUN_DEFAULTS["--label"])
+    try:
+        hours = int(_option(argv, "--hours", RUN_DEFAULTS["--hours"]))
+        limit = int(_option(argv, "--limit", RUN_DEFAULTS["--limit"]))
+    except ValueError:
+        # Valeur invalide : typer donnera l'erreur
+        return False
+    marker = _load_markers(RUN_MARKERS).get(run_key(label, hours, limit)) if RUN_MARKERS else None
+    if not marker:
+        return False
+    report = find_report(REPORT_DIR / report_base_name(label))
+    if str(report) != marker["report"] or not report.exists() or report.stat().st_mtime_ns != marker["report_mtime"]:
+        return False
+
+    from core.imap_client import IMAPClient
+    client = IMAPClient()
+    try:
+        unchanged = folder_unchanged(client, marker, label)
+    except Exception as e:
+        print(f"⚠️ Pré-contrôle STATUS impossible ({e}) : pipeline complet")
+        unchanged = False
+    finally:
+        client.close()
+    if unchanged:
+        print(f"💤 {label} : aucun nouveau mail depuis le dernier run-all, rapport inchangé ({report})")
+    return unchanged
@@ -0,0 +1,132 @@
+import os
+import re
+import time
+
+from core.dedup import distinct_bodies, join_thread
+from core import metrics
+
+# Prétraitement des corps avant résumé : historique cité, signatures, mentions légales et URLs retirés
+LLM_PREPROCESS = os.getenv("LLM_PREPROCESS", "1") == "1"
+# Budget (tokens estimés) du texte d'un mail dans le prompt, 0 = pas de troncature.
+# Le num_ctx par défaut d'Ollama est de 2048 tokens : au-delà, le début du prompt est perdu sans prévenir
+LLM_INPUT_TOKENS = int(os.getenv("LLM_INPUT_TOKENS", "1024"))
+
+# "Le lun. 7 juil. 2025 à 10:02, Jean <jean@x.fr> a écrit :" ou "On Mon, Jul 7, 2025, Jean wrote:", parfois sur deux lignes
+_ATTRIBUTION_RE = re.compile(r"^(le|on)\s.{0,200}?\s(a\s+écrit|wrote)\s*:?$", re.IGNORECASE)
+# En-têtes d'un message transféré en réponse (Outlook, Thunderbird) : tout ce qui suit est de l'historique
+_HISTORY_RE = re.compile(r"^(-{2,}\s*(original message|message d'origine|message d’origine)\s*-{2,}|_{10,})$", re.IGNORECASE)
+_OUTLOOK_FROM_RE = re.compile(r"^(de|from)\s?:\s.+", re.IGNORECASE)
+_OUTLOOK_SENT_RE = re.compile(r"^(envoyé|sent|date)\s?:\s.+", re.IGNORECASE)
+_SIGNATURE_RE = re.compile(r"^--\s?$")
+_CLOSING_RE = re.compile(
+    r"^((bien|très) )?(cordialement|sincèrement|amicalement)\b|^bien à vous\b|^((best|kind|warm) )?regards\b"
+    r"|^(salutations|cheers|bisous|amitiés)\b", re.IGNORECASE)
+_SENT_FROM_RE = re.compile(r"^(envoyé de mon|sent from my|télécharger outlook|get outlook for)\b", re.IGNORECASE)
+_DISCLAIMER_RE = re.compile(
+    r"confidenti|intended recipient|destinataires? exclusi|(reçu|received) (ce|this) (message|mail|courriel|e-mail|email)"
+    r"|par erreur|in error|avant d.imprimer|before printing|se désabonner|désinscri|unsubscribe|you are receiving this"
+    r"|vous recevez ce|manage (your )?preferences|gérer vos préférences", re.IGNORECASE)
+_URL_RE = re.compile(r"<?(?:https?://|www\.)(?:www\.)?([^\s/<>?#:]+)[^\s<>]*>?", re.IGNORECASE)
+_SPACES_RE = re.compile(r"[ \t\u00a0]+")
+_SENTENCE_END_RE = re.compile(r"[.!?…](?=\s)")
+# Lignes laissées après une formule de politesse : nom, fonction, téléphone. Au-delà, la suite est du contenu
+_CLOSING_TAIL_LINES = 6
+# Une mention légale est un paragraphe court ; un long paragraphe qui en cite une reste du contenu
+_DISCLAIMER_MAX_CHARS = 1200
+_TRUNCATED = " […]"
+# Part minimale d'un message dans le prompt d'un fil : les plus anciens sont laissés de côté plutôt que réduits à rien
+_THREAD_MIN_TOKENS = 64
+
+PREPROCESS_SECONDS = metrics.histogram("llm_preprocess_seconds", "Prétraitement d'un corps avant résumé")
+PREPROCESS_TOKENS = metrics.counter("llm_preprocess_tokens_total", "Tokens estimés des corps avant et après prétraitement", ("stage",))
+
+
+def estimate_tokens(text: str) -> int:
+    # Approximation sans tokenizer : ~4 caractères par token
+    return len(text) // 4 + 1
+
+
+def strip_noise(text: str) -> str:
+    lines = [_SPACES_RE.sub(" ", line).strip() for line in text.splitlines()]
+    kept = []
+    for i, line in enumerate(lines):
+        if line.startswith(">") or _SENT_FROM_RE.match(line):
+            continue
+        # Formule d'attribution (éventuellement coupée en deux lignes) ou en-tête de message d'origine : la suite est
+        # de l'historique. En tête du mail (réponse écrite sous la citation), seule la ligne est retirée
+        history = (
+            _ATTRIBUTION_RE.match(line) or _HISTORY_RE.match(line)
+            or (i + 1 < len(lines) and line[:3].lower() in ("le ", "on ") and _ATTRIBUTION_RE.match(f"{line} {lines[i + 1]}"))
+            or (i + 1 < len(lines) and _OUTLOOK_FROM_RE.match(line) and _OUTLOOK_SENT_RE.match(lines[i + 1]))
+        )
+        if history and not any(kept):
+            continue
+        if history or _SIGNATURE_RE.match(line):
+            break
+        kept.append(_URL_RE.sub(lambda match: match.group(1), line))
+
+    # Formule de politesse suivie de quelques lignes (nom, fonction, téléphone) : fin du message utile
+    for i, line in enumerate(kept):
+        if len(line) < 40 and _CLOSING_RE.match(line) and sum(1 for rest in kept[i + 1:] if rest) <= _CLOSING_TAIL_LINES:
+            kept = kept[:i]
+            break
+
+    paragraphs = []
+    for paragraph in "\n".join(kept).split("\n\n"):
+        paragraph = paragraph.strip("\n")
+        if not paragraph.strip():
+            continue
+        # Jamais le premier paragraphe : un mail qui commence par "Confidentiel" en parle, il n'en est pas le pied de page
+        if paragraphs and len(paragraph) <= _DISCLAIMER_MAX_CHARS and _DISCLAIMER_RE.search(paragraph):
+            continue
+        paragraphs.append(paragraph)
+    return "\n\n".join(paragraphs)
+
+
+def truncate(text: str, max_tokens: int = LLM_INPUT_TOKENS) -> str:
+    # Paragraphes entiers tant qu'ils tiennent, puis le suivant coupé en fin de phrase (à défaut, de mot)
+    if max_tokens <= 0 or estimate_tokens(text) <= max_tokens:
+        return text
+    # Budget plus petit que la marque elle-même : la marque seule
+    budget = max(0, max_tokens - estimate_tokens(_TRUNCATED)) * 4
+    kept, used = [], 0
+    for paragraph in text.split("\n\n"):
+        room = budget - used - 2 * bool(kept)
+        if len(paragraph) <= room:
+            kept.append(paragraph)
+            used += len(paragraph) + 2 * (len(kept) > 1)
+            continue
+        head = paragraph[:room]
+        ends = [match.end() for match in _SENTENCE_END_RE.finditer(head)]
+        if ends and ends[-1] >= room // 2:
+            head = head[:ends[-1]]
+        elif " " in head:
+            head = head.rsplit(" ", 1)[0]
+        if head.strip():
+            kept.append(head.rstrip())
+        break
+    return "\n\n".join(kept) + _TRUNCATED
+
+
+def prepare(text: str, max_tokens: int = LLM_INPUT_TOKENS) -> str:
+    # Texte envoyé au LLM ; le corps du rapport, lui, reste intact
+    start = time.perf_counter()
+    prepared = truncate(strip_noise(text) or text.strip(), max_tokens)
+    PREPROCESS_SECONDS.observe(time.perf_counter() - start)
+    PREPROCESS_TOKENS.inc(estimate_tokens(text), stage="avant")
+    PREPROCESS_TOKENS.inc(estimate_tokens(prepared), stage="après")
+    return prepared
+
+
+def prepare_group(bodies: list, max_tokens: int = LLM_INPUT_TOKENS) -> tuple:
+    # Doublons ou fil : (texte du prompt, tokens estimés sans et avec prétraitement).
+    # Le budget est partagé entre les messages distincts qui vont dans le prompt, pas entre tous les membres :
+    # 400 doublons n'envoient qu'un corps, qui a droit au budget entier
+    distinct = distinct_bodies(bodies)
+    raw = join_thread(distinct)
+    if max_tokens > 0 and len(distinct) > 1:
+        # Fil trop long pour donner à chacun sa part minimale : les messages les plus récents d'abord
+        distinct = distinct[-max(1, max_tokens // _THREAD_MIN_TOKENS):]
+    share = max_tokens // len(distinct) if max_tokens > 0 else 0
+    text = join_thread([prepare(body, share) for body in distinct])
+    return text, estimate_tokens(raw), estimate_tokens(text)
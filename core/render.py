@@ -0,0 +1,87 @@
+import os
+import time
+import threading
+from contextlib import nullcontext
+from datetime import datetime
+from pathlib import Path
+
+from core.dedup import group_label
+from core import metrics
+
+# Gabarits Jinja2 des Markdown (rapport brut et résumé), compilés une fois par processus
+TEMPLATE_DIR = os.getenv("TEMPLATE_DIR", str(Path(__file__).resolve().parents[1] / "templates"))
+# Mails rendus par appel de gabarit : amortit le coût d'un appel de macro sans garder tout le rapport en mémoire
+RENDER_CHUNK = int(os.getenv("RENDER_CHUNK", "256"))
+
+MARKDOWN_SECONDS = metrics.histogram("markdown_write_seconds", "Rendu et écriture d'un fichier Markdown", ("kind",))
+
+_templates = None
+_templates_lock = threading.Lock()
+
+
+def get_templates() -> tuple:
+    # (rapport, résumé) : les macros header/entries des deux gabarits, prêtes à appeler
+    global _templates
+    with _templates_lock:
+        if _templates is None:
+            from jinja2 import Environment, FileSystemLoader, StrictUndefined
+            env = Environment(loader=FileSystemLoader(TEMPLATE_DIR), autoescape=False, undefined=StrictUndefined)
+            _templates = tuple(env.get_template(name).module for name in ("report.md.j2", "summary.md.j2"))
+        return _templates
+
+
+def summary_day() -> str:
+    return datetime.now().strftime('%d %B %Y')
+
+
+def entry(mail) -> tuple:
+    # Champs déjà mis en forme : les gabarits ne font plus que les écrire, sans accès d'attribut,
+    # appel de méthode ni filtre Jinja par mail (le gros du coût de rendu sur 100k mails)
+    return (
+        mail.short_date, mail.from_name, mail.from_email, mail.subject,
+        group_label(mail) if mail.group_size else None,
+        mail.preview(300).replace("\\n", " "),
+        ", ".join(mail.tags or ()), mail.summary, mail.summary_pending,
+    )
+
+
+def render_stream(records, md_file: Path = None, summary_file: Path = None, chunk_size: int = RENDER_CHUNK):
+    # Un seul passage : chaque mail est rendu dans les Markdown demandés au moment où il repasse
+    # (vers le JSON Lines en général)
+    report, summary = get_templates()
+    spent = {"rapport": 0.0, "résumé": 0.0}
+    with (md_file.open("w", encoding="utf-8") if md_file else nullcontext()) as md, \
+            (summary_file.open("w", encoding="utf-8") if summary_file else nullcontext()) as sm:
+
+        def flush(items: list):
+            start = time.perf_counter()
+            if md:
+                md.write(report.entries(items))
+            middle = time.perf_counter()
+            if sm:
+                sm.write(summary.entries(items))
+            spent["rapport"] += middle - start
+            spent["résumé"] += time.perf_counter() - middle
+
+        if md:
+            md.write(report.header())
+        if sm:
+            sm.write(summary.header(summary_day()))
+        items = []
+        for i, mail in enumerate(records):
+            # Groupe de doublons ou fil de discussion : une seule entrée, celle du mail le plus récent
+            if mail.group is None or mail.group == i:
+                items.append(entry(mail))
+                if len(items) >= chunk_size:
+                    flush(items)
+                    items = []
+            yield mail
+        flush(items)
+    for kind, path in (("rapport", md_file), ("résumé", summary_file)):
+        if path:
+            MARKDOWN_SECONDS.observe(spent[kind], kind=kind)
+
+
+def render_markdown(records, md_file: Path = None, summary_file: Path = None) -> int:
+    # Markdown seuls, sans JSON (rapport relu depuis le disque)
+    return sum(1 for _ in render_stream(records, md_file, summary_file))
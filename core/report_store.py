@@ -0,0 +1,276 @@
+import os
+import re
+import gzip
+import json
+from array import array
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+
+from core.mail import Mail
+from core import metrics
+
+REPORT_DIR = Path("reports")
+INDEX_DIR = ".index"
+# Format des nouveaux rapports : "jsonl" ou "jsonl.gz" (le JSON indenté historique reste lisible)
+REPORT_FORMAT = os.getenv("REPORT_FORMAT", "jsonl")
+REPORT_SUFFIXES = (".jsonl", ".jsonl.gz", ".json")
+# Colonnes mises à jour par les étapes suivantes, stockées à part pour ne jamais réécrire les corps
+UPDATABLE_COLUMNS = ("tags", "score", "summary", "summary_pending", "group", "group_size", "group_kind")
+
+_SEPARATOR_RE = re.compile(r"[\s,\[]*")
+
+WRITE_SECONDS = metrics.histogram("report_write_seconds", "Écriture d'un rapport ou de ses colonnes", ("mode",))
+RECORDS_WRITTEN = metrics.counter("report_records_written_total", "Lignes écrites dans les rapports et fichiers de colonnes", ("mode",))
+
+
+def iter_json_array(f, chunk_size: int = 1 << 20):
+    # Lecture d'un tableau JSON objet par objet, sans charger le fichier entier
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = "", 0, False
+    while True:
+        pos = _SEPARATOR_RE.match(buffer, pos).end()
+        if pos < len(buffer) and buffer[pos] == "]":
+            return
+        try:
+            if pos >= len(buffer):
+                raise ValueError("buffer vide")
+            item, end = decoder.raw_decode(buffer, pos)
+        except ValueError:
+            if eof:
+                if buffer[pos:].strip():
+                    raise
+                return
+            # Objet incomplet : on relit au moins autant que le buffer, pour rester linéaire sur les gros mails
+            chunk = f.read(max(chunk_size, len(buffer) - pos))
+            eof = not chunk
+            buffer, pos = buffer[pos:] + chunk, 0
+            continue
+        yield item
+        pos = end
+
+
+def slugify(label: str) -> str:
+    return label.replace("Labels/", "").replace("/", "_").replace(" ", "_")
+
+
+def report_base_name(label: str) -> str:
+    date_str = datetime.now().strftime('%Y-%m-%d')
+    return (
+        f"label_{slugify(label)}_report_{date_str}"
+        if label != "INBOX" else f"report_{date_str}"
+    )
+
+
+def report_stem(path) -> str:
+    name = Path(path).name
+    for suffix in REPORT_SUFFIXES:
+        if name.endswith(suffix):
+            return name[:-len(suffix)]
+    return Path(path).stem
+
+
+def find_report(base: Path) -> Path:
+    # base sans extension : le premier format présent, sinon celui des nouveaux rapports
+    for suffix in REPORT_SUFFIXES:
+        candidate = base.with_name(base.name + suffix)
+        if candidate.exists():
+            return candidate
+    return base.with_name(f"{base.name}.{REPORT_FORMAT}")
+
+
+class Report:
+    # Rapport JSON Lines (.jsonl ou .jsonl.gz) + fichier de colonnes en ajout seul (tags, score, résumé)
+    def __init__(self, path):
+        self.path = Path(path)
+        self.columns_path = self.path.with_name(f"{report_stem(self.path)}.columns.jsonl")
+
+    def _open(self, mode: str):
+        if self.path.name.endswith(".gz"):
+            return gzip.open(self.path, mode + "t", encoding="utf-8", compresslevel=6)
+        return self.path.open(mode, encoding="utf-8")
+
+    def __iter__(self):
+        columns = self.load_columns()
+        with self._open("r") as f:
+            for i, line in enumerate(line for line in f if line.strip()):
+                record = json.loads(line)
+                if i in columns:
+                    record.update(columns[i])
+                yield Mail.from_record(record)
+
+    def __len__(self) -> int:
+        if not self.path.exists():
+            return 0
+        with self._open("r") as f:
+            return sum(1 for line in f if line.strip())
+
+    def write(self, records) -> int:
+        if self.columns_path.exists():
+            self.columns_path.unlink()
+        with WRITE_SECONDS.time(mode="write"), self._open("w") as f:
+            count = self._dump(records, f)
+        RECORDS_WRITTEN.inc(count, mode="write")
+        return count
+
+    def append(self, records) -> int:
+        with WRITE_SECONDS.time(mode="append"), self._open("a") as f:
+            count = self._dump(records, f)
+        RECORDS_WRITTEN.inc(count, mode="append")
+        return count
+
+    @staticmethod
+    def _dump(records, f) -> int:
+        count = 0
+        for record in records:
+            f.write(json.dumps(record.to_record(), ensure_ascii=False) + "\n")
+            count += 1
+        return count
+
+    def load_columns(self) -> dict:
+        columns = {}
+        if self.columns_path.exists():
+            with self.columns_path.open("r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        update = json.loads(line)
+                        columns.setdefault(update.pop("_row"), {}).update(update)
+        return columns
+
+    def update_columns(self, updates) -> int:
+        # updates : (numéro de ligne, {colonne: valeur}) ; la dernière valeur écrite gagne à la lecture
+        count = 0
+        with WRITE_SECONDS.time(mode="columns"), self.columns_path.open("a", encoding="utf-8") as f:
+            for row, values in updates:
+                unknown = set(values) - set(UPDATABLE_COLUMNS)
+                if unknown:
+                    raise ValueError(f"Colonnes non modifiables sans réécrire le rapport : {', '.join(sorted(unknown))}")
+                f.write(json.dumps({"_row": row, **values}, ensure_ascii=False) + "\n")
+                count += 1
+        RECORDS_WRITTEN.inc(count, mode="columns")
+        return count
+
+    def compact(self):
+        # Réintègre les colonnes dans le rapport : une réécriture complète, à la demande seulement
+        tmp = Report(self.path.with_name(f".tmp-{self.path.name}"))
+        with tmp._open("w") as f:
+            self._dump(self, f)
+        os.replace(tmp.path, self.path)
+        if self.columns_path.exists():
+            self.columns_path.unlink()
+
+
+def convert_report(path, fmt: str = REPORT_FORMAT) -> Path:
+    path = Path(path)
+    target = path.with_name(f"{report_stem(path)}.{fmt}")
+    with path.open("r", encoding="utf-8") as f:
+        Report(target).write(map(Mail.from_record, iter_json_array(f)))
+    return target
+
+
+def _converted(path: Path):
+    for suffix in (".jsonl", ".jsonl.gz"):
+        converted = path.with_name(report_stem(path) + suffix)
+        if converted.exists() and converted.stat().st_mtime >= path.stat().st_mtime:
+            return converted
+    return None
+
+
+def open_report(path) -> Report:
+    path = Path(path)
+    if not path.name.endswith(".json"):
+        return Report(path)
+    # Rapport JSON historique : converti une fois, la version JSON Lines fait foi ensuite
+    return Report(_converted(path) or convert_report(path))
+
+
+def read_report(path):
+    # Lecture seule : un JSON historique non converti est lu en flux, sans écrire de fichier
+    path = Path(path)
+    if path.name.endswith(".json") and not _converted(path):
+        with path.open("r", encoding="utf-8") as f:
+            yield from map(Mail.from_record, iter_json_array(f))
+    else:
+        yield from open_report(path)
+
+
+def save_report(records, path) -> Path:
+    path = Path(path)
+    if path.name.endswith(".json"):
+        # Sortie explicitement demandée au format historique
+        with path.open("w", encoding="utf-8") as f:
+            json.dump([record.to_record() for record in records], f, ensure_ascii=False, indent=2)
+    else:
+        Report(path).write(records)
+    return path
+
+
+class ReportIndex:
+    def __init__(self, path, cache_size: int = 256):
+        report = open_report(path)
+        self.path = report.path
+        index_dir = self.path.parent / INDEX_DIR
+        self.index_path = index_dir / f"{self.path.name}.idx"
+        # Un rapport compressé est décompressé une fois à côté de l'index pour pouvoir y faire des seek
+        self.data_path = self.path if self.path.suffix == ".jsonl" else index_dir / f"{report_stem(self.path)}.jsonl"
+        self.columns = report.load_columns()
+        self.offsets = self._load_index() or self._build_index()
+        self._file = self.data_path.open("rb")
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def close(self):
+        self._file.close()
+
+    def get(self, i: int) -> Mail:
+        if i in self._cache:
+            self._cache.move_to_end(i)
+            return self._cache[i]
+        self._file.seek(self.offsets[i])
+        record = json.loads(self._file.read(self.offsets[i + 1] - self.offsets[i]))
+        record.update(self.columns.get(i, {}))
+        record = self._cache[i] = Mail.from_record(record)
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+        return record
+
+    def page(self, start: int, count: int) -> list:
+        return [self.get(i) for i in range(start, min(start + count, len(self)))]
+
+    def _signature(self) -> tuple:
+        stat = self.path.stat()
+        return stat.st_size, stat.st_mtime_ns
+
+    def _load_index(self):
+        # En-tête de l'index : taille et mtime du rapport source, pour détecter un rapport réécrit
+        if not self.index_path.exists() or not self.data_path.exists():
+            return None
+        offsets = array("q")
+        offsets.frombytes(self.index_path.read_bytes())
+        if len(offsets) < 3 or tuple(offsets[:2]) != self._signature():
+            return None
+        return offsets[2:]
+
+    def _build_index(self):
+        self.index_path.parent.mkdir(exist_ok=True)
+        if self.data_path != self.path:
+            with gzip.open(self.path, "rb") as src, self.data_path.open("wb") as dst:
+                while chunk := src.read(1 << 20):
+                    dst.write(chunk)
+
+        offsets = array("q", [0])
+        with self.data_path.open("rb") as f:
+            position = 0
+            for line in f:
+                position += len(line)
+                if line.strip():
+                    offsets.append(position)
+                else:
+                    offsets[-1] = position
+
+        header = array("q", self._signature())
+        self.index_path.write_bytes((header + offsets).tobytes())
+        return offsets
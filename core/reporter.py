@@ -0,0 +1,65 @@
+import sys
+import typer
+from pathlib import Path
+from email.utils import parsedate_to_datetime
+from email.header import decode_header
+
+from core.imap_client import IMAPClient
+from core.mail import Mail
+from core.search_index import index_report
+from core.report_store import Report, REPORT_FORMAT, REPORT_DIR, report_base_name
+from core.render import render_stream
+from core.generate_summary_md import summary_path
+
+def decode_mime_header(value: str) -> str:
+    decoded = decode_header(value)
+    return "".join([
+        part.decode(charset or "utf-8") if isinstance(part, bytes) else part
+        for part, charset in decoded
+    ])
+
+def to_mail(mail: dict) -> Mail:
+    # Message IMAP brut (en-têtes encodés) → Mail normalisé des rapports
+    from_info = IMAPClient._parse_from(mail["from"])
+    try:
+        dt = parsedate_to_datetime(mail["date"])
+        iso_date = dt.isoformat()
+    except Exception:
+        iso_date = mail["date"]
+
+    record = Mail(
+        from_name=sys.intern(from_info["name"]),
+        from_email=sys.intern(from_info["email"]),
+        subject=decode_mime_header(mail["subject"]),
+        date=iso_date,
+        raw_body=mail["body"].strip().encode("utf-8"),
+        # En-têtes de fil de discussion : utilisés pour regrouper les réponses avant les résumés
+        message_id=mail.get("message_id") or None,
+        in_reply_to=mail.get("in_reply_to") or None,
+        references=mail.get("references") or None,
+    )
+    if mail.get("headers"):
+        # En-têtes demandés par les règles "header:<nom>", gardés dans le rapport pour un classify ultérieur
+        record.update({"headers": {name: decode_mime_header(value) for name, value in mail["headers"].items()}})
+    if mail.get("body_ref"):
+        # Corps tronqué au fetch : le viewer recharge la version complète à la demande
+        record.body_truncated = True
+        record.body_ref = mail["body_ref"]
+    return record
+
+def write_report(records: list, label: str, with_summary: bool = False) -> Path:
+    REPORT_DIR.mkdir(exist_ok=True)
+    base_name = report_base_name(label)
+    md_file = REPORT_DIR / f"{base_name}.md"
+    json_file = REPORT_DIR / f"{base_name}.{REPORT_FORMAT}"
+    summary_file = summary_path(json_file) if with_summary else None
+
+    # JSON Lines, rapport Markdown et résumé Markdown écrits dans le même passage sur les mails
+    Report(json_file).write(render_stream(records, md_file, summary_file))
+    typer.echo(f"✅ Rapport généré : {md_file}")
+    index_report(records, json_file)
+
+    typer.echo(f"✅ JSON Lines généré : {json_file}")
+    if summary_file:
+        typer.echo(f"✅ Résumé Markdown généré : {summary_file}")
+    return json_file
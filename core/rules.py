@@ -0,0 +1,248 @@
+import os
+import re
+import json
+from pathlib import Path
+
+from core.mail import Mail
+
+try:
+    from re import _parser as _sre_parser, _constants as _sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse as _sre_parser, sre_constants as _sre_constants
+
+RULES_FILE = os.getenv("RULES_FILE", str(Path(__file__).resolve().parents[1] / "rules" / "default_rules.json"))
+
+
+def load_rules(path) -> dict:
+    path = Path(path)
+    with path.open("r", encoding="utf-8") as f:
+        if path.suffix in (".yml", ".yaml"):
+            try:
+                import yaml
+            except ImportError:
+                raise RuntimeError("PyYAML est requis pour charger des règles YAML (pip install pyyaml)")
+            data = yaml.safe_load(f)
+        else:
+            data = json.load(f)
+    if isinstance(data, list):
+        data = {"rules": data}
+    return data
+
+
+def header_names(rules: list) -> tuple:
+    # En-têtes lus par les règles "header:<nom>", en minuscules
+    return tuple(sorted({
+        rule["field"][len("header:"):].lower() for rule in rules if rule.get("field", "").startswith("header:")
+    }))
+
+
+def rule_headers(path=RULES_FILE) -> tuple:
+    # Demandés en plus au fetch IMAP : sans eux, les règles sur un en-tête ne trouvent jamais rien
+    try:
+        return header_names(load_rules(path).get("rules", []))
+    except (OSError, ValueError, RuntimeError):
+        return ()
+
+
+def _field_value(mail: Mail, field: str) -> str:
+    if field == "from":
+        return mail.from_email
+    extra = mail.extra or {}
+    if field.startswith("header:"):
+        return extra.get("headers", {}).get(field[len("header:"):].lower(), "")
+    # Champ du modèle (subject, body...) ou clé inconnue gardée telle quelle depuis le rapport
+    return (getattr(mail, field) if hasattr(mail, field) else extra.get(field)) or ""
+
+
+# Sous-chaînes littérales compilées en une seule regex en trie : une passe par champ
+class LiteralMatcher:
+    def __init__(self):
+        self.keywords = {}
+
+    def add(self, keyword: str, rule_id: int):
+        self.keywords.setdefault(keyword.lower(), set()).add(rule_id)
+
+    def compile(self):
+        trie = {}
+        for keyword in self.keywords:
+            node = trie
+            for c in keyword:
+                node = node.setdefault(c, {})
+            node[""] = True
+
+        # La regex renvoie le mot-clé le plus long à chaque position ; les mots-clés qui en sont
+        # des préfixes matchent forcément aussi, on les précalcule pour rester exact
+        self.closure = {}
+        for keyword, rules in self.keywords.items():
+            ids = set()
+            for i in range(1, len(keyword) + 1):
+                ids |= self.keywords.get(keyword[:i], set())
+            self.closure[keyword] = frozenset(ids)
+
+        pattern = self._pattern(trie)
+        self.regex = re.compile(f"(?=({pattern}))") if pattern else None
+        return self
+
+    def _pattern(self, node: dict) -> str:
+        branches = [re.escape(c) + self._pattern(child) for c, child in sorted(node.items()) if c != ""]
+        if not branches:
+            return ""
+        if len(branches) == 1 and "" not in node:
+            return branches[0]
+        alternation = "(?:" + "|".join(branches) + ")"
+        return alternation + "?" if "" in node else alternation
+
+    def match(self, text: str, hits: set):
+        if self.regex is None or not text:
+            return
+        for m in self.regex.finditer(text.lower()):
+            hits |= self.closure[m.group(1)]
+
+
+# Domaines d'expéditeur : recherche par dictionnaire sur le domaine et ses parents
+class DomainMatcher:
+    def __init__(self):
+        self.domains = {}
+
+    def add(self, domain: str, rule_id: int):
+        self.domains.setdefault(domain.lower().lstrip("@."), set()).add(rule_id)
+
+    def compile(self):
+        return self
+
+    def match(self, text: str, hits: set):
+        if not self.domains or "@" not in text:
+            return
+        labels = text.lower().rsplit("@", 1)[1].strip(" >").split(".")
+        for i in range(len(labels)):
+            rules = self.domains.get(".".join(labels[i:]))
+            if rules:
+                hits |= rules
+
+
+def _required_literal(pattern: str) -> str:
+    # Plus longue suite de caractères littéraux obligatoires dans la regex (hors alternance/répétition)
+    try:
+        parsed = _sre_parser.parse(pattern)
+    except re.error:
+        return ""
+
+    best, current = "", ""
+
+    def walk(items):
+        nonlocal best, current
+        for op, arg in items:
+            if op is _sre_constants.LITERAL:
+                current += chr(arg).lower()
+                continue
+            if op is _sre_constants.SUBPATTERN:
+                walk(arg[-1])
+                continue
+            best = max(best, current, key=len)
+            current = ""
+
+    walk(parsed)
+    best = max(best, current, key=len)
+    return best if len(best) >= 3 else ""
+
+
+# Tous les matchers d'un champ : mots-clés et littéraux obligatoires des regex partagent le
+# même trie, donc un seul passage sur le texte ; seules les regex candidates sont ensuite confirmées
+class FieldMatcher:
+    def __init__(self):
+        self.literals = LiteralMatcher()
+        self.domains = DomainMatcher()
+        self.regexes = []
+        self.unanchored = []
+
+    def add_keyword(self, keyword: str, rule_id: int):
+        self.literals.add(keyword, rule_id)
+
+    def add_domain(self, domain: str, rule_id: int):
+        self.domains.add(domain, rule_id)
+
+    def add_regex(self, pattern: str, rule_id: int):
+        index = len(self.regexes)
+        self.regexes.append((rule_id, re.compile(pattern, re.IGNORECASE)))
+        anchor = _required_literal(pattern)
+        if anchor:
+            # Identifiants négatifs : candidats regex, distincts des règles littérales
+            self.literals.add(anchor, -(index + 1))
+        else:
+            self.unanchored.append(index)
+
+    def compile(self):
+        self.literals.compile()
+        self.domains.compile()
+        return self
+
+    def match(self, text: str, hits: set):
+        if not text:
+            return
+        found = set()
+        self.literals.match(text, found)
+        self.domains.match(text, hits)
+        candidates = list(self.unanchored)
+        for rule_id in found:
+            if rule_id >= 0:
+                hits.add(rule_id)
+            else:
+                candidates.append(-rule_id - 1)
+        for index in candidates:
+            rule_id, regex = self.regexes[index]
+            if rule_id not in hits and regex.search(text):
+                hits.add(rule_id)
+
+
+class RuleEngine:
+    def __init__(self, rules: list, scoring: str = "max"):
+        self.rules = rules
+        self.scoring = scoring
+        self.fields = {}
+        self.headers = header_names(rules)
+
+        for rule_id, rule in enumerate(rules):
+            matcher = self.fields.setdefault(rule.get("field", "subject"), FieldMatcher())
+            for keyword in rule.get("contains", []):
+                matcher.add_keyword(keyword, rule_id)
+            for domain in rule.get("domains", []):
+                matcher.add_domain(domain, rule_id)
+            if "regex" in rule:
+                matcher.add_regex(rule["regex"], rule_id)
+
+        for matcher in self.fields.values():
+            matcher.compile()
+
+    @classmethod
+    def from_file(cls, path=RULES_FILE) -> "RuleEngine":
+        data = load_rules(path)
+        return cls(data.get("rules", []), scoring=data.get("scoring", "max"))
+
+    def match(self, mail: Mail) -> list:
+        hits = set()
+        for field, matcher in self.fields.items():
+            matcher.match(_field_value(mail, field), hits)
+        return sorted(hits)
+
+    def classify(self, mail: Mail) -> Mail:
+        tags = []
+        scores = []
+        for rule_id in self.match(mail):
+            rule = self.rules[rule_id]
+            tag = rule.get("tag")
+            if tag and tag not in tags:
+                tags.append(tag)
+            if rule.get("score"):
+                scores.append(rule["score"])
+
+        if self.scoring == "sum":
+            score = min(sum(scores), 10)
+        else:
+            score = max(scores, default=0)
+
+        mail.tags = tags
+        mail.score = score or None
+        return mail
+
+    def classify_many(self, mails: list) -> list:
+        return [self.classify(mail) for mail in mails]
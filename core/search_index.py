@@ -0,0 +1,232 @@
+import os
+import re
+import json
+import sqlite3
+import hashlib
+import unicodedata
+import threading
+from pathlib import Path
+
+from core.mail import Mail
+from core import metrics
+
+SEARCH_INDEX = os.getenv("SEARCH_INDEX", "reports/search_index.db")
+
+COLUMNS = ("from_name", "from_email", "subject", "date", "tags", "summary", "body", "score")
+
+SCHEMA = """
+PRAGMA journal_mode = WAL;
+PRAGMA synchronous = NORMAL;
+CREATE TABLE IF NOT EXISTS mails (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    report TEXT,
+    from_name TEXT,
+    from_email TEXT,
+    subject TEXT,
+    date TEXT,
+    tags TEXT,
+    summary TEXT,
+    body TEXT,
+    score INTEGER,
+    extra TEXT
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS mails_fts USING fts5(
+    subject, from_name, from_email, body, tags, summary,
+    content = 'mails',
+    content_rowid = 'id',
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS mails_vocab USING fts5vocab(mails_fts, 'row');
+CREATE TRIGGER IF NOT EXISTS mails_ai AFTER INSERT ON mails BEGIN
+    INSERT INTO mails_fts (rowid, subject, from_name, from_email, body, tags, summary)
+    VALUES (new.id, new.subject, new.from_name, new.from_email, new.body, new.tags, new.summary);
+END;
+CREATE TRIGGER IF NOT EXISTS mails_ad AFTER DELETE ON mails BEGIN
+    INSERT INTO mails_fts (mails_fts, rowid, subject, from_name, from_email, body, tags, summary)
+    VALUES ('delete', old.id, old.subject, old.from_name, old.from_email, old.body, old.tags, old.summary);
+END;
+CREATE TRIGGER IF NOT EXISTS mails_au AFTER UPDATE ON mails BEGIN
+    INSERT INTO mails_fts (mails_fts, rowid, subject, from_name, from_email, body, tags, summary)
+    VALUES ('delete', old.id, old.subject, old.from_name, old.from_email, old.body, old.tags, old.summary);
+    INSERT INTO mails_fts (rowid, subject, from_name, from_email, body, tags, summary)
+    VALUES (new.id, new.subject, new.from_name, new.from_email, new.body, new.tags, new.summary);
+END;
+"""
+
+# Poids bm25 : sujet > tags > expéditeur > résumé > corps
+WEIGHTS = (5.0, 3.0, 3.0, 1.0, 4.0, 2.0)
+# Au-delà, trier par bm25 coûte un score par mail candidat pour un idf proche de zéro : on sert les plus récents
+RANK_MAX_DOCS = int(os.getenv("SEARCH_RANK_MAX_DOCS", "20000"))
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+INDEX_SECONDS = metrics.histogram("search_index_seconds", "Indexation FTS5 d'un rapport")
+QUERY_SECONDS = metrics.histogram("search_query_seconds", "Recherche plein texte")
+
+
+def mail_key(record: Mail) -> str:
+    # Un même mail revient dans plusieurs rapports quotidiens : une seule entrée par mail
+    identity = "\0".join((record.from_email, record.date, record.subject))
+    return hashlib.sha1(identity.encode("utf-8")).hexdigest()
+
+
+def _fts_query(words: list) -> str:
+    # Chaque mot entre guillemets : pas d'erreur de syntaxe FTS sur une saisie libre
+    return " ".join(f'"{word}"' for word in words)
+
+
+class SearchIndex:
+    def __init__(self, path=SEARCH_INDEX):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.db.executescript(SCHEMA)
+        # Poids bm25 enregistrés dans la table FTS : ORDER BY rank profite du tri interne de FTS5.
+        # Validé tout de suite : sinon l'index ouvert (search --open, viewer) garde le verrou d'écriture
+        # et l'indexation du mode watch échoue en "database is locked"
+        with self.db:
+            self.db.execute(f"INSERT INTO mails_fts (mails_fts, rank) VALUES ('rank', 'bm25({', '.join(map(str, WEIGHTS))})')")
+
+    def close(self):
+        self.db.close()
+
+    def __len__(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM mails").fetchone()[0]
+
+    def index(self, records, report=None, batch_size: int = 1000) -> int:
+        count = 0
+        with INDEX_SECONDS.time(), self._lock, self.db:
+            # Par lots dans une seule transaction : le rapport peut être lu en flux sans tout garder en mémoire
+            batch = []
+            for record in records:
+                batch.append(self._row(record, report))
+                if len(batch) >= batch_size:
+                    count += self._upsert(batch)
+                    batch = []
+            count += self._upsert(batch)
+        return count
+
+    @staticmethod
+    def _row(record: Mail, report) -> tuple:
+        # Champs hors colonnes (fil, groupe, body_ref...) gardés en JSON, au format des rapports
+        extra = {k: v for k, v in record.to_record().items() if k not in COLUMNS}
+        return (
+            mail_key(record), str(report) if report else None, record.from_name,
+            record.from_email, record.subject, record.date,
+            " ".join(record.tags or []), record.summary or "", record.body,
+            record.score, json.dumps(extra, ensure_ascii=False) if extra else None,
+        )
+
+    def _upsert(self, rows: list) -> int:
+        # Rapport réécrit (tags, résumé) : les triggers remplacent l'entrée FTS au lieu de la dupliquer
+        self.db.executemany(
+            "INSERT INTO mails (key, report, from_name, from_email, subject, date, tags, summary, body, score, extra) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET report = excluded.report, from_name = excluded.from_name, "
+            "from_email = excluded.from_email, subject = excluded.subject, date = excluded.date, "
+            "tags = excluded.tags, summary = excluded.summary, body = excluded.body, score = excluded.score, "
+            "extra = excluded.extra",
+            rows,
+        )
+        return len(rows)
+
+    def _ranked(self, query: str, limit: int, columns: str) -> list:
+        # Même normalisation que le tokenizer (minuscules, sans accents) pour interroger le vocabulaire
+        plain = "".join(c for c in unicodedata.normalize("NFKD", query.lower()) if not unicodedata.combining(c))
+        words = _WORD_RE.findall(plain)
+        if not words:
+            return []
+        with QUERY_SECONDS.time():
+            order = "rowid DESC" if self._candidates(words) > RANK_MAX_DOCS else "rank"
+            return self.db.execute(
+                f"SELECT {columns} FROM mails_fts WHERE mails_fts MATCH ? ORDER BY {order} LIMIT ?",
+                (_fts_query(words), limit),
+            ).fetchall()
+
+    def _candidates(self, words: list) -> int:
+        # Borne haute du nombre de mails trouvés : la fréquence documentaire du mot le plus rare
+        counts = [
+            (self.db.execute("SELECT doc FROM mails_vocab WHERE term = ?", (word,)).fetchone() or (0,))[0]
+            for word in words
+        ]
+        return min(counts)
+
+    def search_ids(self, query: str, limit: int = 20) -> list:
+        return [rowid for rowid, in self._ranked(query, limit, "rowid")]
+
+    def search(self, query: str, limit: int = 20) -> list:
+        results = []
+        for rowid, snippet in self._ranked(query, limit, "rowid, snippet(mails_fts, -1, '«', '»', '…', 12)"):
+            record = self.record(rowid)
+            record.update({"snippet": snippet})
+            results.append(record)
+        return results
+
+    def record(self, rowid: int) -> Mail:
+        row = self.db.execute(
+            "SELECT report, from_name, from_email, subject, date, tags, summary, body, score, extra FROM mails WHERE id = ?",
+            (rowid,),
+        ).fetchone()
+        report, from_name, from_email, subject, date, tags, summary, body, score, extra = row
+        record = Mail(
+            from_name=from_name,
+            from_email=from_email,
+            subject=subject,
+            date=date,
+            raw_body=body.encode("utf-8"),
+            tags=tags.split() if tags else [],
+            score=score,
+            summary=summary or None,
+        )
+        record.update({"report": report})
+        if extra:
+            record.update(json.loads(extra))
+        return record
+
+
+class SearchResults:
+    # Même interface que ReportIndex : le viewer ouvre un résultat de recherche comme un rapport
+    def __init__(self, index: SearchIndex, ids: list):
+        self.index = index
+        self.ids = ids
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def get(self, i: int) -> Mail:
+        return self.index.record(self.ids[i])
+
+    def page(self, start: int, count: int) -> list:
+        return [self.get(i) for i in range(start, min(start + count, len(self)))]
+
+    def close(self):
+        self.index.close()
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    global _index
+    with _index_lock:
+        if _index is None and SEARCH_INDEX:
+            _index = SearchIndex(SEARCH_INDEX)
+        return _index
+
+
+def close_index():
+    global _index
+    with _index_lock:
+        if _index is not None:
+            _index.close()
+            _index = None
+
+
+def index_report(records, report) -> int:
+    index = get_index()
+    if index is None:
+        return 0
+    return index.index(records, report)
@@ -0,0 +1,238 @@
+import os
+import re
+import json
+import zlib
+import hashlib
+import threading
+from pathlib import Path
+import numpy as np
+
+from core.mail import Mail
+from core import metrics
+
+# Deuxième étage de classification : embeddings locaux comparés à des exemples étiquetés, sans LLM
+SEMANTIC_EXAMPLES = os.getenv("SEMANTIC_EXAMPLES", str(Path(__file__).resolve().parents[1] / "rules" / "semantic_examples.jsonl"))
+SEMANTIC_INDEX = os.getenv("SEMANTIC_INDEX", "reports/semantic_index.npz")
+# "hash" : n-grammes de mots hachés (CPU, sans modèle) ; "ollama" : modèle d'embedding servi par Ollama
+SEMANTIC_EMBEDDER = os.getenv("SEMANTIC_EMBEDDER", "hash")
+SEMANTIC_DIM = int(os.getenv("SEMANTIC_DIM", "1024"))
+# "centroid" : un vecteur moyen par tag ; "knn" : vote des k exemples les plus proches
+SEMANTIC_MODE = os.getenv("SEMANTIC_MODE", "centroid")
+SEMANTIC_K = int(os.getenv("SEMANTIC_K", "5"))
+# Similarité cosinus minimale pour poser un tag : en dessous, le mail reste sans tag
+SEMANTIC_MIN_SIMILARITY = float(os.getenv("SEMANTIC_MIN_SIMILARITY", "0.2"))
+SEMANTIC_MAX_CHARS = int(os.getenv("SEMANTIC_MAX_CHARS", "2000"))
+SEMANTIC_BATCH = int(os.getenv("SEMANTIC_BATCH", "2048"))
+OLLAMA_EMBED_URL = os.getenv("OLLAMA_EMBED_URL", "http://127.0.0.1:11434/api/embed")
+OLLAMA_EMBED_MODEL = os.getenv("OLLAMA_EMBED_MODEL", "nomic-embed-text")
+
+_WORD_RE = re.compile(r"\w+")
+_DIGITS_RE = re.compile(r"\d+")
+
+EMBED_SECONDS = metrics.histogram("semantic_embed_seconds", "Calcul d'un lot d'embeddings", ("embedder",))
+PREDICT_SECONDS = metrics.histogram("semantic_predict_seconds", "Recherche des tags les plus proches pour un lot")
+SEMANTIC_TAGS = metrics.counter("semantic_tags_total", "Tags posés par le classifieur sémantique", ("tag",))
+
+
+def mail_text(mail: Mail) -> str:
+    # Sujet doublé (plus de poids que le corps) et domaine de l'expéditeur
+    domain = (mail.from_email or "").rpartition("@")[2]
+    subject = mail.subject or ""
+    return f"{subject}\n{subject}\n{domain}\n{mail.preview(SEMANTIC_MAX_CHARS)}"
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class HashingEmbedder:
+    # Mots et bigrammes hachés (crc32, stable d'un processus à l'autre) dans un vecteur signé de taille fixe
+    def __init__(self, dim: int = SEMANTIC_DIM):
+        self.dim = dim
+        self.signature = f"hash-{dim}-v1"
+
+    def _hashes(self, text: str) -> list:
+        words = _WORD_RE.findall(_DIGITS_RE.sub("0", text.lower()))
+        features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        return [zlib.crc32(feature.encode("utf-8")) for feature in features]
+
+    def embed(self, texts: list) -> np.ndarray:
+        with EMBED_SECONDS.time(embedder="hash"):
+            hashes = [self._hashes(text) for text in texts]
+            lengths = np.fromiter((len(h) for h in hashes), dtype=np.int64, count=len(hashes))
+            flat = np.fromiter((value for h in hashes for value in h), dtype=np.uint32, count=int(lengths.sum()))
+            rows = np.repeat(np.arange(len(texts), dtype=np.int64), lengths)
+            # Bit de poids fort pour le signe : les collisions se compensent au lieu de s'additionner
+            signs = np.where(flat >> 31, -1.0, 1.0)
+            cells = rows * self.dim + (flat % self.dim)
+            counts = np.bincount(cells, weights=signs, minlength=len(texts) * self.dim).reshape(len(texts), self.dim)
+            # Fréquences amorties : un mot répété vingt fois ne pèse pas vingt fois plus
+            matrix = (np.sign(counts) * np.log1p(np.abs(counts))).astype(np.float32)
+            return _normalize(matrix)
+
+
+class OllamaEmbedder:
+    def __init__(self, url: str = OLLAMA_EMBED_URL, model: str = OLLAMA_EMBED_MODEL, batch_size: int = 64, timeout: float = 120.0):
+        self.url = url
+        self.model = model
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.signature = f"ollama-{model}"
+
+    def embed(self, texts: list) -> np.ndarray:
+        import httpx
+        vectors = []
+        with EMBED_SECONDS.time(embedder="ollama"), httpx.Client(timeout=self.timeout) as client:
+            for start in range(0, len(texts), self.batch_size):
+                response = client.post(self.url, json={"model": self.model, "input": texts[start:start + self.batch_size]})
+                response.raise_for_status()
+                vectors.extend(response.json()["embeddings"])
+        return _normalize(np.asarray(vectors, dtype=np.float32).reshape(len(texts), -1))
+
+
+def get_embedder(name: str = SEMANTIC_EMBEDDER):
+    if name == "ollama":
+        return OllamaEmbedder()
+    if name == "hash":
+        return HashingEmbedder()
+    raise ValueError(f"Embedder inconnu : {name} (hash ou ollama)")
+
+
+def load_examples(path=SEMANTIC_EXAMPLES) -> list:
+    path = Path(path)
+    with path.open("r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _digest(path) -> str:
+    path = Path(path)
+    return hashlib.sha256(path.read_bytes()).hexdigest() if path.exists() else ""
+
+
+class SemanticIndex:
+    def __init__(self, embedder, tags: list, scores: list, examples: np.ndarray, labels: np.ndarray, source: str = ""):
+        self.embedder = embedder
+        self.tags = list(tags)
+        self.scores = list(scores)
+        self.examples = examples
+        self.labels = labels
+        self.source = source
+        # Centroïde normalisé : la similarité cosinus devient un simple produit scalaire
+        self.centroids = _normalize(np.stack([examples[labels == t].mean(axis=0) for t in range(len(self.tags))]))
+
+    @classmethod
+    def build(cls, examples: list, embedder=None, source: str = "") -> "SemanticIndex":
+        embedder = embedder or get_embedder()
+        tags, scores = [], []
+        for example in examples:
+            if example["tag"] not in tags:
+                tags.append(example["tag"])
+                scores.append(0)
+            t = tags.index(example["tag"])
+            scores[t] = max(scores[t], example.get("score") or 0)
+        matrix = embedder.embed([mail_text(Mail.from_record(example)) for example in examples])
+        labels = np.array([tags.index(example["tag"]) for example in examples], dtype=np.int32)
+        return cls(embedder, tags, scores, matrix, labels, source)
+
+    def save(self, path=SEMANTIC_INDEX) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        meta = {"signature": self.embedder.signature, "tags": self.tags, "scores": self.scores, "source": self.source}
+        # Écriture atomique : un classifieur qui démarre ne lit jamais un index à moitié écrit
+        tmp = path.with_name(f".tmp-{path.name}")
+        with tmp.open("wb") as f:
+            np.savez(f, examples=self.examples, labels=self.labels, meta=np.array(json.dumps(meta)))
+        os.replace(tmp, path)
+        return path
+
+    @classmethod
+    def load(cls, path=SEMANTIC_INDEX, embedder=None):
+        # None si l'index manque ou a été construit avec un autre embedder
+        path = Path(path)
+        if not path.exists():
+            return None
+        embedder = embedder or get_embedder()
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            if meta["signature"] != embedder.signature:
+                return None
+            return cls(embedder, meta["tags"], meta["scores"], data["examples"], data["labels"], meta["source"])
+
+    def predict(self, mails: list, mode: str = SEMANTIC_MODE, k: int = SEMANTIC_K, min_similarity: float = SEMANTIC_MIN_SIMILARITY) -> list:
+        # (tag, score, similarité) par mail, None sous le seuil ; calcul par lots de SEMANTIC_BATCH mails
+        results = []
+        for start in range(0, len(mails), SEMANTIC_BATCH):
+            matrix = self.embedder.embed([mail_text(mail) for mail in mails[start:start + SEMANTIC_BATCH]])
+            with PREDICT_SECONDS.time():
+                if mode == "knn":
+                    best, similarity = self._knn(matrix, k)
+                else:
+                    sims = matrix @ self.centroids.T
+                    best = sims.argmax(axis=1)
+                    similarity = sims[np.arange(len(best)), best]
+            results.extend(
+                (self.tags[t], self.scores[t], float(s)) if s >= min_similarity else None
+                for t, s in zip(best.tolist(), similarity.tolist())
+            )
+        return results
+
+    def _knn(self, matrix: np.ndarray, k: int) -> tuple:
+        k = min(k, len(self.labels))
+        sims = matrix @ self.examples.T
+        nearest = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        near_sims = np.take_along_axis(sims, nearest, axis=1)
+        near_labels = self.labels[nearest]
+        # Vote pondéré par la similarité, puis similarité du plus proche voisin du tag gagnant
+        votes = np.zeros((len(matrix), len(self.tags)), dtype=np.float32)
+        rows = np.repeat(np.arange(len(matrix)), k)
+        np.add.at(votes, (rows, near_labels.ravel()), np.clip(near_sims, 0, None).ravel())
+        best = votes.argmax(axis=1)
+        return best, np.where(near_labels == best[:, None], near_sims, -1.0).max(axis=1)
+
+
+def build_index(examples_path=SEMANTIC_EXAMPLES, index_path=SEMANTIC_INDEX, reports: list = (), embedder=None) -> SemanticIndex:
+    # Exemples du fichier, plus les mails déjà tagués par les règles dans les rapports donnés
+    examples = load_examples(examples_path)
+    if reports:
+        from core.report_store import read_report
+        for report in reports:
+            for mail in read_report(Path(report)):
+                for tag in (mail.tags or [])[:1]:
+                    examples.append({"tag": tag, "score": mail.score, "subject": mail.subject,
+                                     "from_email": mail.from_email, "body": mail.body})
+    index = SemanticIndex.build(examples, embedder, source=_digest(examples_path))
+    index.save(index_path)
+    return index
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> SemanticIndex:
+    # Index persistant rechargé tel quel tant que le fichier d'exemples n'a pas changé
+    global _index
+    with _index_lock:
+        if _index is None:
+            index = SemanticIndex.load(SEMANTIC_INDEX)
+            if index is None or index.source != _digest(SEMANTIC_EXAMPLES):
+                index = build_index(SEMANTIC_EXAMPLES, SEMANTIC_INDEX)
+            _index = index
+        return _index
+
+
+def classify_semantic(mails: list) -> list:
+    # Tag et score posés seulement sur les mails que les règles n'ont pas tagués : les règles gardent la main
+    todo = [mail for mail in mails if not mail.tags]
+    if not todo:
+        return mails
+    for mail, result in zip(todo, get_index().predict(todo)):
+        if result is None:
+            continue
+        tag, score, _ = result
+        mail.tags = [tag]
+        mail.score = score or None
+        SEMANTIC_TAGS.inc(tag=tag)
+    return mails
@@ -0,0 +1,129 @@
+import os
+import re
+import time
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+
+SUMMARY_CACHE = os.getenv("SUMMARY_CACHE", "reports/summary_cache.db")
+SUMMARY_CACHE_MAX_BYTES = int(os.getenv("SUMMARY_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS summaries (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    prompt_hash TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS summaries_last_access ON summaries (last_access);
+CREATE TABLE IF NOT EXISTS stats (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_body(text: str) -> str:
+    return _WHITESPACE_RE.sub(" ", text or "").strip()
+
+
+def _sha256(value: str) -> str:
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+class SummaryCache:
+    def __init__(self, path=SUMMARY_CACHE, max_bytes: int = SUMMARY_CACHE_MAX_BYTES):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.db.executescript(SCHEMA)
+        self._size = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM summaries").fetchone()[0]
+
+    def close(self):
+        self._flush_stats()
+        self.db.close()
+
+    @staticmethod
+    def make_key(text: str, prompt_template: str, model: str) -> str:
+        return _sha256("\0".join((model, _sha256(prompt_template), normalize_body(text))))
+
+    def get(self, key: str):
+        with self._lock:
+            row = self.db.execute("SELECT summary FROM summaries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            with self.db:
+                self.db.execute("UPDATE summaries SET last_access = ? WHERE key = ?", (time.time(), key))
+            return row[0]
+
+    def put(self, key: str, summary: str, prompt_template: str, model: str):
+        size = len(summary.encode("utf-8")) + len(key)
+        now = time.time()
+        with self._lock, self.db:
+            old = self.db.execute("SELECT size FROM summaries WHERE key = ?", (key,)).fetchone()
+            self.db.execute(
+                "INSERT OR REPLACE INTO summaries (key, model, prompt_hash, summary, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, model, _sha256(prompt_template), summary, size, now, now),
+            )
+            self._size += size - (old[0] if old else 0)
+            self._evict()
+
+    def _evict(self):
+        # LRU : on supprime les entrées les moins récemment lues jusqu'à repasser sous la limite
+        if self._size <= self.max_bytes:
+            return
+        for key, size in self.db.execute("SELECT key, size FROM summaries ORDER BY last_access ASC").fetchall():
+            if self._size <= self.max_bytes:
+                break
+            self.db.execute("DELETE FROM summaries WHERE key = ?", (key,))
+            self._size -= size
+            self.evictions += 1
+
+    def invalidate(self, prompt_template: str = None, model: str = None, stale_only: bool = True) -> int:
+        with self._lock, self.db:
+            if not stale_only:
+                cursor = self.db.execute("DELETE FROM summaries")
+            else:
+                cursor = self.db.execute(
+                    "DELETE FROM summaries WHERE prompt_hash != ? OR model != ?",
+                    (_sha256(prompt_template or ""), model or ""),
+                )
+            self._size = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM summaries").fetchone()[0]
+            return cursor.rowcount
+
+    def _flush_stats(self):
+        with self._lock, self.db:
+            for name, value in (("hits", self.hits), ("misses", self.misses), ("evictions", self.evictions)):
+                self.db.execute(
+                    "INSERT INTO stats (name, value) VALUES (?, ?) "
+                    "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                    (name, value),
+                )
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self.db.execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
+            totals = dict(self.db.execute("SELECT name, value FROM stats").fetchall())
+            return {
+                "entries": entries,
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": totals.get("hits", 0) + self.hits,
+                "misses": totals.get("misses", 0) + self.misses,
+                "evictions": totals.get("evictions", 0) + self.evictions,
+            }
@@ -0,0 +1,183 @@
+import os
+import time
+import queue
+import imaplib
+import threading
+from pathlib import Path
+import typer
+
+from core.imap_client import IMAPClient
+from core.mail_store import MailStore, MAIL_STORE
+from core.mail_classifier import classify_mail
+from core.reporter import REPORT_DIR, to_mail, report_base_name
+from core.report_store import Report, REPORT_FORMAT, read_report
+from core.search_index import index_report
+from core.generate_summary_md import summary_path, write_summary
+from core.pipeline import StageTimer, summarize_stage
+from core import llm_wrapper, metrics
+
+# IDLE relancé régulièrement (RFC 2177 : avant 29 min) pour détecter aussi une connexion morte sans erreur
+WATCH_IDLE_TIMEOUT = float(os.getenv("WATCH_IDLE_TIMEOUT", "300"))
+# Intervalle des NOOP quand le serveur ne propose pas IDLE
+WATCH_POLL_INTERVAL = float(os.getenv("WATCH_POLL_INTERVAL", "30"))
+WATCH_MAX_BACKOFF = float(os.getenv("WATCH_MAX_BACKOFF", "60"))
+WATCH_ALERT_SCORE = int(os.getenv("WATCH_ALERT_SCORE", "8"))
+WATCH_METRICS_INTERVAL = float(os.getenv("WATCH_METRICS_INTERVAL", "15"))
+
+RECONNECTS = metrics.counter("watch_reconnects_total", "Connexions perdues puis rétablies en mode watch", ("folder",))
+NEW_MAILS = metrics.counter("watch_new_mails_total", "Mails ajoutés au rapport par le mode watch", ("folder",))
+ALERTS = metrics.counter("watch_alerts_total", "Alertes (score >= WATCH_ALERT_SCORE) vues par le mode watch", ("folder",))
+
+
+def sync_new(client: IMAPClient, store: MailStore, label: str, hours: int) -> list:
+    state = store.folder_state(label)
+    client.sync_folder(store, folder=label, hours=hours)
+    after = store.folder_state(label)
+    if state and after and after["uidvalidity"] != state["uidvalidity"]:
+        # Dossier resynchronisé en entier : tout ce qui est dans la fenêtre est nouveau pour le rapport
+        state = None
+    return store.since(label, state["last_uid"] if state else 0)
+
+
+def triage(label: str, mails: list, report_dir: Path, jobs: queue.Queue, lock: threading.Lock):
+    # Tags et score écrits tout de suite : une alerte est dans le rapport avant que son résumé n'arrive
+    records = [classify_mail(to_mail(mail)) for mail in mails]
+    report_dir.mkdir(exist_ok=True)
+    json_file = report_dir / f"{report_base_name(label)}.{REPORT_FORMAT}"
+    with lock:
+        report = Report(json_file)
+        first_row = len(report)
+        report.append(records)
+        index_report(records, json_file)
+
+    typer.echo(f"📨 {label} : {len(records)} nouveau(x) mail(s) → {json_file}")
+    NEW_MAILS.inc(len(records), folder=label)
+    for record in records:
+        if (record.score or 0) >= WATCH_ALERT_SCORE:
+            ALERTS.inc(folder=label)
+            typer.echo(f"🚨 [{record.score}] {record.from_name} : {record.subject}")
+    jobs.put((json_file, first_row, records))
+
+
+def summarize_worker(jobs: queue.Queue, lock: threading.Lock, concurrency: int, batch_tokens: int):
+    # Résumés dans leur propre thread : la surveillance IMAP ne les attend jamais
+    while True:
+        job = jobs.get()
+        if job is None:
+            return
+        json_file, first_row, records = job
+        try:
+            records = list(summarize_stage(iter(records), StageTimer(), concurrency=concurrency, batch_tokens=batch_tokens))
+            with lock:
+                Report(json_file).update_columns((first_row + i, {"summary": record.summary}) for i, record in enumerate(records))
+                index_report(records, json_file)
+                write_summary(read_report(json_file), summary_path(json_file))
+        except Exception as e:
+            typer.echo(f"❌ Résumés non écrits pour {json_file} : {e}")
+
+
+def watch_folder(
+    label: str,
+    on_mails,
+    stop: threading.Event,
+    hours: int = 24,
+    store_path: Path = Path(MAIL_STORE),
+    idle_timeout: float = WATCH_IDLE_TIMEOUT,
+    poll_interval: float = WATCH_POLL_INTERVAL,
+    **client_kwargs,
+):
+    store = MailStore(store_path)
+    client = None
+    changed = True
+    delay = 1.0
+    while not stop.is_set():
+        try:
+            if client is None:
+                client = IMAPClient(**client_kwargs)
+                client.connect()
+                if not client.conn:
+                    raise ConnectionError("connexion IMAP impossible")
+                mode = "IDLE" if client.supports_idle() else f"NOOP toutes les {poll_interval:g}s"
+                typer.echo(f"👀 {label} : surveillance ({mode})")
+                changed = True
+
+            # Sync seulement quand le serveur a signalé un changement (ou après une reconnexion)
+            if changed:
+                mails = sync_new(client, store, label, hours)
+                if mails:
+                    on_mails(label, mails)
+            delay = 1.0
+
+            if client.supports_idle():
+                changed = client.idle(idle_timeout, stop)
+            else:
+                changed = client.poll(poll_interval, stop)
+        except (imaplib.IMAP4.error, OSError) as e:
+            # imaplib.IMAP4.abort hérite de IMAP4.error ; ConnectionError d'OSError
+            typer.echo(f"🔌 {label} : connexion perdue ({e}), reconnexion dans {delay:g}s")
+            RECONNECTS.inc(folder=label)
+            if client:
+                client.close()
+            client = None
+            stop.wait(delay)
+            delay = min(delay * 2, WATCH_MAX_BACKOFF)
+
+    if client:
+        client.close()
+    store.close()
+
+
+def run_watch(
+    labels: list,
+    hours: int = 24,
+    store_path: Path = Path(MAIL_STORE),
+    report_dir: Path = REPORT_DIR,
+    idle_timeout: float = WATCH_IDLE_TIMEOUT,
+    poll_interval: float = WATCH_POLL_INTERVAL,
+    concurrency: int = llm_wrapper.LLM_CONCURRENCY,
+    batch_tokens: int = llm_wrapper.LLM_BATCH_TOKENS,
+    stop: threading.Event = None,
+    metrics_file: str = metrics.METRICS_FILE,
+    **client_kwargs,
+):
+    stop = stop or threading.Event()
+    lock = threading.Lock()
+    jobs = queue.Queue()
+
+    worker = threading.Thread(target=summarize_worker, args=(jobs, lock, concurrency, batch_tokens), daemon=True)
+    worker.start()
+
+    # IDLE ne surveille que le dossier sélectionné : une connexion par dossier
+    def on_mails(label, mails):
+        triage(label, mails, report_dir, jobs, lock)
+
+    watchers = [
+        threading.Thread(
+            target=watch_folder,
+            args=(label, on_mails, stop, hours, store_path, idle_timeout, poll_interval),
+            kwargs=client_kwargs,
+            daemon=True,
+        )
+        for label in labels
+    ]
+    for thread in watchers:
+        thread.start()
+
+    try:
+        exported = time.monotonic()
+        while not stop.is_set() and any(thread.is_alive() for thread in watchers):
+            stop.wait(0.5)
+            if metrics_file and time.monotonic() - exported >= WATCH_METRICS_INTERVAL:
+                metrics.REGISTRY.write_textfile(metrics_file)
+                exported = time.monotonic()
+    except KeyboardInterrupt:
+        typer.echo("🛑 Arrêt demandé, fin des résumés en cours...")
+    finally:
+        stop.set()
+        for thread in watchers:
+            thread.join()
+        jobs.put(None)
+        worker.join()
+        llm_wrapper.close_cache()
+        if metrics_file:
+            metrics.REGISTRY.write_textfile(metrics_file)
@@ -1,9 +1,6 @@
 import sys
 from pathlib import Path
-import imaplib
-import re
 import argparse
-import base64
 from rich.console import Console
 from rich.table import Table
 from rich.tree import Tree
@@ -12,48 +9,34 @@ from rich import print
 sys.path.append(str(Path(__file__).resolve().parents[1]))
 from core.imap_client import IMAPClient
 
-def decode_utf7(name: str) -> str:
-    try:
-        return imaplib.IMAP4._decode_utf7(name)
-    except Exception:
-        return name
-
-def encode_utf7_imap(folder: str) -> str:
-    res = []
-    buffer = ""
-
-    def flush():
-        nonlocal buffer
-        if buffer:
-            b64 = base64.b64encode(buffer.encode("utf-16be")).decode("ascii")
-            res.append("&" + b64.rstrip('=') + "-")
-            buffer = ""
+decode_utf7 = IMAPClient.decode_utf7
+encode_utf7_imap = IMAPClient.encode_utf7
 
-    for c in folder:
-        if ord(c) in range(0x20, 0x7f) and c != "&":
-            flush()
-            res.append(c)
-        elif c == "&":
-            flush()
-            res.append("&-")
-        else:
-            buffer += c
-    flush()
-    return "".join(res)
+def count_label(folder: dict) -> str:
+    # Compteurs présents seulement avec --counts (LIST-STATUS ou STATUS pipelinés)
+    if "messages" not in folder:
+        return ""
+    return f"{folder['messages']} ({folder['unseen']} non lus)"
 
-def display_table(folders: list, filter_prefix: str = None):
+def display_table(folders: list, filter_prefix: str = None, counts: bool = False):
     console = Console()
     table = Table(show_header=True, header_style="bold magenta")
     table.add_column("Nom", style="cyan")
     table.add_column("Flags", style="yellow")
     table.add_column("Séparateur", style="dim")
+    if counts:
+        table.add_column("Messages", justify="right", style="green")
+        table.add_column("Non lus", justify="right", style="bold green")
 
     for folder in folders:
         name = decode_utf7(folder["name"])
         if filter_prefix and not name.startswith(filter_prefix):
             continue
         flags = ", ".join(folder["flags"])
-        table.add_row(name, flags, folder["separator"])
+        row = [name, flags, folder["separator"] or ""]
+        if counts:
+            row += [str(folder.get("messages", "")), str(folder.get("unseen", ""))]
+        table.add_row(*row)
 
     console.print(table)
 
@@ -63,12 +46,14 @@ def display_tree(folders: list):
 
     nodes = {}
     for folder in sorted(folders, key=lambda f: f["name"]):
-        path = decode_utf7(folder["name"]).split("/")
+        path = decode_utf7(folder["name"]).split(folder["separator"] or "/")
         current = tree
         for part in path:
             if (id(current), part) not in nodes:
                 nodes[(id(current), part)] = current.add(part)
             current = nodes[(id(current), part)]
+        if count_label(folder):
+            current.label = f"{path[-1]} [dim]{count_label(folder)}"
 
     console.print(tree)
 
@@ -78,19 +63,28 @@ def export_json(folders: list, output_file: str):
         json.dump(folders, f, ensure_ascii=False, indent=2)
     print(f"\n✅ Export JSON créé : {output_file}")
 
-def probe_hidden_folders(client: IMAPClient, folder_names: list):
+def probe_hidden_folders(client: IMAPClient, folders: list, folder_names: list):
+    # Sans SELECT : un dossier listé se lit dans le LIST, les autres sont testés par STATUS, tous dans le même lot
     console = Console()
     console.print("\n[bold underline]🔍 Probing dossiers manuellement :\n")
-    for folder in folder_names:
-        encoded = encode_utf7_imap(folder)
-        try:
-            typ, _ = client.conn.select(encoded)
-            if typ == "OK":
-                console.print(f"[green]✅ Accessible :[/green] {folder}")
-            else:
-                console.print(f"[red]❌ SELECT KO :[/red] {folder} (type={typ})")
-        except Exception as e:
-            console.print(f"[red]❌ Erreur sur {folder} :[/red] {e}")
+    listed = {folder["name"]: folder for folder in folders}
+    unlisted = [encode_utf7_imap(name) for name in folder_names if encode_utf7_imap(name) not in listed]
+    try:
+        statuses = client.status_many(unlisted)
+    except Exception as e:
+        console.print(f"[red]❌ Erreur STATUS :[/red] {e}")
+        statuses = {}
+    for name in folder_names:
+        encoded = encode_utf7_imap(name)
+        folder = listed.get(encoded)
+        if folder and not folder["selectable"]:
+            console.print(f"[yellow]⚠️ Listé mais non sélectionnable :[/yellow] {name} ({', '.join(folder['flags'])})")
+        elif folder:
+            console.print(f"[green]✅ Accessible :[/green] {name} {count_label(folder)}")
+        elif encoded in statuses:
+            console.print(f"[green]✅ Accessible (absent du LIST) :[/green] {name} {count_label(statuses[encoded])}")
+        else:
+            console.print(f"[red]❌ STATUS KO :[/red] {name}")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Lister les dossiers IMAP visibles")
@@ -98,11 +92,12 @@ if __name__ == "__main__":
     parser.add_argument("--tree", action="store_true", help="Afficher en vue arborescente")
     parser.add_argument("--json", help="Exporter au format JSON (fichier)", default=None)
     parser.add_argument("--probe", action="store_true", help="Tenter d'accéder à certains dossiers manquants")
+    parser.add_argument("--counts", action="store_true", help="Nombre de messages et de non lus par dossier (LIST-STATUS ou STATUS pipelinés)")
+    parser.add_argument("--refresh", action="store_true", help="Ignorer le cache de l'arborescence et relancer LIST")
     args = parser.parse_args()
 
     client = IMAPClient()
-    client.connect()
-    folders = client.list_all_accessible_folders()
+    folders = client.list_folders(counts=args.counts or args.probe, refresh=args.refresh)
 
     if args.probe:
         hidden_targets = [
@@ -111,10 +106,11 @@ if __name__ == "__main__":
             "Folders/Mani - Perso",
             "Folders/ksh - Dev"
         ]
-        probe_hidden_folders(client, hidden_targets)
+        probe_hidden_folders(client, folders, hidden_targets)
     elif args.json:
         export_json(folders, args.json)
     elif args.tree:
         display_tree(folders)
     else:
-        display_table(folders, filter_prefix=args.filter)
+        display_table(folders, filter_prefix=args.filter, counts=args.counts)
+    client.close()
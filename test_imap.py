@@ -1,5 +1,6 @@
 import imaplib
 import os
+import sys
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -9,6 +10,14 @@ port = int(os.getenv("IMAP_PORT", "1143"))
 user = os.getenv("IMAP_USER")
 password = os.getenv("IMAP_PASS")
 
+if "--fake" in sys.argv:
+    # Sans Bridge : faux serveur IMAP local (STARTTLS compris) chargé du corpus de 1k messages
+    from bench.fake_imap import FakeIMAPServer
+    from bench import corpus
+    server = FakeIMAPServer(starttls=True).start()
+    corpus.load(server, corpus.SIZES["1k"])
+    host, port, user, password = "127.0.0.1", server.port, "bench", "bench"
+
 print(f"🔐 Connexion à {host}:{port} avec {user}...")
 
 try:
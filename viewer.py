@@ -1,21 +1,26 @@
-
+from textual import work
 from textual.app import App, ComposeResult
 from textual.widgets import Static, Header, Footer, DataTable
-from textual.reactive import reactive
 from textual.containers import Horizontal
-import json
 from pathlib import Path
 import sys
 
+from core.report_store import ReportIndex
+
 class MailViewer(App):
     CSS_PATH = "viewer.tcss"
-    BINDINGS = [("q", "quit", "Quitter")]
+    BINDINGS = [("q", "quit", "Quitter"), ("b", "load_body", "Corps complet")]
+    PAGE_SIZE = 200
 
-    mails = reactive([])
-
-    def __init__(self, file_path: str):
+    def __init__(self, file_path: str = None, source=None, title: str = None):
         super().__init__()
-        self.file_path = Path(file_path)
+        self.file_path = Path(file_path) if file_path else None
+        # source : tout objet avec __len__, get(i), page(start, count) et close() (rapport ou résultats de recherche)
+        self.report = source
+        if title:
+            self.title = title
+        self.loaded = 0
+        self.full_bodies = {}
 
     def compose(self) -> ComposeResult:
         yield Header()
@@ -29,34 +34,44 @@ class MailViewer(App):
         yield Footer()
 
     def on_mount(self):
-        if not self.file_path.exists():
-            self.exit(f"❌ Fichier non trouvé : {self.file_path}")
-            return
-
-        with self.file_path.open("r", encoding="utf-8") as f:
-            self.mails = json.load(f)
-
+        if self.report is None:
+            if not self.file_path.exists():
+                self.exit(f"❌ Fichier non trouvé : {self.file_path}")
+                return
+            # Seul un index d'offsets est chargé : les lignes arrivent page par page
+            self.report = ReportIndex(self.file_path)
         self.table.add_columns("Date", "De", "Sujet", "Tags", "Score")
-        for mail in self.mails:
-            self.table.add_row(
-                mail.get("date", ""),
-                f"{mail.get('from_name', '')} <{mail.get('from_email', '')}>",
-                mail.get("subject", "")[:40],
-                ", ".join(mail.get("tags", [])),
-                str(mail.get("score", "") or "")
-            )
-
+        self.load_page()
         self.table.focus()
-        self.set_interval(0.1, self.refresh_detail)
 
-    def refresh_detail(self):
-        if not self.mails or not self.table.row_count:
-            return
-        row_idx = self.table.cursor_row
-        if row_idx is None or row_idx >= len(self.mails):
+    def on_unmount(self):
+        if self.report:
+            self.report.close()
+
+    def load_page(self):
+        rows = []
+        for mail in self.report.page(self.loaded, self.PAGE_SIZE):
+            rows.append((
+                mail.date,
+                f"{mail.from_name} <{mail.from_email}>",
+                mail.subject[:40],
+                ", ".join(mail.tags or []),
+                str(mail.score or "")
+            ))
+        self.table.add_rows(rows)
+        self.loaded += len(rows)
+
+    def on_data_table_row_highlighted(self, event: DataTable.RowHighlighted):
+        row_idx = event.cursor_row
+        if row_idx >= self.loaded - 1 and self.loaded < len(self.report):
+            self.load_page()
+        self.refresh_detail(row_idx)
+
+    def refresh_detail(self, row_idx: int):
+        if row_idx is None or row_idx >= self.loaded:
             return
 
-        mail = self.mails[row_idx]
+        mail = self.report.get(row_idx)
 
         tag_colors = {
             "alert": "bold red",
@@ -65,32 +80,63 @@ class MailViewer(App):
         }
 
         colored_tags = []
-        for tag in mail.get("tags", []):
+        for tag in mail.tags or []:
             style = tag_colors.get(tag, "white")
             colored_tags.append(f"[{style}]{tag}[/]")
 
-        score = mail.get("score", "?")
+        score = "?" if mail.score is None else mail.score
         score_color = "bold red" if score == 8 else ("green" if score else "dim")
+        full_body = self.full_bodies.get(row_idx)
 
         content = f"""
-[bold violet]{mail.get("subject", "")}[/bold violet]
-De : [italic]{mail.get("from_name", "")}[/] <{mail.get("from_email", "")}>
-Date : {mail.get("date", "")}
+[bold violet]{mail.subject}[/bold violet]
+De : [italic]{mail.from_name}[/] <{mail.from_email}>
+Date : {mail.date}
 Tags : {" | ".join(colored_tags) or "[dim]aucun[/]"}
 Score : [{score_color}]{score}[/{score_color}]
 
 [bold]Résumé :[/]
-[italic]{mail.get("summary", "(pas de résumé)")}[/italic]
+[italic]{mail.summary or "(pas de résumé)"}[/italic]
 
-[dim]--- Corps brut (extrait) ---[/dim]
-{mail.get("body", "")[:500]}...
+[dim]--- Corps brut ({"complet" if full_body is not None else "extrait"}) ---[/dim]
+{full_body if full_body is not None else mail.preview(500) + "..."}
 """
+        if mail.body_truncated and full_body is None:
+            content += "\n[dim]Corps tronqué au fetch : b pour charger la version complète[/dim]"
         self.detail.update(content)
 
+    def action_load_body(self):
+        row_idx = self.table.cursor_row
+        if row_idx is None or row_idx >= self.loaded:
+            return
+        mail = self.report.get(row_idx)
+        if mail.body_ref and row_idx not in self.full_bodies:
+            self.fetch_full_body(row_idx, mail.body_ref)
+
+    @work(thread=True, exclusive=True)
+    def fetch_full_body(self, row_idx: int, body_ref: dict):
+        from core.imap_client import IMAPClient
+        self.notify("📥 Chargement du corps complet...")
+        client = IMAPClient()
+        client.connect()
+        body = client.load_body(body_ref)
+        client.close()
+        if body is None:
+            self.notify("❌ Corps complet indisponible", severity="error")
+            return
+        self.full_bodies[row_idx] = body
+        if self.table.cursor_row == row_idx:
+            self.call_from_thread(self.refresh_detail, row_idx)
+
 if __name__ == "__main__":
     if len(sys.argv) < 2:
-        print("Usage : python viewer.py <fichier.json>")
+        print("Usage : python viewer.py <rapport.jsonl> | --search <requête>")
         sys.exit(1)
 
-    app = MailViewer(sys.argv[1])
-    app.run()
\ No newline at end of file
+    if sys.argv[1] == "--search":
+        from core.search_index import get_index, SearchResults
+        query = " ".join(sys.argv[2:])
+        app = MailViewer(source=SearchResults(get_index(), get_index().search_ids(query, 500)), title=f"🔎 {query}")
+    else:
+        app = MailViewer(sys.argv[1])
+    app.run()